@@ -0,0 +1,48 @@
+"""
+Instrumented psycopg2 connection that counts database round-trips for the end-to-end benchmark.
+"""
+
+import threading
+
+import psycopg2.extensions
+
+from database.db import InstrumentedCursor
+
+
+class RoundTripCounter:
+    """Thread-safe counter of statements and transaction commands sent to Postgres."""
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def increment(self) -> None:
+        with self._lock:
+            self.value += 1
+
+
+ROUND_TRIPS = RoundTripCounter()
+
+
+class CountingCursor(InstrumentedCursor):
+    def execute(self, query, vars=None):
+        ROUND_TRIPS.increment()
+        return super().execute(query, vars)
+
+    def executemany(self, query, vars_list):
+        ROUND_TRIPS.increment()
+        return super().executemany(query, vars_list)
+
+
+class CountingConnection(psycopg2.extensions.connection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cursor_factory = CountingCursor
+
+    def commit(self):
+        ROUND_TRIPS.increment()
+        return super().commit()
+
+    def rollback(self):
+        ROUND_TRIPS.increment()
+        return super().rollback()
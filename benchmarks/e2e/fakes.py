@@ -0,0 +1,235 @@
+"""
+Local stand-ins for the OpenAI and Telegram Bot APIs used by the end-to-end benchmark.
+
+Both run an HTTP server in a background thread and count the requests they receive.
+"""
+
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+from bot.constants import CATEGORIES
+
+RESPONSE_SHAPES = ("receipt", "invalid", "mixed")
+
+
+class _FakeServer:
+    handler_class = BaseHTTPRequestHandler
+
+    def __init__(self):
+        self.requests = Counter()
+        self._lock = threading.Lock()
+        handler = type("Handler", (self.handler_class,), {"fake": self})
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, name: str) -> None:
+        with self._lock:
+            self.requests[name] += 1
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class _QuietHandler(BaseHTTPRequestHandler):
+    fake = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def _send(self, status: int, body: bytes, content_type: str = "application/json") -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class _OpenAIHandler(_QuietHandler):
+    def do_POST(self):
+        body = self._read_body()
+        fake = self.fake
+        fake.count(self.path)
+        time.sleep(max(0.0, random.gauss(fake.latency, fake.jitter)))
+        content = fake.completion_content(json.loads(body))
+        prompt_tokens = len(body) // 4
+        completion_tokens = len(content) // 4
+        response = {
+            "id": f"chatcmpl-bench-{time.monotonic_ns()}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": "gpt-4o-mini",
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+        self._send(200, json.dumps(response).encode())
+
+
+class FakeOpenAIServer(_FakeServer):
+    """
+    Answers /v1/chat/completions after a configurable, normally distributed latency.
+
+    ``shape`` selects the answer: a valid receipt with ``items`` items, an invalid-receipt error,
+    or a mix with ``invalid_ratio`` errors.
+    """
+
+    handler_class = _OpenAIHandler
+
+    def __init__(
+        self, latency: float = 1.0, jitter: float = 0.2, shape: str = "receipt", items: int = 3, invalid_ratio=0.1
+    ):
+        if shape not in RESPONSE_SHAPES:
+            raise ValueError(f"Unknown response shape: {shape}")
+        super().__init__()
+        self.latency = latency
+        self.jitter = jitter
+        self.shape = shape
+        self.items = items
+        self.invalid_ratio = invalid_ratio
+        self._labels = [(category, sub) for category, subs in CATEGORIES.items() for sub in subs]
+
+    @property
+    def base_url(self) -> str:
+        return self.url + "/v1"
+
+    def completion_content(self, request: dict) -> str:
+        """Answer a single expense, or every expense of a batched request (see openai_integration.batcher)."""
+        schema_name = (request.get("response_format") or {}).get("json_schema", {}).get("name")
+        if schema_name != "expense_batch":
+            return json.dumps(self.expense_result())
+        content = request["messages"][-1]["content"]
+        entries = json.loads(content[content.index("[") :])
+        return json.dumps({"results": [{"key": entry["key"], "expense": self.expense_result()} for entry in entries]})
+
+    def expense_result(self) -> dict:
+        invalid = self.shape == "invalid" or (
+            self.shape == "mixed" and random.random() < self.invalid_ratio  # noqa: S311
+        )
+        if invalid:
+            return {
+                "error": "Invalid receipt",
+                "total_price": 0,
+                "currency": "EUR",
+                "total_price_euro": 0,
+                "items": [],
+                "user_comment": "",
+            }
+        items = []
+        for index in range(self.items):
+            category, subcategory = random.choice(self._labels)  # noqa: S311
+            price = round(random.uniform(0.5, 40), 2)  # noqa: S311
+            items.append(
+                {
+                    "name": f"Item {index}",
+                    "price": price,
+                    "currency": "EUR",
+                    "category": category,
+                    "subcategory": subcategory,
+                }
+            )
+        total = round(sum(item["price"] for item in items), 2)
+        return {
+            "error": None,
+            "total_price": total,
+            "currency": "EUR",
+            "total_price_euro": total,
+            "items": items,
+            "user_comment": "Benchmark purchase",
+        }
+
+
+class _TelegramHandler(_QuietHandler):
+    def _params(self, body: bytes) -> dict:
+        content_type = self.headers.get("Content-Type", "")
+        if "json" in content_type:
+            return json.loads(body or b"{}")
+        if "form-urlencoded" in content_type:
+            return {key: values[0] for key, values in parse_qs(body.decode()).items()}
+        return {}
+
+    def do_POST(self):
+        body = self._read_body()
+        method = self.path.rsplit("/", 1)[-1]
+        fake = self.fake
+        fake.count(method)
+        result = fake.handle_method(method, self._params(body))
+        self._send(200, json.dumps({"ok": True, "result": result}).encode())
+
+    def do_GET(self):
+        fake = self.fake
+        fake.count("download")
+        file_id = self.path.rsplit("/", 1)[-1].removesuffix(".jpg")
+        self._send(200, fake.file_bytes(file_id), content_type="image/jpeg")
+
+
+class FakeTelegramServer(_FakeServer):
+    """
+    Minimal Bot API: getMe, getFile, file downloads and send* methods.
+    Sent message texts are recorded in ``sent_texts`` so the harness can count stored receipts.
+    """
+
+    handler_class = _TelegramHandler
+
+    def __init__(self, images: list[bytes]):
+        super().__init__()
+        self.images = images
+        self.sent_texts = []
+        self._message_ids = iter(range(1, 1 << 62))
+
+    @property
+    def base_url(self) -> str:
+        return self.url + "/bot"
+
+    @property
+    def base_file_url(self) -> str:
+        return self.url + "/file/bot"
+
+    def file_bytes(self, file_id: str) -> bytes:
+        return self.images[hash(file_id) % len(self.images)]
+
+    def handle_method(self, method: str, params: dict):
+        if method == "getMe":
+            return {"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+        if method == "getFile":
+            file_id = params.get("file_id", "unknown")
+            return {
+                "file_id": file_id,
+                "file_unique_id": f"u-{file_id}",
+                "file_size": len(self.file_bytes(file_id)),
+                "file_path": f"photos/{file_id}.jpg",
+            }
+        if method.startswith("send"):
+            with self._lock:
+                message_id = next(self._message_ids)
+                self.sent_texts.append(params.get("text") or params.get("caption") or "")
+            chat_id = int(params.get("chat_id") or 0)
+            return {"message_id": message_id, "date": int(time.time()), "chat": {"id": chat_id, "type": "private"}}
+        return True
@@ -0,0 +1,243 @@
+"""
+End-to-end throughput benchmark for the bot.
+
+Replays synthetic text and photo updates through the real handlers from bot/app.py. Telegram and
+OpenAI are replaced by local stand-ins (benchmarks/e2e/fakes.py); the database is the Postgres
+configured by the POSTGRES_* settings, so point them at a local, disposable instance.
+
+Reports messages per second, p50/p95/p99 handler latency, and database round-trips, OpenAI
+requests and Telegram API calls per message, and can save them as JSON to compare across commits:
+
+    python -m benchmarks.e2e.run --messages 500 --concurrency 50 --output results/HEAD.json
+    python -m benchmarks.e2e.run --baseline results/HEAD.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import time
+from datetime import UTC, datetime
+from pathlib import Path
+
+from benchmarks.e2e.fakes import RESPONSE_SHAPES, FakeOpenAIServer, FakeTelegramServer
+
+# Only ever sent to the local fake Telegram server
+BENCH_TOKEN = "123456:BENCHMARK"  # noqa: S105
+MERCHANTS = ["Starbucks", "Lidl", "Bolt", "Wolt", "Pharmacy", "Cinema", "Bakery", "Kiosk"]
+PRODUCTS = ["Latte", "Croissant", "Milk", "Bread", "Taxi", "Pizza", "Shampoo", "Ticket", "Apples"]
+# Replies that only acknowledge a queued expense or album; the result follows in another message
+ACKNOWLEDGEMENT_PREFIX = "⏳ Got it!"
+
+
+def build_updates(count: int, users: int, photo_ratio: float, repeat_ratio: float, seed: int) -> list[dict]:
+    """Generate Bot API update payloads: a mix of text expenses and receipt photos."""
+    rng = random.Random(seed)  # noqa: S311
+    updates = []
+    for n in range(1, count + 1):
+        user_id = 10_000 + rng.randrange(users)
+        message = {
+            "message_id": n,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private", "username": f"bench{user_id}"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Bench"},
+        }
+        # Repeated messages reuse an earlier payload to exercise the result cache
+        source = rng.randrange(1, n) if n > 1 and rng.random() < repeat_ratio else n
+        if rng.random() < photo_ratio:
+            message["photo"] = [
+                {"file_id": f"photo{source}-s", "file_unique_id": f"p{source}-s", "width": 320, "height": 427},
+                {"file_id": f"photo{source}-m", "file_unique_id": f"p{source}-m", "width": 960, "height": 1280},
+                {"file_id": f"photo{source}-l", "file_unique_id": f"p{source}-l", "width": 1536, "height": 2048},
+            ]
+        else:
+            source_rng = random.Random(source)  # noqa: S311
+            message["text"] = (
+                f"{source_rng.choice(MERCHANTS)} {source_rng.choice(PRODUCTS)} #{source} "
+                f"{source_rng.uniform(1, 60):.2f} euro"
+            )
+        updates.append({"update_id": n, "message": message})
+    return updates
+
+
+async def replay(application, updates: list[dict], concurrency: int, rate: float | None) -> list[float]:
+    """
+    Feed updates to application.process_update.
+
+    With ``rate`` updates arrive on a fixed schedule (open loop); otherwise up to ``concurrency``
+    are in flight at any time (closed loop). Returns per-update latencies.
+    """
+    from telegram import Update
+
+    semaphore = asyncio.Semaphore(concurrency)
+    started = time.perf_counter()
+    latencies = []
+
+    async def one(payload: dict) -> None:
+        async with semaphore:
+            update = Update.de_json(payload, application.bot)
+            start = time.perf_counter()
+            await application.process_update(update)
+            latencies.append(time.perf_counter() - start)
+
+    tasks = []
+    for index, payload in enumerate(updates):
+        if rate:
+            await asyncio.sleep(max(0.0, index / rate - (time.perf_counter() - started)))
+        tasks.append(asyncio.create_task(one(payload)))
+    await asyncio.gather(*tasks)
+    return latencies
+
+
+def count_failed_replies(sent_texts: list[str]) -> int:
+    """
+    Count updates that were answered with something other than a stored receipt.
+
+    The handlers turn every failure into a reply (FAILED_REPLY, BUSY_REPLY, an invalid receipt
+    notice), so failures are counted from the texts sent to Telegram rather than from exceptions.
+    """
+    return sum(not text.startswith(("✅", ACKNOWLEDGEMENT_PREFIX)) for text in sent_texts)
+
+
+def percentile(values: list[float], q: int) -> float:
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1] if len(values) > 1 else values[0]
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],  # noqa: S607
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args, openai_server: FakeOpenAIServer, telegram_server: FakeTelegramServer) -> dict:
+    # Imported late so the configuration picks up the stand-in URLs from the environment
+    from benchmarks.e2e.counting import ROUND_TRIPS, CountingConnection
+    from bot.app import build_application
+    from config import config
+    from database.db import install_pool
+    from database.migrations import run_migrations
+    from database.pool import ConnectionPool
+
+    install_pool(
+        ConnectionPool(
+            min_size=config.DB_POOL_MIN_SIZE,
+            max_size=config.DB_POOL_MAX_SIZE,
+            max_idle=config.DB_POOL_MAX_IDLE,
+            checkout_timeout=config.DB_POOL_CHECKOUT_TIMEOUT,
+            health_check_after=config.DB_POOL_HEALTH_CHECK_AFTER,
+            connection_factory=CountingConnection,
+            dbname=config.POSTGRES_DB,
+            user=config.POSTGRES_USER,
+            password=config.POSTGRES_PASSWORD,
+            host=config.POSTGRES_HOST,
+            port=config.POSTGRES_PORT,
+        )
+    )
+    run_migrations()
+
+    application = build_application(base_url=telegram_server.base_url, base_file_url=telegram_server.base_file_url)
+    updates = build_updates(args.messages, args.users, args.photo_ratio, args.repeat_ratio, args.seed)
+    await application.initialize()
+    try:
+        ROUND_TRIPS.value = 0
+        openai_server.requests.clear()
+        telegram_server.requests.clear()
+        telegram_server.sent_texts.clear()
+        started = time.perf_counter()
+        latencies = await replay(application, updates, args.concurrency, args.rate)
+        wall = time.perf_counter() - started
+    finally:
+        await application.shutdown()
+
+    receipts = sum(text.startswith("✅") for text in telegram_server.sent_texts)
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.now(UTC).isoformat(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        "messages": len(updates),
+        "receipts_stored": receipts,
+        "errors": count_failed_replies(telegram_server.sent_texts),
+        "wall_seconds": wall,
+        "messages_per_second": len(updates) / wall,
+        "latency_ms": {
+            "p50": percentile(latencies, 50) * 1000,
+            "p95": percentile(latencies, 95) * 1000,
+            "p99": percentile(latencies, 99) * 1000,
+            "max": max(latencies) * 1000,
+        },
+        "db_round_trips": ROUND_TRIPS.value,
+        "db_round_trips_per_receipt": ROUND_TRIPS.value / receipts if receipts else None,
+        "openai_requests": sum(openai_server.requests.values()),
+        "telegram_api_calls": dict(telegram_server.requests),
+    }
+
+
+def compare(current: dict, baseline: dict) -> None:
+    """Print relative changes of the headline metrics against a saved baseline."""
+    print(f"\nCompared with {baseline.get('commit') or 'baseline'}:")
+    metrics = [
+        ("messages_per_second", current["messages_per_second"], baseline["messages_per_second"]),
+        *((f"latency_ms.{q}", current["latency_ms"][q], baseline["latency_ms"][q]) for q in ("p50", "p95", "p99")),
+        ("db_round_trips_per_receipt", current["db_round_trips_per_receipt"], baseline["db_round_trips_per_receipt"]),
+        ("openai_requests", current["openai_requests"], baseline["openai_requests"]),
+    ]
+    for name, now, before in metrics:
+        if now is None or not before:
+            print(f"  {name:<28} {now!s:>12}  (baseline {before})")
+            continue
+        print(f"  {name:<28} {now:>12.2f}  {100 * (now - before) / before:+7.1f}%")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=200, help="Number of updates to replay")
+    parser.add_argument("--users", type=int, default=20, help="Number of distinct chats")
+    parser.add_argument("--concurrency", type=int, default=32, help="Updates in flight (closed loop)")
+    parser.add_argument("--rate", type=float, help="Arrival rate in updates/s (open loop)")
+    parser.add_argument("--photo-ratio", type=float, default=0.3, help="Share of photo updates")
+    parser.add_argument("--repeat-ratio", type=float, default=0.0, help="Share of updates repeating an earlier one")
+    parser.add_argument("--openai-latency", type=float, default=1.0, help="Mean fake OpenAI latency in seconds")
+    parser.add_argument("--openai-jitter", type=float, default=0.2, help="Std deviation of the fake latency")
+    parser.add_argument("--response-shape", choices=RESPONSE_SHAPES, default="receipt")
+    parser.add_argument("--items", type=int, default=3, help="Items per fake receipt")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, help="Write results as JSON to this file")
+    parser.add_argument("--baseline", type=Path, help="Compare against results saved by an earlier run")
+    args = parser.parse_args()
+
+    openai_server = FakeOpenAIServer(args.openai_latency, args.openai_jitter, args.response_shape, args.items).start()
+    os.environ.update(
+        OPENAI_BASE_URL=openai_server.base_url,
+        OPENAI_API_KEY="sk-benchmark",
+        TELEGRAM_TOKEN=BENCH_TOKEN,
+        INGESTION_QUEUE_ENABLED="false",
+    )
+    # Loads the configuration, so it may only be imported once the stand-in settings are in place
+    from benchmarks.image_preprocessing import synthetic_receipts
+
+    telegram_server = FakeTelegramServer([image for _, image in synthetic_receipts(count=4)]).start()
+    try:
+        results = asyncio.run(run(args, openai_server, telegram_server))
+    finally:
+        openai_server.stop()
+        telegram_server.stop()
+
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(results, indent=2, ensure_ascii=False))
+    if args.baseline:
+        compare(results, json.loads(args.baseline.read_text()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+EXPLAIN-based check that the hot read queries use indexes on a large dataset.
+
+Applies the migrations to a scratch schema, seeds it with synthetic receipts and items, runs
+ANALYZE and inspects the plans of the spending report query (behind both charts and reports)
+and a per-user receipt history query. Exits with status 1 if either plan sequentially scans a
+large table or uses no index at all.
+
+Usage:
+    python -m benchmarks.explain_chart_query [--receipts N] [--users N] [--partitioned] [--keep]
+"""
+
+import argparse
+import json
+import sys
+from datetime import timedelta
+
+import psycopg2
+
+from config.config import POSTGRES_DB, POSTGRES_HOST, POSTGRES_PASSWORD, POSTGRES_PORT, POSTGRES_USER
+from database.analytics import SPENDING_REPORT_QUERY
+from database.migrations import MIGRATIONS, apply_migrations
+from database.rollup import local_today, refresh_rollup
+
+SCHEMA = "explain_check"
+LARGE_TABLES = {"expensetrackerai_receipts", "expensetrackerai_items", "expensetrackerai_daily_spending"}
+
+# Items carry their receipt's created_at, so the planner can prune item partitions as for receipts
+USER_HISTORY_QUERY = """
+    SELECT r.id, r.created_at, i.item_name, i.item_price, i.item_currency, i.category
+    FROM expensetrackerai_receipts r
+    JOIN expensetrackerai_items i ON i.receipt_id = r.id AND i.receipt_created_at = r.created_at
+    WHERE r.user_id = %(user_id)s AND r.created_at >= %(since)s AND i.receipt_created_at >= %(since)s
+    ORDER BY r.created_at DESC;
+"""
+
+
+def seed(cursor, receipts: int, users: int) -> None:
+    cursor.execute(
+        """
+        INSERT INTO expensetrackerai_receipts (
+            created_at, user_id, username, total_price, currency, total_price_euro, user_comment
+        )
+        SELECT NOW() - (random() * INTERVAL '730 days'),
+               (g %% %(users)s) + 1,
+               'user' || (g %% %(users)s),
+               0, 'EUR', 0, 'seeded'
+        FROM generate_series(1, %(receipts)s) AS g
+        """,
+        {"receipts": receipts, "users": users},
+    )
+    cursor.execute(
+        """
+        INSERT INTO expensetrackerai_items (
+            receipt_id, item_name, item_price, item_currency, category, subcategory, receipt_created_at
+        )
+        SELECT r.id, 'item ' || n, round((random() * 50)::numeric, 2),
+               CASE WHEN n = 4 THEN 'USD' ELSE 'EUR' END,
+               (ARRAY['Food & Drinks', 'Transport', 'Entertainment', 'Other'])[n],
+               'Other', r.created_at
+        FROM expensetrackerai_receipts r CROSS JOIN generate_series(1, 4) AS n
+        """
+    )
+    refresh_rollup(cursor)
+    cursor.execute("ANALYZE")
+
+
+def plan_nodes(plan: dict):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+def empty_tables(cursor) -> set[str]:
+    """Tables ANALYZE found empty, such as partitions for future months; scanning them costs nothing."""
+    cursor.execute(
+        "SELECT relname FROM pg_class WHERE relnamespace = %s::regnamespace AND relkind = 'r' AND reltuples = 0",
+        (SCHEMA,),
+    )
+    return {row[0] for row in cursor.fetchall()}
+
+
+def check_plan(cursor, name: str, query: str, params: tuple | dict) -> bool:
+    cursor.execute("EXPLAIN (FORMAT JSON) " + query, params)
+    plan = cursor.fetchone()[0][0]["Plan"]
+    nodes = list(plan_nodes(plan))
+    empty = empty_tables(cursor)
+    seq_scans = [
+        node["Relation Name"]
+        for node in nodes
+        if node["Node Type"] == "Seq Scan"
+        and node["Relation Name"] not in empty
+        and any(node["Relation Name"].startswith(t) for t in LARGE_TABLES)
+    ]
+    index_scans = [node for node in nodes if "Index" in node["Node Type"]]
+    ok = not seq_scans and bool(index_scans)
+    print(f"{'PASS' if ok else 'FAIL'} {name}")
+    if not ok:
+        print(f"  sequential scans: {seq_scans or 'none'}; index scans: {len(index_scans)}")
+        print(json.dumps(plan, indent=2))
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--receipts", type=int, default=500_000, help="Number of receipts to seed")
+    parser.add_argument("--users", type=int, default=1_000, help="Number of distinct users")
+    parser.add_argument("--partitioned", action="store_true", help="Also apply monthly partitioning")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch schema afterwards")
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(
+        dbname=POSTGRES_DB,
+        user=POSTGRES_USER,
+        password=POSTGRES_PASSWORD,
+        host=POSTGRES_HOST,
+        port=POSTGRES_PORT,
+        options=f"-c search_path={SCHEMA}",
+    )
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+            cursor.execute(f"CREATE SCHEMA {SCHEMA}")
+        conn.commit()
+
+        migrations = tuple(m._replace(enabled=m.enabled or args.partitioned) for m in MIGRATIONS)
+        apply_migrations(conn, migrations)
+        with conn.cursor() as cursor:
+            print(f"Seeding {args.receipts} receipts for {args.users} users...")
+            seed(cursor, args.receipts, args.users)
+            conn.commit()
+
+            today = local_today()
+            since = today - timedelta(days=30)
+            report_params = {"user_id": 1, "since": today - timedelta(days=180), "today": today}
+            results = [
+                # Serves /view_spending_chart as well as /report
+                check_plan(cursor, "spending report (rollup + FX)", SPENDING_REPORT_QUERY, report_params),
+                check_plan(cursor, "user receipt history", USER_HISTORY_QUERY, {"user_id": 1, "since": since}),
+            ]
+    finally:
+        if not args.keep:
+            with conn.cursor() as cursor:
+                cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+            conn.commit()
+        conn.close()
+
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Benchmark for the receipt image preprocessing stage.
+
+Reports payload size, preprocessing time and estimated vision tokens for each image before and
+after preprocessing. With ``--live`` it also measures end-to-end process_expense latency against
+the real OpenAI API (this costs money).
+
+Usage:
+    python -m benchmarks.image_preprocessing [--images DIR] [--max-side N] [--max-tiles N] [--autocrop]
+        [--live] [--output results.json]
+
+Without ``--images`` a set of synthetic receipt photos is generated. The model scales every photo so
+its shorter side is at most 768px before tiling it, so a smaller ``--max-side`` mostly saves upload
+bytes; only ``--max-tiles`` (or a ``--max-side`` small enough to leave a 512px short side) lowers
+the token count. Check legibility with ``--live`` before changing IMAGE_MAX_TILES in production.
+"""
+
+import argparse
+import base64
+import io
+import json
+import random
+import statistics
+import time
+from pathlib import Path
+
+from PIL import Image, ImageDraw, ImageFilter
+
+from config.config import IMAGE_AUTOCROP, IMAGE_MAX_SIDE, IMAGE_MAX_TILES
+from openai_integration.image_preprocessing import image_mime_type, preprocess_image, vision_tiles
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp"}
+
+
+def synthetic_receipts(count: int = 8, seed: int = 0) -> list[tuple[str, bytes]]:
+    """Render photo-like receipts: a white paper strip with item lines on a noisy, coloured background."""
+    rng = random.Random(seed)  # noqa: S311
+    fixtures = []
+    for index in range(count):
+        width, height = rng.choice([(1280, 1706), (1536, 2048), (2560, 1920)])
+        background = tuple(rng.randint(40, 140) for _ in range(3))
+        image = Image.new("RGB", (width, height), background)
+        draw = ImageDraw.Draw(image)
+        paper_w, paper_h = int(width * 0.45), int(height * 0.85)
+        left, top = (width - paper_w) // 2, (height - paper_h) // 2
+        draw.rectangle((left, top, left + paper_w, top + paper_h), fill=(246, 244, 238))
+        y = top + 40
+        while y < top + paper_h - 40:
+            name = "".join(rng.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ ") for _ in range(rng.randint(6, 18)))
+            draw.text((left + 30, y), f"{name}  {rng.uniform(0.5, 30):.2f} EUR", fill=(20, 20, 20))
+            y += 28
+        image = image.filter(ImageFilter.GaussianBlur(0.6))
+        out = io.BytesIO()
+        image.save(out, format="JPEG", quality=95)
+        fixtures.append((f"synthetic_{index}.jpg", out.getvalue()))
+    return fixtures
+
+
+def load_images(directory: Path) -> list[tuple[str, bytes]]:
+    return [
+        (path.name, path.read_bytes()) for path in sorted(directory.iterdir()) if path.suffix.lower() in IMAGE_SUFFIXES
+    ]
+
+
+def vision_tokens(image_bytes: bytes) -> int:
+    """Estimate high-detail vision input tokens using OpenAI's published tiling rules."""
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        return 85 + 170 * vision_tiles(*image.size)
+
+
+def live_latency(image_bytes: bytes, mime: str) -> float:
+    from openai_integration.openai_client import process_expense
+
+    start = time.perf_counter()
+    process_expense(text="Extract and analyze this receipt.", image_bytes=image_bytes, image_mime=mime)
+    return time.perf_counter() - start
+
+
+def run(images: list[tuple[str, bytes]], live: bool, **settings) -> dict:
+    rows = []
+    for name, original in images:
+        start = time.perf_counter()
+        processed, mime = preprocess_image(original, **settings)
+        encode_time = time.perf_counter() - start
+        row = {
+            "image": name,
+            "before_bytes": len(base64.b64encode(original)),
+            "after_bytes": len(base64.b64encode(processed)),
+            "preprocess_seconds": encode_time,
+            "before_tokens": vision_tokens(original),
+            "after_tokens": vision_tokens(processed),
+        }
+        if live:
+            row["before_latency_seconds"] = live_latency(original, image_mime_type(original))
+            row["after_latency_seconds"] = live_latency(processed, mime) + encode_time
+        rows.append(row)
+        print(
+            f"{name}: {row['before_bytes']:>9} -> {row['after_bytes']:>8} bytes (base64), "
+            f"{row['before_tokens']:>5} -> {row['after_tokens']:>5} tokens, "
+            f"preprocess {encode_time * 1000:.1f} ms"
+        )
+
+    summary = {
+        "settings": settings,
+        "images": len(rows),
+        "total_before_bytes": sum(row["before_bytes"] for row in rows),
+        "total_after_bytes": sum(row["after_bytes"] for row in rows),
+        "median_preprocess_seconds": statistics.median(row["preprocess_seconds"] for row in rows),
+        "total_before_tokens": sum(row["before_tokens"] for row in rows),
+        "total_after_tokens": sum(row["after_tokens"] for row in rows),
+    }
+    if live:
+        summary["median_before_latency_seconds"] = statistics.median(row["before_latency_seconds"] for row in rows)
+        summary["median_after_latency_seconds"] = statistics.median(row["after_latency_seconds"] for row in rows)
+    print(json.dumps(summary, indent=2))
+    return {"summary": summary, "images": rows}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=Path, help="Directory of receipt images (default: synthetic fixtures)")
+    parser.add_argument("--max-side", type=int, default=IMAGE_MAX_SIDE, help="Longest side after downsampling")
+    parser.add_argument("--max-tiles", type=int, default=IMAGE_MAX_TILES, help="Vision tile budget (0 = no limit)")
+    parser.add_argument("--autocrop", action="store_true", default=IMAGE_AUTOCROP, help="Crop to the receipt first")
+    parser.add_argument("--live", action="store_true", help="Also measure end-to-end latency against OpenAI")
+    parser.add_argument("--output", type=Path, help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    images = load_images(args.images) if args.images else synthetic_receipts()
+    if not images:
+        parser.error(f"No images found in {args.images}")
+    results = run(images, live=args.live, max_side=args.max_side, max_tiles=args.max_tiles, autocrop=args.autocrop)
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Cold-start import benchmark.
+
+Imports each entry point in a fresh interpreter with ``-X importtime`` and reports the wall time
+and the slowest modules. Fails (exit status 1) when the median import time is over budget or
+when a heavy dependency that should only load on first use is imported at startup, so it can
+gate CI and container builds.
+
+Usage:
+    python -m benchmarks.import_time [--module bot.app] [--runs 5] [--budget 1.0] [--top 15]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+DEFAULT_MODULES = ("bot.app", "bot.worker")
+
+# Loaded lazily: in chart render workers, on the first report or export, or on the first LLM call
+LAZY_PACKAGES = ("matplotlib", "pandas", "numpy", "openai", "pyarrow")
+
+# Maximum median import time of an entry point, in seconds
+DEFAULT_BUDGET = 1.0
+
+_PROBE = "import sys, time; t = time.perf_counter(); __import__(sys.argv[1]); print(time.perf_counter() - t)"
+
+
+def measure(module: str) -> tuple[float, list[tuple[int, int, str]]]:
+    """
+    Import ``module`` in a fresh interpreter.
+
+    :return: Wall time of the import in seconds and the ``-X importtime`` rows
+             as (self microseconds, cumulative microseconds, indented module name).
+    """
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    result = subprocess.run(  # noqa: S603
+        [sys.executable, "-X", "importtime", "-c", _PROBE, module],
+        capture_output=True,
+        text=True,
+        env=env,
+        check=False,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr}")
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|", 2)
+        # One space separates the columns; nested imports are indented by two more per level
+        rows.append((int(self_us), int(cumulative_us), name.rstrip()[1:]))
+    return float(result.stdout.strip().splitlines()[-1]), rows
+
+
+def check_module(module: str, runs: int, budget: float, top: int) -> bool:
+    timings, rows = [], []
+    for _ in range(runs):
+        elapsed, rows = measure(module)
+        timings.append(elapsed)
+    median = statistics.median(timings)
+
+    imported = {name.strip() for _, _, name in rows}
+    eager = sorted({name.split(".")[0] for name in imported} & set(LAZY_PACKAGES))
+    ok = median <= budget and not eager
+
+    print(f"{'PASS' if ok else 'FAIL'} import {module}: median {median * 1000:.0f} ms (budget {budget * 1000:.0f} ms)")
+    if eager:
+        print(f"  imported at startup but expected lazily: {', '.join(eager)}")
+    print("  slowest top-level imports (cumulative, last run):")
+    top_level = [row for row in rows if not row[2].startswith(" ")]
+    for _, cumulative_us, name in sorted(top_level, reverse=True, key=lambda row: row[1])[:top]:
+        print(f"    {cumulative_us / 1000:8.1f} ms  {name}")
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", action="append", help="Module to import (repeatable); defaults to the entry points")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per module")
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET, help="Maximum median import time in seconds")
+    parser.add_argument("--top", type=int, default=15, help="Number of slowest imports to list")
+    args = parser.parse_args()
+
+    results = [check_module(module, args.runs, args.budget, args.top) for module in args.module or DEFAULT_MODULES]
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+import asyncio
+import logging
+
+from bot.expenses import BUSY_ERRORS, analyze_expense, attach_user, is_invalid_receipt
+from config.config import ALBUM_COLLECT_WINDOW, ALBUM_MAX_SIZE, INGESTION_QUEUE_ENABLED
+from database.bulk import store_receipts_batch
+from database.jobs import enqueue_job_async
+from utils.instrumentation import annotate, request_context, timed
+
+logger = logging.getLogger(__name__)
+
+
+class PendingAlbum:
+    __slots__ = ("bot", "chat_id", "parts", "reply_to", "timer")
+
+    def __init__(self, bot, chat_id: int, reply_to: int):
+        self.bot = bot
+        self.chat_id = chat_id
+        self.reply_to = reply_to
+        self.parts = []
+        self.timer = None
+
+
+class AlbumCollector:
+    """
+    Groups the photos of a Telegram album so they are handled as one unit.
+
+    Telegram delivers every photo of an album as its own update, all sharing a media_group_id.
+    Parts are collected until no new one has arrived for ``window`` seconds (or ``max_size``
+    parts are in), then the whole album is passed to ``handler(bot, chat_id, reply_to, requests)``.
+    """
+
+    def __init__(self, handler, window: float = ALBUM_COLLECT_WINDOW, max_size: int = ALBUM_MAX_SIZE):
+        self.handler = handler
+        self.window = window
+        self.max_size = max_size
+        self._albums = {}
+        self._tasks = set()
+
+    def add(self, bot, message, request: dict) -> None:
+        """Add one album part; must be called from the event loop."""
+        key = (message.chat.id, message.media_group_id)
+        album = self._albums.get(key)
+        if album is None:
+            album = self._albums[key] = PendingAlbum(bot, message.chat.id, message.message_id)
+        else:
+            album.timer.cancel()
+        album.parts.append((message.message_id, request))
+        album.reply_to = min(album.reply_to, message.message_id)
+
+        if len(album.parts) >= self.max_size:
+            self._flush(key)
+        else:
+            album.timer = asyncio.get_running_loop().call_later(self.window, self._flush, key)
+
+    def _flush(self, key) -> None:
+        album = self._albums.pop(key, None)
+        if album is None:
+            return
+        requests = [request for _, request in sorted(album.parts, key=lambda part: part[0])]
+        task = asyncio.create_task(self._run(album, requests))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, album: PendingAlbum, requests: list[dict]) -> None:
+        try:
+            await self.handler(album.bot, album.chat_id, album.reply_to, requests)
+        except Exception:
+            logger.exception(f"Failed to process album of {len(requests)} photos for chat {album.chat_id}")
+
+    async def drain(self) -> None:
+        """Flush every pending album and wait for all albums in progress to finish."""
+        for key in list(self._albums):
+            self._albums[key].timer.cancel()
+            self._flush(key)
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+def format_album_reply(receipts_data: list, receipt_ids: list[int]) -> str:
+    """
+    Summarize an album in one message: one line per photo, in album order, and the total in EUR.
+
+    :param receipts_data: Per-photo analysis results; an exception for photos that failed.
+    :param receipt_ids: IDs of the stored receipts, in the order of the valid results.
+    """
+    stored_ids = iter(receipt_ids)
+    lines, total_euro = [], 0.0
+    for n, receipt_data in enumerate(receipts_data, start=1):
+        if isinstance(receipt_data, BUSY_ERRORS):
+            lines.append(f"{n}. ⏳ Skipped, we're busy right now. Please send it again in a minute.")
+        elif isinstance(receipt_data, BaseException):
+            lines.append(f"{n}. ❌ Could not be processed.")
+        elif is_invalid_receipt(receipt_data):
+            lines.append(f"{n}. ❌ Not a valid receipt.")
+        else:
+            total_euro += float(receipt_data.get("total_price_euro") or 0)
+            lines.append(
+                f"{n}. {float(receipt_data.get('total_price') or 0):.2f} {receipt_data.get('currency', '')} — "
+                f"{receipt_data.get('user_comment', 'No comment')} (ID: {next(stored_ids)})"
+            )
+    return (
+        f"✅ Album processed: {len(receipt_ids)} of {len(receipts_data)} receipts recorded.\n\n"
+        + "\n".join(lines)
+        + f"\n\nTotal: {total_euro:.2f} EUR"
+    )
+
+
+async def analyze_album(bot, requests: list[dict]) -> tuple[list, list[dict]]:
+    """
+    Analyze every photo of an album concurrently.
+
+    :return: The per-photo results in album order (an exception for photos that failed) and the
+             valid receipts, with user data attached, ready to be stored.
+    """
+    # Each analysis downloads its own photo, so downloads and LLM calls overlap
+    receipts_data = await asyncio.gather(
+        *(analyze_expense(bot, request) for request in requests), return_exceptions=True
+    )
+    receipts = []
+    for request, receipt_data in zip(requests, receipts_data, strict=True):
+        if isinstance(receipt_data, BaseException):
+            logger.error(f"Album photo {request['photo_file_id']} failed: {receipt_data!r}")
+        elif not is_invalid_receipt(receipt_data):
+            receipts.append(attach_user(request, receipt_data))
+    annotate(stored=len(receipts))
+    return receipts_data, receipts
+
+
+async def process_album(bot, chat_id: int, reply_to: int, requests: list[dict]) -> None:
+    """
+    Analyze every photo of an album concurrently, store all valid receipts in one transaction
+    and answer with a single summary message. With the ingestion queue enabled the album is
+    queued as one job and the worker sends the summary.
+    """
+    with request_context("album", chat_id=chat_id, photos=len(requests)):
+        if INGESTION_QUEUE_ENABLED:
+            with timed("enqueue"):
+                await enqueue_job_async({"chat_id": chat_id, "reply_to": reply_to, "album": requests})
+            with timed("reply"):
+                await bot.send_message(
+                    chat_id=chat_id,
+                    text=f"⏳ Got it! Processing your {len(requests)} receipts...",
+                    reply_to_message_id=reply_to,
+                )
+            return
+
+        receipts_data, receipts = await analyze_album(bot, requests)
+        receipt_ids = []
+        if receipts:
+            with timed("db_write"):
+                receipt_ids = await asyncio.to_thread(store_receipts_batch, receipts)
+        with timed("reply"):
+            await bot.send_message(
+                chat_id=chat_id, text=format_album_reply(receipts_data, receipt_ids), reply_to_message_id=reply_to
+            )
+
+
+album_collector = AlbumCollector(process_album)
@@ -1,19 +1,46 @@
-import base64
+import asyncio
 import io
 import logging
+import math
+import tempfile
 
-import matplotlib.pyplot as plt
 from telegram import ReplyKeyboardMarkup, Update
 from telegram.ext import Application, CallbackContext, CommandHandler, MessageHandler, filters
 
-from config.config import TELEGRAM_TOKEN
-from database.db import PostgresConnector
-from database.queries import store_receipt_in_db
-from openai_integration.openai_client import process_expense
-
-logging.basicConfig(level=logging.INFO)
+from bot.albums import album_collector
+from bot.charts import chart_cache, render_pie_chart_async
+from bot.expenses import BUSY_ERRORS, BUSY_REPLY, FAILED_REPLY, expense_request_from_message, process_expense_request
+from config.config import (
+    BOT_CONCURRENT_UPDATES,
+    BOT_MODE,
+    DB_PARTITION_BY_MONTH,
+    FX_REFRESH_INTERVAL,
+    INGESTION_QUEUE_ENABLED,
+    METRICS_ADDR,
+    METRICS_PORT,
+    TELEGRAM_TOKEN,
+)
+from database.analytics import (
+    PERIOD_LABELS,
+    PERIODS,
+    SpendingReport,
+    category_totals,
+    category_trends,
+    get_spending_report,
+    month_over_month,
+    top_categories,
+)
+from database.export import EXPORT_FORMATS, export_user_expenses
+from database.fx import ensure_fx_rates
+from database.jobs import enqueue_job_async
+from database.migrations import ensure_partitions
+from database.receipts import get_period_totals, get_recent_receipts
+from utils.instrumentation import annotate, configure_logging, request_context, start_metrics_server, timed
+
+configure_logging()
 
 EXPENSE_BUTTON = [["Add Expense"], ["View Spending Chart"]]
+MAX_LAST_RECEIPTS = 10
 
 
 async def start(update: Update, context: CallbackContext) -> None:
@@ -32,118 +59,261 @@ async def handle_expense(update: Update, context: CallbackContext) -> None:
     Processes messages containing expense data.
     If the user sends a photo or text (excluding "View Spending Chart" and "Add Expense"),
     it attempts to analyze the receipt. If the receipt is invalid, an error message is returned.
+    With the ingestion queue enabled, the expense is queued for a worker and acknowledged right away.
+    Photos sent as an album are collected and processed together, with a single reply.
     """
     if update.edited_message:
         return
 
-    text_input = None
-    image_bytes = None
-    message_prefix = None
+    request = expense_request_from_message(update.message)
+    if request is None:
+        # If the message does not match the expected input, ignore it
+        return
 
-    if update.message.photo:
-        photo_file = await update.message.photo[-1].get_file()
-        image_bytes = await photo_file.download_as_bytearray()
+    if update.message.media_group_id and request.get("photo_file_id"):
+        album_collector.add(context.bot, update.message, request)
+        return
 
-        # Use the photo caption as text input if provided; otherwise, use a default message
-        text_input = update.message.caption if update.message.caption else "Extract and analyze this receipt."
-        message_prefix = "Receipt processed"
+    kind = "photo" if request.get("photo_file_id") else "text"
+    with request_context("expense", chat_id=request["chat_id"], kind=kind):
+        if INGESTION_QUEUE_ENABLED:
+            with timed("enqueue"):
+                job_id = await enqueue_job_async(request)
+            with timed("reply"):
+                await update.message.reply_text(f"⏳ Got it! Processing your expense (job {job_id})...")
+            return
+
+        try:
+            reply = await process_expense_request(context.bot, request)
+        except BUSY_ERRORS:
+            reply = BUSY_REPLY
+        except Exception:
+            # E.g. the LLM still failing after every retry
+            logging.exception(f"Failed to process expense for chat {request['chat_id']}")
+            reply = FAILED_REPLY
+        with timed("reply"):
+            await update.message.reply_text(reply)
 
-    elif update.message.text and update.message.text not in ["Add Expense", "View Spending Chart"]:
-        text_input = update.message.text
-        message_prefix = "Expense recorded"
 
-    else:
-        # If the message does not match the expected input, ignore it
+async def handle_spending_chart(update: Update, context: CallbackContext) -> None:
+    """
+    Handles the request to send a spending chart for the last 2 weeks, 1 month, or 3 months.
+    The period is the optional command argument (14d, 30d or 90d) and defaults to 30d.
+    Rendered charts are cached per user until that user stores a new receipt.
+    """
+    logging.info(f"handle_spending_chart triggered with message: '{update.message.text}'")
+    period = context.args[0].lower() if context.args else "30d"
+    if period not in PERIODS:
+        await update.message.reply_text(f"Usage: /view_spending_chart [{'|'.join(PERIODS)}]")
         return
 
-    receipt_data = process_expense(text=text_input, image_bytes=image_bytes)
-    if receipt_data.get("error") == "Invalid receipt":
-        error_message = (
-            "❌ The provided image does not appear to be a valid receipt."
-            if image_bytes
-            else "❌ The provided text does not appear to be a valid receipt."
-        )
-        await update.message.reply_text(error_message)
+    user_id = update.message.chat.id
+    with request_context("chart", chat_id=user_id, period=period):
+        cache_key = chart_cache.key(user_id, period)
+        png = chart_cache.get(cache_key)
+        annotate(cache_hit=png is not None)
+
+        if png is None:
+            with timed("db_read"):
+                spending_data = await asyncio.to_thread(get_spending_data, user_id, period)
+            if not spending_data:
+                await update.message.reply_text(f"No expenses recorded in the {PERIOD_LABELS[period]}.")
+                return
+            # Render the pie chart in a worker process, away from the event loop
+            with timed("render"):
+                png = await render_pie_chart_async(spending_data)
+            chart_cache.put(cache_key, png)
+
+        buf = io.BytesIO(png)
+        buf.name = "chart.png"  # Set a name attribute for Telegram
+
+        # Send the pie chart as a photo using the BytesIO object directly
+        with timed("reply"):
+            await update.message.reply_photo(photo=buf)
+
+
+async def handle_export(update: Update, context: CallbackContext) -> None:
+    """
+    Handles the /export [csv|parquet] command, sending the user's receipts and items as a file.
+    The file is built by streaming rows from the database, so memory use does not grow with history.
+    """
+    fmt = context.args[0].lower() if context.args else "csv"
+    if fmt not in EXPORT_FORMATS:
+        await update.message.reply_text(f"Usage: /export [{'|'.join(EXPORT_FORMATS)}]")
         return
 
-    # Append user data for database storage
-    receipt_data["user_id"] = update.message.chat.id
-    receipt_data["username"] = update.message.chat.username
+    user_id = update.message.chat.id
+    with request_context("export", chat_id=user_id, format=fmt), tempfile.TemporaryFile() as export_file:
+        with timed("db_read"):
+            rows = await asyncio.to_thread(export_user_expenses, user_id, export_file, fmt)
+        annotate(rows=rows)
+        if not rows:
+            await update.message.reply_text("No expenses to export yet.")
+            return
 
-    receipt_id = store_receipt_in_db(receipt_data)
+        export_file.seek(0)
+        with timed("reply"):
+            await update.message.reply_document(
+                document=export_file, filename=f"expenses.{fmt}", caption=f"📄 {rows} expense rows"
+            )
 
-    items_text = "\n".join(
-        [
-            f"- {item['name']}: {item['price']} {item['currency']} ({item['category']} → {item['subcategory']})"
-            for item in receipt_data.get("items", [])
-        ]
-    )
 
-    await update.message.reply_text(
-        f"✅ {message_prefix} (ID: {receipt_id}).\n\n"
-        f"Comment: {receipt_data.get('user_comment', 'No comment')}\n"
-        "Items:\n" + items_text
-    )
+async def handle_report(update: Update, context: CallbackContext) -> None:
+    """
+    Handles the /report command: totals for every period, top categories, the month-over-month
+    change and the fastest-growing category, all from a single query.
+    """
+    user_id = update.message.chat.id
+    with request_context("report", chat_id=user_id):
+        with timed("db_read"):
+            report = await asyncio.to_thread(get_spending_report, user_id)
+        with timed("reply"):
+            await update.message.reply_text(format_spending_report(report))
 
 
-async def handle_spending_chart(update: Update, context: CallbackContext) -> None:
+async def handle_last_receipts(update: Update, context: CallbackContext) -> None:
     """
-    Handles the request to send a spending chart for the last 2 weeks, 1 month, or 3 months.
+    Handles the /last [N] command, listing the user's N most recent receipts (default 1, at most 10).
+    Repeated requests are answered from the receipt cache until the user stores a new receipt.
     """
-    logging.info(f"handle_spending_chart triggered with message: '{update.message.text}'")
-    # Example data retrieval logic (you'll need to implement this)
-    spending_data = get_spending_data()  # Implement this function to fetch data from your database
+    try:
+        limit = int(context.args[0]) if context.args else 1
+    except ValueError:
+        limit = 0
+    if not 1 <= limit <= MAX_LAST_RECEIPTS:
+        await update.message.reply_text(f"Usage: /last [1-{MAX_LAST_RECEIPTS}]")
+        return
 
-    # Generate pie chart
-    labels = list(spending_data.keys())
-    sizes = list(spending_data.values())
+    user_id = update.message.chat.id
+    with request_context("last_receipts", chat_id=user_id, limit=limit):
+        with timed("db_read"):
+            # Always the same window, so /last with any N is served by one cache entry
+            receipts = (await asyncio.to_thread(get_recent_receipts, user_id, MAX_LAST_RECEIPTS))[:limit]
+        with timed("reply"):
+            await update.message.reply_text(
+                "\n\n".join(format_receipt(receipt) for receipt in receipts) or "No expenses recorded yet."
+            )
+
+
+def format_receipt(receipt) -> str:
+    lines = [
+        f"🧾 {receipt.created_at:%Y-%m-%d %H:%M} — {receipt.total_price:.2f} {receipt.currency} "
+        f"({receipt.total_price_euro:.2f} EUR) (ID: {receipt.id})"
+    ]
+    if receipt.user_comment:
+        lines.append(receipt.user_comment)
+    lines += [f"- {item.name}: {item.price:.2f} {item.currency} ({item.category})" for item in receipt.items]
+    return "\n".join(lines)
+
+
+async def handle_totals(update: Update, context: CallbackContext) -> None:
+    """
+    Handles the /totals command: EUR totals and receipt counts for the last 2 weeks, 1 month and 3 months.
+    Repeated requests are answered from the receipt cache until the user stores a new receipt.
+    """
+    user_id = update.message.chat.id
+    with request_context("totals", chat_id=user_id):
+        with timed("db_read"):
+            totals = await asyncio.to_thread(get_period_totals, user_id)
+        lines = [
+            f"{PERIOD_LABELS[period].capitalize()}: {total.total_euro:.2f} EUR ({total.receipts} receipts)"
+            for period, total in totals.items()
+        ]
+        with timed("reply"):
+            await update.message.reply_text("\n".join(lines))
 
-    fig, ax = plt.subplots()
-    ax.pie(sizes, labels=labels, autopct="%1.1f%%", startangle=90)
-    ax.axis("equal")  # Equal aspect ratio ensures that pie is drawn as a circle.
 
-    # Save the pie chart to a BytesIO object
-    buf = io.BytesIO()
-    plt.savefig(buf, format="png")
-    buf.seek(0)
-    buf.name = "chart.png"  # Set a name attribute for Telegram
-    plt.close(fig)
+def format_spending_report(report: SpendingReport) -> str:
+    if report.periods.empty:
+        return "No expenses recorded yet."
 
-    # Send the pie chart as a photo using the BytesIO object directly
-    await update.message.reply_photo(photo=buf)
+    lines = ["📊 Spending report (EUR)", ""]
+    totals = report.periods.sum()
+    lines += [f"{PERIOD_LABELS[period].capitalize()}: {totals[period]:.2f}" for period in PERIODS]
 
+    top = top_categories(report, "30d")
+    if not top.empty:
+        lines += ["", f"Top categories ({PERIOD_LABELS['30d']}):"]
+        lines += [f"- {category}: {total:.2f}" for category, total in top.items()]
 
-def get_spending_data():
-    """
-    Fetches spending data from the database and returns it as a dictionary.
-    This function queries spending per category (in EUR) for the last 30 days.
+    mom = month_over_month(report).iloc[-1]
+    change = "" if math.isnan(mom["pct_change"]) else f" ({mom['pct_change']:+.1f}% vs last month)"
+    lines += ["", f"This month: {mom['total']:.2f}{change}"]
+
+    trends = category_trends(report)
+    if not trends.empty and trends.iloc[0] > 0:
+        lines.append(f"Growing fastest: {trends.index[0]} (+{trends.iloc[0]:.2f}/month)")
 
-    It joins the items table with the receipts table based on the receipt_id, then sums the item_price
-    for each category where the receipt's created_at is within the last 30 days and the item currency is 'EUR'.
+    if report.unconverted:
+        lines += ["", f"⚠️ Not included (no exchange rate): {', '.join(report.unconverted)}"]
+    return "\n".join(lines)
+
+
+def get_spending_data(user_id: int, period: str = "30d") -> dict:
     """
-    query = """
-        SELECT i.category, SUM(i.item_price) AS total_spending
-        FROM expensetrackerai_items i
-        JOIN expensetrackerai_receipts r ON i.receipt_id = r.id
-        WHERE r.created_at >= NOW() - INTERVAL '30 days'
-          AND i.item_currency = 'EUR'
-        GROUP BY i.category;
+    Fetches spending data from the database and returns it as a dictionary.
+    This function returns one user's spending per category for the last 2 weeks, 1 month or 3 months,
+    converted to EUR with the cached FX rates and read from the daily spending rollup in one query.
     """
-    with PostgresConnector() as db:
-        result = db.fetch(query)
+    return category_totals(get_spending_report(user_id), period)
 
-    # Convert the list of tuples to a dictionary
-    spending_data = {category: float(total_spending) for category, total_spending in result}
-    return spending_data
 
+async def refresh_fx_rates_periodically(interval: float) -> None:
+    """Refresh stale FX rates now and then every ``interval`` seconds, off the event loop."""
+    while True:
+        await asyncio.to_thread(ensure_fx_rates)
+        await asyncio.sleep(interval)
 
-def main() -> None:
+
+async def start_background_tasks(application: Application) -> None:
+    """Start the periodic FX-rate refresh; reports convert currencies with the cached rates."""
+    if FX_REFRESH_INTERVAL > 0:
+        application.bot_data["fx_refresh"] = asyncio.create_task(refresh_fx_rates_periodically(FX_REFRESH_INTERVAL))
+
+
+async def stop_background_tasks(application: Application) -> None:
+    """Stop the FX-rate refresh and finish albums that are still being collected or processed."""
+    fx_refresh = application.bot_data.pop("fx_refresh", None)
+    if fx_refresh is not None:
+        fx_refresh.cancel()
+    await album_collector.drain()
+
+
+def build_application(
+    base_url: str | None = None, base_file_url: str | None = None, updater: bool = True
+) -> Application:
     """
-    Initializes the bot and registers handlers.
+    Builds the Telegram application and registers handlers.
+    ``base_url``/``base_file_url`` point the bot at a different Bot API server (e.g. a local stand-in).
+    Pass ``updater=False`` when updates are fed into the update queue by something else, e.g. a webhook server.
     """
-    application = Application.builder().token(TELEGRAM_TOKEN).build()
+    # Process updates concurrently so one slow LLM call doesn't hold up other users
+    builder = (
+        Application.builder()
+        .token(TELEGRAM_TOKEN)
+        .concurrent_updates(BOT_CONCURRENT_UPDATES)
+        .post_init(start_background_tasks)
+        .post_stop(stop_background_tasks)
+    )
+    if base_url:
+        builder = builder.base_url(base_url)
+    if base_file_url:
+        builder = builder.base_file_url(base_file_url)
+    if not updater:
+        builder = builder.updater(None)
+    application = builder.build()
     application.add_handler(CommandHandler("start", start))
 
+    # Handler for the /report command
+    application.add_handler(CommandHandler("report", handle_report))
+
+    # Handlers for the /last and /totals commands
+    application.add_handler(CommandHandler("last", handle_last_receipts))
+    application.add_handler(CommandHandler("totals", handle_totals))
+
+    # Handler for the /export command
+    application.add_handler(CommandHandler("export", handle_export))
+
     # Handler for the /view_spending_chart command
     application.add_handler(CommandHandler("view_spending_chart", handle_spending_chart))
 
@@ -156,7 +326,27 @@ def main() -> None:
     application.add_handler(
         MessageHandler((filters.TEXT | filters.PHOTO) & ~filters.Regex("(?i)^View Spending Chart$"), handle_expense)
     )
+    return application
+
+
+def main() -> None:
+    """
+    Initializes the bot and registers handlers.
+    """
+    if DB_PARTITION_BY_MONTH:
+        # Make sure receipts for the coming months land in their own partitions
+        ensure_partitions()
+
+    if BOT_MODE == "webhook":
+        from bot.webhook import run_webhook
+
+        run_webhook()
+        return
+
+    if METRICS_PORT:
+        start_metrics_server(METRICS_PORT, METRICS_ADDR)
 
+    application = build_application()
     application.run_polling()
 
 
@@ -0,0 +1,110 @@
+import asyncio
+import io
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+from config.config import CHART_CACHE_MAX_ENTRIES, CHART_CACHE_TTL, CHART_WORKERS
+from database.events import register_receipt_listener
+
+# Never probe for a GUI backend, here or in the spawned render workers (which inherit the environment)
+os.environ.setdefault("MPLBACKEND", "Agg")
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def render_pie_chart(spending_data: dict) -> bytes:
+    """
+    Render a spending-per-category pie chart as PNG bytes.
+
+    Uses a standalone Figure with the Agg canvas instead of pyplot, so no global state is shared
+    between renders. matplotlib is imported here, in the render worker, so the bot itself never loads it.
+    """
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    fig = Figure()
+    FigureCanvasAgg(fig)
+    ax = fig.subplots()
+    ax.pie(list(spending_data.values()), labels=list(spending_data.keys()), autopct="%1.1f%%", startangle=90)
+    ax.axis("equal")  # Equal aspect ratio ensures that pie is drawn as a circle.
+
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png")
+    return buf.getvalue()
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    # Started on the first render, so processes that never draw a chart don't spawn workers
+    global _executor  # noqa: PLW0603
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=CHART_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _executor
+
+
+async def render_pie_chart_async(spending_data: dict) -> bytes:
+    """Render the chart in the worker process pool so the bot's event loop is never blocked."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), render_pie_chart, spending_data)
+
+
+class ChartCache:
+    """
+    LRU cache of rendered chart PNGs keyed on (user, period, data version, day).
+
+    Each user's data version is bumped whenever one of their receipts is stored, which makes
+    their cached charts unreachable; the day is part of the key so rolling windows move on.
+    Receipts stored by other processes (queue workers) don't bump the version, so entries also
+    expire after ``ttl`` seconds.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._charts = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def key(self, user_id: int, period: str) -> tuple:
+        with self._lock:
+            version = self._versions.get(user_id, 0)
+        return user_id, period, version, date.today()  # noqa: DTZ011
+
+    def get(self, key: tuple) -> bytes | None:
+        with self._lock:
+            entry = self._charts.get(key)
+            if entry is None:
+                return None
+            expires_at, png = entry
+            if expires_at < time.monotonic():
+                del self._charts[key]
+                return None
+            self._charts.move_to_end(key)
+            return png
+
+    def put(self, key: tuple, png: bytes) -> None:
+        with self._lock:
+            self._charts[key] = (time.monotonic() + self.ttl, png)
+            self._charts.move_to_end(key)
+            while len(self._charts) > self.max_entries:
+                self._charts.popitem(last=False)
+
+    def invalidate_user(self, user_id: int) -> None:
+        with self._lock:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+            for key in [key for key in self._charts if key[0] == user_id]:
+                del self._charts[key]
+
+    def on_receipts_stored(self, receipt_ids: list[int], receipts: list) -> None:
+        for user_id in {receipt.get("user_id") for receipt in receipts}:
+            self.invalidate_user(user_id)
+
+
+chart_cache = ChartCache(CHART_CACHE_MAX_ENTRIES, CHART_CACHE_TTL)
+register_receipt_listener(chart_cache.on_receipts_stored)
@@ -0,0 +1,148 @@
+import logging
+
+from config.config import LOCAL_CATEGORIZER_ENABLED
+from database.queries import store_receipt_in_db_async
+from openai_integration.batcher import text_expense_batcher
+from openai_integration.cache import expense_cache, image_cache_key, photo_cache_key, text_cache_key
+from openai_integration.image_preprocessing import preprocess_image_async, select_photo_size
+from openai_integration.local_categorizer import local_categorizer
+from openai_integration.openai_client import process_expense_async
+from openai_integration.resilience import CircuitOpenError
+from openai_integration.scheduler import SchedulerOverloaded
+from utils.instrumentation import annotate, timed
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PHOTO_PROMPT = "Extract and analyze this receipt."
+BUSY_REPLY = "⏳ We're handling a lot of expenses right now. Please send this one again in a minute."
+FAILED_REPLY = "❌ Sorry, we couldn't process this expense."
+# Errors meaning the LLM is overloaded or too slow right now, rather than the expense being unprocessable
+BUSY_ERRORS = (SchedulerOverloaded, CircuitOpenError, TimeoutError)
+BUTTON_TEXTS = ["Add Expense", "View Spending Chart"]
+
+
+def expense_request_from_message(message) -> dict | None:
+    """
+    Extracts everything needed to process an expense from a Telegram message.
+
+    The result is a JSON-serializable dict, so it can be processed inline or stored as a queue job.
+    Returns None for messages that are not expenses (button presses, empty messages).
+    """
+    request = {"chat_id": message.chat.id, "username": message.chat.username}
+    if message.photo:
+        photo = select_photo_size(message.photo)
+        # Use the photo caption as text input if provided; otherwise, use a default message
+        request["text"] = message.caption if message.caption else DEFAULT_PHOTO_PROMPT
+        request["photo_file_id"] = photo.file_id
+        request["photo_file_unique_id"] = photo.file_unique_id
+        return request
+    if message.text and message.text not in BUTTON_TEXTS:
+        request["text"] = message.text
+        return request
+    return None
+
+
+async def analyze_expense(bot, request: dict) -> dict:
+    """
+    Turns an expense request into structured receipt data.
+
+    Tries, in order: the result cache, the local categorizer (text only) and finally the LLM,
+    where text expenses are micro-batched with other users' (see TextExpenseBatcher).
+    Photos are only downloaded from Telegram when the cache cannot answer.
+    """
+    text_input = request["text"]
+    image_bytes = None
+
+    if request.get("photo_file_id"):
+        # A repeated photo is answered from the cache without downloading it again
+        cache_keys = [photo_cache_key(request["photo_file_unique_id"], text_input)]
+        with timed("cache"):
+            receipt_data = await expense_cache.get_async(*cache_keys)
+        if receipt_data is None:
+            with timed("download"):
+                photo_file = await bot.get_file(request["photo_file_id"])
+                image_bytes = await photo_file.download_as_bytearray()
+            cache_keys.append(image_cache_key(image_bytes, text_input))
+            with timed("cache"):
+                receipt_data = await expense_cache.get_async(cache_keys[-1])
+                if receipt_data is not None:
+                    await expense_cache.set_async(cache_keys[:1], receipt_data)
+    else:
+        cache_keys = [text_cache_key(text_input)]
+        with timed("cache"):
+            receipt_data = await expense_cache.get_async(*cache_keys)
+        if receipt_data is None and LOCAL_CATEGORIZER_ENABLED:
+            # Familiar expenses are categorized from the user's own history without an LLM call
+            with timed("local_categorizer"):
+                receipt_data = await local_categorizer.categorize_async(request["chat_id"], text_input)
+            logger.info(f"Local categorizer stats: {local_categorizer.stats()}")
+            if receipt_data is not None:
+                annotate(source="local")
+                return receipt_data
+
+    if receipt_data is None:
+        image_mime = "image/jpeg"
+        if image_bytes:
+            with timed("preprocess"):
+                image_bytes, image_mime = await preprocess_image_async(image_bytes)
+        with timed("llm"):
+            if image_bytes:
+                receipt_data = await process_expense_async(
+                    text=text_input, image_bytes=image_bytes, image_mime=image_mime, user_id=request["chat_id"]
+                )
+            else:
+                # Text expenses from concurrent users share requests
+                receipt_data = await text_expense_batcher.analyze(text_input, request["chat_id"])
+        annotate(source="llm")
+        with timed("cache"):
+            await expense_cache.set_async(cache_keys, receipt_data)
+    else:
+        annotate(source="cache")
+        logger.info(f"Expense cache hit ({expense_cache.stats()})")
+    return receipt_data
+
+
+def is_invalid_receipt(receipt_data: dict) -> bool:
+    return receipt_data.get("error") == "Invalid receipt"
+
+
+def invalid_receipt_reply(request: dict) -> str:
+    if request.get("photo_file_id"):
+        return "❌ The provided image does not appear to be a valid receipt."
+    return "❌ The provided text does not appear to be a valid receipt."
+
+
+def attach_user(request: dict, receipt_data: dict) -> dict:
+    """Append user data for database storage."""
+    receipt_data["user_id"] = request["chat_id"]
+    receipt_data["username"] = request["username"]
+    return receipt_data
+
+
+def format_expense_reply(request: dict, receipt_data: dict, receipt_id: int) -> str:
+    message_prefix = "Receipt processed" if request.get("photo_file_id") else "Expense recorded"
+    items_text = "\n".join(
+        [
+            f"- {item['name']}: {float(item['price']):.2f} {item['currency']} "
+            f"({item['category']} → {item['subcategory']})"
+            for item in receipt_data.get("items", [])
+        ]
+    )
+    return (
+        f"✅ {message_prefix} (ID: {receipt_id}).\n\n"
+        f"Comment: {receipt_data.get('user_comment', 'No comment')}\n"
+        "Items:\n" + items_text
+    )
+
+
+async def process_expense_request(bot, request: dict) -> str:
+    """
+    Analyzes and stores one expense inline and returns the reply text for the user.
+    """
+    receipt_data = await analyze_expense(bot, request)
+    if is_invalid_receipt(receipt_data):
+        return invalid_receipt_reply(request)
+
+    with timed("db_write"):
+        receipt_id = await store_receipt_in_db_async(attach_user(request, receipt_data))
+    return format_expense_reply(request, receipt_data, receipt_id)
@@ -0,0 +1,396 @@
+#!/usr/bin/env python
+"""
+Bulk offline importer for receipt archives.
+
+Walks files and directories of receipt photos, text notes and bank CSV exports. Each distinct
+expense is analyzed once, and the results are stored for one user in large batches:
+
+    python -m bot.importer PATH [PATH ...] --user-id CHAT_ID [--workers N] [--rate R] [--batch-size B]
+
+Images (.jpg, .jpeg, .png, .webp, .gif) are one receipt each. Text files (.txt) hold one expense
+per blank-line-separated paragraph. CSV files hold one expense per row, described to the model
+as ``column: value`` pairs.
+
+Receipts are dated when the expense happened, not when it was imported: the CSV's date column,
+a photo's EXIF capture time, or otherwise the file's modification time.
+
+Inputs are deduplicated by content hash, using the same keys as the expense cache, so
+re-imports and photos the bot has already seen are answered from the cache. Every stored or
+rejected input is appended to a checkpoint file once its batch has committed; an interrupted
+run started again for the same user with the same checkpoint skips them and continues where it
+stopped.
+"""
+
+import argparse
+import csv
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+from typing import NamedTuple
+
+import pytz
+from PIL import Image
+
+from bot.expenses import DEFAULT_PHOTO_PROMPT, attach_user, is_invalid_receipt
+from config.config import IMAGE_PREPROCESSING, IMPORT_BATCH_SIZE, IMPORT_RATE_LIMIT, IMPORT_WORKERS
+from database.bulk import store_receipts_batch
+from openai_integration.cache import expense_cache, image_cache_key, text_cache_key
+from openai_integration.image_preprocessing import image_mime_type, preprocess_image
+from openai_integration.openai_client import process_expense
+from utils.instrumentation import configure_logging
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".gif")
+TEXT_EXTENSIONS = (".txt",)
+CSV_EXTENSIONS = (".csv",)
+DEFAULT_CHECKPOINT = ".expensetracker-import.jsonl"
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+# CSV date columns are found by name; values are tried as ISO dates first, then day-first formats
+DATE_COLUMN_WORDS = ("date", "datum", "fecha", "data", "day")
+DATE_FORMATS = ("%d.%m.%Y", "%d/%m/%Y", "%d-%m-%Y", "%d.%m.%y", "%d/%m/%y", "%Y/%m/%d")
+EXIF_IFD = 0x8769
+EXIF_DATETIME_ORIGINAL = 36867
+EXIF_DATETIME = 306
+
+
+class ImportItem(NamedTuple):
+    key: str
+    source: str
+    text: str
+    image_path: Path | None = None
+    created_at: str | None = None  # in the receipts' local time; None for the import time
+
+
+class RateLimiter:
+    """Spaces calls at least ``1 / rate`` seconds apart across all threads; a rate of 0 disables it."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next)
+            self._next = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class Checkpoint:
+    """
+    Append-only JSON-lines record of the inputs that no longer need processing for one user.
+    Entries of other users in the same file are kept but ignored.
+    """
+
+    def __init__(self, path: str | Path, user_id: int):
+        self.path = Path(path)
+        self.user_id = user_id
+        self.done = set()
+        if self.path.exists():
+            with self.path.open(encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        if entry.get("user_id") == user_id:
+                            self.done.add(entry["key"])
+        self._file = self.path.open("a", encoding="utf-8")
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.done
+
+    def record(self, entries: list[dict]) -> None:
+        """Durably append ``entries``; call only after the receipts they describe are committed."""
+        for entry in entries:
+            self._file.write(json.dumps({"user_id": self.user_id, **entry}) + "\n")
+            self.done.add(entry["key"])
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class Progress:
+    """Single-line progress and throughput display on stderr."""
+
+    def __init__(self, total: int, stream=sys.stderr, interval: float = 0.5):
+        self.total = total
+        self.stream = stream
+        self.interval = interval
+        self.counts = {"stored": 0, "invalid": 0, "failed": 0}
+        self.started = time.perf_counter()
+        self._last_render = 0.0
+
+    @property
+    def done(self) -> int:
+        return sum(self.counts.values())
+
+    def update(self, status: str, n: int = 1) -> None:
+        self.counts[status] += n
+        now = time.perf_counter()
+        if now - self._last_render >= self.interval or self.done == self.total:
+            self._last_render = now
+            self.render()
+
+    def render(self, end: str = "") -> None:
+        elapsed = time.perf_counter() - self.started
+        rate = self.done / elapsed if elapsed else 0.0
+        eta = (self.total - self.done) / rate if rate else 0.0
+        self.stream.write(
+            f"\r{self.done}/{self.total} processed | {self.counts['stored']} stored, "
+            f"{self.counts['invalid']} invalid, {self.counts['failed']} failed | "
+            f"{rate:.2f} items/s | ETA {eta:.0f}s{end}"
+        )
+        self.stream.flush()
+
+
+def _iter_paths(paths: list[str]):
+    for path in map(Path, paths):
+        if path.is_dir():
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    yield Path(root) / name
+        else:
+            yield path
+
+
+def _local_timestamp(moment: datetime) -> str:
+    return moment.astimezone(pytz.timezone("Asia/Nicosia")).strftime(TIMESTAMP_FORMAT)
+
+
+def _file_timestamp(path: Path) -> str:
+    return _local_timestamp(datetime.fromtimestamp(path.stat().st_mtime, tz=pytz.utc))
+
+
+def _image_timestamp(path: Path) -> str:
+    """The photo's EXIF capture time, taken as local time, or the file's modification time."""
+    try:
+        with Image.open(path) as image:
+            exif = image.getexif()
+            value = exif.get_ifd(EXIF_IFD).get(EXIF_DATETIME_ORIGINAL) or exif.get(EXIF_DATETIME)
+        if value:
+            taken = datetime.strptime(value.strip("\x00 "), "%Y:%m:%d %H:%M:%S")  # noqa: DTZ007
+            return taken.strftime(TIMESTAMP_FORMAT)
+    except (OSError, ValueError):
+        pass
+    return _file_timestamp(path)
+
+
+def parse_csv_date(value: str) -> str | None:
+    """Parse a bank export date (ISO or day-first) into a created_at timestamp, or None."""
+    value = value.strip()
+    try:
+        return datetime.fromisoformat(value).strftime(TIMESTAMP_FORMAT)
+    except ValueError:
+        pass
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).strftime(TIMESTAMP_FORMAT)  # noqa: DTZ007
+        except ValueError:
+            continue
+    return None
+
+
+def _date_column(columns) -> str | None:
+    for column in columns or ():
+        name = (column or "").casefold()
+        if "date" in name or "datum" in name or set(re.findall(r"[^\W\d_]+", name)) & set(DATE_COLUMN_WORDS):
+            return column
+    return None
+
+
+def _text_items(path: Path):
+    with path.open(encoding="utf-8") as f:
+        paragraph, start = [], 1
+        for line_number, line in enumerate(f, start=1):
+            if line.strip():
+                if not paragraph:
+                    start = line_number
+                paragraph.append(line.strip())
+            elif paragraph:
+                yield f"{path}:{start}", "\n".join(paragraph)
+                paragraph = []
+        if paragraph:
+            yield f"{path}:{start}", "\n".join(paragraph)
+
+
+def _csv_items(path: Path):
+    """Yield (source, text, created_at) per row; rows without a readable date get the file's time."""
+    file_timestamp = _file_timestamp(path)
+    with path.open(encoding="utf-8-sig", newline="") as f:
+        sample = f.read(4096)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+        except csv.Error:
+            dialect = csv.excel
+        reader = csv.DictReader(f, dialect=dialect)
+        date_column = _date_column(reader.fieldnames)
+        for row in reader:
+            text = "; ".join(f"{column}: {value}" for column, value in row.items() if column and value)
+            if text:
+                created_at = parse_csv_date(row.get(date_column) or "") if date_column else None
+                yield f"{path}:{reader.line_num}", text, created_at or file_timestamp
+
+
+def discover_items(paths: list[str]):
+    """
+    Yield one ImportItem per distinct expense found under ``paths``.
+    Duplicates (identical image bytes or normalized text) are yielded only once.
+    """
+    seen = set()
+    for path in _iter_paths(paths):
+        extension = path.suffix.lower()
+        if extension in IMAGE_EXTENSIONS:
+            # Images are hashed here and read again by the worker, so they are never all in memory
+            key = image_cache_key(path.read_bytes(), DEFAULT_PHOTO_PROMPT)
+            found = [ImportItem(key, str(path), DEFAULT_PHOTO_PROMPT, path, _image_timestamp(path))]
+        elif extension in TEXT_EXTENSIONS:
+            created_at = _file_timestamp(path)
+            found = (
+                ImportItem(text_cache_key(text), source, text, created_at=created_at)
+                for source, text in _text_items(path)
+            )
+        elif extension in CSV_EXTENSIONS:
+            found = (
+                ImportItem(text_cache_key(text), source, text, created_at=created_at)
+                for source, text, created_at in _csv_items(path)
+            )
+        else:
+            logger.debug(f"Skipping unsupported file {path}")
+            continue
+        for item in found:
+            if item.key not in seen:
+                seen.add(item.key)
+                yield item
+
+
+def analyze_item(item: ImportItem, limiter: RateLimiter) -> dict:
+    """Analyze one input, answering from the expense cache when possible."""
+    receipt_data = expense_cache.get(item.key)
+    if receipt_data is not None:
+        return receipt_data
+
+    image_bytes, image_mime = None, "image/jpeg"
+    if item.image_path:
+        image_bytes = item.image_path.read_bytes()
+        if IMAGE_PREPROCESSING:
+            image_bytes, image_mime = preprocess_image(image_bytes)
+        else:
+            image_mime = image_mime_type(image_bytes)
+
+    limiter.wait()
+    receipt_data = process_expense(text=item.text, image_bytes=image_bytes, image_mime=image_mime)
+    expense_cache.set([item.key], receipt_data)
+    return receipt_data
+
+
+def run_import(
+    paths: list[str],
+    user_id: int,
+    *,
+    username: str | None = None,
+    workers: int = IMPORT_WORKERS,
+    rate: float = IMPORT_RATE_LIMIT,
+    batch_size: int = IMPORT_BATCH_SIZE,
+    checkpoint_path: str = DEFAULT_CHECKPOINT,
+) -> dict:
+    """
+    Import every expense under ``paths`` for one user.
+
+    :param paths: Files and directories to import.
+    :param user_id: Telegram chat ID the receipts belong to.
+    :param username: Telegram username stored with the receipts.
+    :param workers: Number of inputs analyzed concurrently.
+    :param rate: Maximum LLM requests per second across all workers; 0 for no limit.
+    :param batch_size: Receipts written per database transaction.
+    :param checkpoint_path: File recording finished inputs, for resuming.
+    :return: Counts of stored, invalid and failed inputs.
+    """
+    checkpoint = Checkpoint(checkpoint_path, user_id)
+    found = list(discover_items(paths))
+    items = [item for item in found if item.key not in checkpoint]
+    skipped = len(found) - len(items)
+    logger.info(f"Importing {len(items)} new inputs for user {user_id} ({skipped} already in the checkpoint)")
+
+    request = {"chat_id": user_id, "username": username}
+    limiter = RateLimiter(rate)
+    progress = Progress(len(items))
+    receipts, created_at, entries = [], [], []
+
+    def flush() -> None:
+        if not entries:
+            return
+        if receipts:
+            store_receipts_batch(receipts, created_at)
+        checkpoint.record(entries)
+        progress.update("stored", len(receipts))
+        progress.update("invalid", len(entries) - len(receipts))
+        receipts.clear()
+        created_at.clear()
+        entries.clear()
+
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="import")
+    try:
+        futures = {pool.submit(analyze_item, item, limiter): item for item in items}
+        for future in as_completed(futures):
+            item = futures[future]
+            try:
+                receipt_data = future.result()
+            except Exception as e:
+                # Not checkpointed, so the input is retried on the next run
+                logger.warning(f"Failed to analyze {item.source}: {e!r}")
+                progress.update("failed")
+                continue
+            if is_invalid_receipt(receipt_data):
+                entries.append({"key": item.key, "source": item.source, "status": "invalid"})
+            else:
+                receipts.append(attach_user(request, dict(receipt_data)))
+                created_at.append(item.created_at)
+                entries.append({"key": item.key, "source": item.source, "status": "stored"})
+            if len(receipts) >= batch_size:
+                flush()
+    finally:
+        # On Ctrl-C, drop queued inputs but keep everything already analyzed
+        pool.shutdown(wait=True, cancel_futures=True)
+        flush()
+        checkpoint.close()
+        progress.render(end="\n")
+    return dict(progress.counts)
+
+
+if __name__ == "__main__":
+    configure_logging()
+    parser = argparse.ArgumentParser(description="Import a directory of receipt photos, notes and bank CSVs.")
+    parser.add_argument("paths", nargs="+", help="Files or directories to import")
+    parser.add_argument("--user-id", type=int, required=True, help="Telegram chat ID that owns the receipts")
+    parser.add_argument("--username", default=None, help="Telegram username stored with the receipts")
+    parser.add_argument("--workers", type=int, default=IMPORT_WORKERS, help="Inputs analyzed concurrently")
+    parser.add_argument("--rate", type=float, default=IMPORT_RATE_LIMIT, help="Max LLM requests per second (0 = off)")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE, help="Receipts per transaction")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT, help="Progress file used to resume a run")
+    args = parser.parse_args()
+    counts = run_import(
+        args.paths,
+        user_id=args.user_id,
+        username=args.username,
+        workers=args.workers,
+        rate=args.rate,
+        batch_size=args.batch_size,
+        checkpoint_path=args.checkpoint,
+    )
+    sys.exit(1 if counts["failed"] else 0)
@@ -0,0 +1,286 @@
+#!/usr/bin/env python
+"""
+Webhook serving mode for ExpenseTrackerAI.
+
+Telegram pushes updates to WEBHOOK_URL; the built-in HTTP server acknowledges each one as soon
+as it is queued, and the application processes up to BOT_CONCURRENT_UPDATES of them at once.
+With WEBHOOK_PROCESSES > 1, that many bot processes listen on the same port (SO_REUSEPORT) and
+the kernel spreads incoming connections across them; put any HTTP load balancer in front to
+scale across nodes, using /healthz to take draining processes out of rotation.
+
+Every request must carry the secret token Telegram was registered with: WEBHOOK_SECRET_TOKEN, or
+a random one generated at startup when only WEBHOOK_URL is set. Without either, the server
+refuses to start.
+
+Album photos arrive as separate updates that are grouped in memory, so all parts of an album
+have to reach the same process. With several processes, each chat's album parts belong to one
+of them (chat ID modulo the number of processes); a process that receives a part for another
+process forwards it over that process's Unix socket and answers Telegram with its status.
+
+On SIGTERM/SIGINT a process stops accepting updates, finishes the ones already received and
+only then exits.
+
+    python -m bot.webhook [--processes N]    # or BOT_MODE=webhook python bot/app.py
+"""
+
+import argparse
+import asyncio
+import hmac
+import json
+import logging
+import multiprocessing
+import secrets
+import shutil
+import signal
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+import tornado.httpserver
+import tornado.netutil
+import tornado.web
+from telegram import Bot, Update
+
+from bot.app import build_application
+from config.config import (
+    METRICS_ADDR,
+    METRICS_PORT,
+    TELEGRAM_TOKEN,
+    WEBHOOK_DRAIN_TIMEOUT,
+    WEBHOOK_LISTEN,
+    WEBHOOK_MAX_CONNECTIONS,
+    WEBHOOK_PATH,
+    WEBHOOK_PORT,
+    WEBHOOK_PROCESSES,
+    WEBHOOK_SECRET_TOKEN,
+    WEBHOOK_URL,
+)
+from utils.instrumentation import start_metrics_server
+
+logger = logging.getLogger(__name__)
+
+SECRET_TOKEN_HEADER = "X-Telegram-Bot-Api-Secret-Token"  # noqa: S105
+
+
+class ServerState:
+    __slots__ = ("draining",)
+
+    def __init__(self):
+        self.draining = False
+
+
+class AlbumRouter:
+    """
+    Sends every album part of a chat to the same process.
+
+    Each process also listens on a Unix socket in ``socket_dir``; parts received by another
+    process are forwarded there with the original body and secret token.
+    """
+
+    def __init__(self, socket_dir: str, processes: int, index: int, secret_token: str):
+        self.socket_dir = socket_dir
+        self.processes = processes
+        self.index = index
+        self.secret_token = secret_token
+        self._clients = {}
+
+    def socket_path(self, index: int) -> str:
+        return str(Path(self.socket_dir) / f"webhook-{index}.sock")
+
+    def owner(self, data: dict) -> int | None:
+        """Index of the process that must handle this update, or None if any process may."""
+        message = data.get("message") or {}
+        if not message.get("media_group_id") or not message.get("chat"):
+            return None
+        owner = message["chat"]["id"] % self.processes
+        return None if owner == self.index else owner
+
+    async def forward(self, owner: int, body: bytes) -> int:
+        """Post the update to its owner process; returns the HTTP status it answered with."""
+        client = self._clients.get(owner)
+        if client is None:
+            transport = httpx.AsyncHTTPTransport(uds=self.socket_path(owner))
+            client = self._clients[owner] = httpx.AsyncClient(transport=transport, base_url="http://webhook")
+        try:
+            response = await client.post(
+                WEBHOOK_PATH,
+                content=body,
+                headers={SECRET_TOKEN_HEADER: self.secret_token, "Content-Type": "application/json"},
+            )
+        except httpx.HTTPError as e:
+            logger.warning(f"Could not forward album part to webhook process {owner}: {e!r}")
+            return 503
+        return response.status_code
+
+    async def aclose(self) -> None:
+        for client in self._clients.values():
+            await client.aclose()
+
+
+class WebhookHandler(tornado.web.RequestHandler):
+    """Receives one update per POST and hands it to the application's update queue."""
+
+    def initialize(self, bot_application, state: ServerState, secret_token: str, router: AlbumRouter | None):
+        self.bot_application = bot_application
+        self.state = state
+        self.secret_token = secret_token
+        self.router = router
+
+    async def post(self) -> None:
+        if not hmac.compare_digest(self.request.headers.get(SECRET_TOKEN_HEADER, ""), self.secret_token):
+            raise tornado.web.HTTPError(403)
+        if self.state.draining:
+            # Telegram retries later, by then on a process that is still serving
+            raise tornado.web.HTTPError(503)
+        try:
+            data = json.loads(self.request.body)
+        except ValueError as e:
+            raise tornado.web.HTTPError(400) from e
+
+        owner = self.router.owner(data) if self.router else None
+        if owner is not None:
+            # Telegram retries the update if the owner could not take it
+            self.set_status(await self.router.forward(owner, self.request.body))
+            return
+
+        update = Update.de_json(data, self.bot_application.bot)
+        await self.bot_application.update_queue.put(update)
+        self.set_status(200)
+
+
+class HealthHandler(tornado.web.RequestHandler):
+    def initialize(self, state: ServerState):
+        self.state = state
+
+    def get(self) -> None:
+        self.set_status(503 if self.state.draining else 200)
+        self.finish("draining" if self.state.draining else "ok")
+
+
+async def register_webhook(secret_token: str, url: str = WEBHOOK_URL) -> None:
+    """Point Telegram at ``url``; pending updates are kept, so nothing is lost when switching modes."""
+    async with Bot(TELEGRAM_TOKEN) as bot:
+        await bot.set_webhook(
+            url=url,
+            secret_token=secret_token,
+            max_connections=WEBHOOK_MAX_CONNECTIONS,
+            allowed_updates=Update.ALL_TYPES,
+        )
+    logger.info(f"Webhook registered at {url}")
+
+
+async def serve(secret_token: str, index: int = 0, processes: int = 1, socket_dir: str | None = None) -> None:
+    """
+    Serve webhook updates in this process until SIGINT/SIGTERM, then drain and exit.
+
+    :param secret_token: Token every update request must carry in SECRET_TOKEN_HEADER.
+    :param index: Process number, used to give each process its own metrics port.
+    :param processes: Number of processes serving the webhook together.
+    :param socket_dir: Directory of the processes' Unix sockets, for routing album parts.
+    """
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    if METRICS_PORT:
+        start_metrics_server(METRICS_PORT + index, METRICS_ADDR)
+
+    application = build_application(updater=False)
+    state = ServerState()
+    router = AlbumRouter(socket_dir, processes, index, secret_token) if processes > 1 else None
+    webhook_args = {"bot_application": application, "state": state, "secret_token": secret_token, "router": router}
+    routes = [(WEBHOOK_PATH, WebhookHandler, webhook_args), ("/healthz", HealthHandler, {"state": state})]
+    server = tornado.httpserver.HTTPServer(tornado.web.Application(routes), xheaders=True)
+    server.add_sockets(tornado.netutil.bind_sockets(WEBHOOK_PORT, WEBHOOK_LISTEN, reuse_port=True))
+    if router is not None:
+        server.add_socket(tornado.netutil.bind_unix_socket(router.socket_path(index)))
+
+    async with application:
+        await application.start()
+        if application.post_init:
+            await application.post_init(application)
+        logger.info(f"Webhook process {index} listening on {WEBHOOK_LISTEN}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+        await stop.wait()
+
+        logger.info(f"Webhook process {index} draining")
+        state.draining = True
+        server.stop()
+        await server.close_all_connections()
+        if router is not None:
+            await router.aclose()
+        # Processes the queued updates and waits for the handlers still running
+        await application.stop()
+        if application.post_stop:
+            await application.post_stop(application)
+    logger.info(f"Webhook process {index} stopped")
+
+
+def _serve_process(secret_token: str, index: int, processes: int, socket_dir: str) -> None:
+    asyncio.run(serve(secret_token, index, processes, socket_dir))
+
+
+def webhook_secret_token() -> str:
+    """
+    WEBHOOK_SECRET_TOKEN, or a fresh random token when the webhook is registered at startup.
+
+    :raises RuntimeError: If neither WEBHOOK_SECRET_TOKEN nor WEBHOOK_URL is set, since the
+                          server would then accept updates from anyone.
+    """
+    if WEBHOOK_SECRET_TOKEN:
+        return WEBHOOK_SECRET_TOKEN
+    if WEBHOOK_URL:
+        return secrets.token_urlsafe(32)
+    raise RuntimeError("Set WEBHOOK_SECRET_TOKEN (or WEBHOOK_URL, to register the webhook with a generated one)")
+
+
+def run_webhook(processes: int = WEBHOOK_PROCESSES) -> None:
+    """
+    Register the webhook and serve it from ``processes`` processes sharing one port.
+    Processes that have not drained within WEBHOOK_DRAIN_TIMEOUT of a shutdown signal are killed.
+    """
+    secret_token = webhook_secret_token()
+    if WEBHOOK_URL:
+        asyncio.run(register_webhook(secret_token))
+    if processes <= 1:
+        asyncio.run(serve(secret_token))
+        return
+
+    socket_dir = tempfile.mkdtemp(prefix="expensetracker-webhook-")
+    context = multiprocessing.get_context("spawn")
+    children = [
+        context.Process(target=_serve_process, args=(secret_token, n, processes, socket_dir), name=f"webhook-{n}")
+        for n in range(processes)
+    ]
+    for child in children:
+        child.start()
+
+    deadline = None
+
+    def shutdown(signum, frame) -> None:
+        nonlocal deadline
+        if deadline is None:
+            deadline = time.monotonic() + WEBHOOK_DRAIN_TIMEOUT
+            for child in children:
+                if child.is_alive():
+                    child.terminate()
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+    while any(child.is_alive() for child in children):
+        for child in children:
+            child.join(timeout=0.5)
+        if deadline is not None and time.monotonic() > deadline:
+            for child in children:
+                if child.is_alive():
+                    logger.warning(f"{child.name} did not drain in time; killing it")
+                    child.kill()
+    shutil.rmtree(socket_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the bot through a Telegram webhook.")
+    parser.add_argument("--processes", type=int, default=WEBHOOK_PROCESSES, help="Bot processes sharing the port")
+    args = parser.parse_args()
+    run_webhook(args.processes)
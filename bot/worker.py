@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+"""
+Standalone ingestion worker for ExpenseTrackerAI.
+
+Claims expense jobs queued by the bot, runs the analysis and the database write, and sends the
+reply to the user (one summary per album). Users are also told when their job is given up on,
+whether it failed on every attempt or its last worker died while holding it. Start as many
+workers as needed, on any number of nodes:
+
+    python -m bot.worker [--concurrency N]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import logging
+import signal
+import socket
+import uuid
+
+from telegram import Bot
+
+from bot.albums import analyze_album, format_album_reply
+from bot.expenses import (
+    FAILED_REPLY,
+    analyze_expense,
+    attach_user,
+    format_expense_reply,
+    invalid_receipt_reply,
+    is_invalid_receipt,
+)
+from config.config import (
+    METRICS_ADDR,
+    METRICS_PORT,
+    QUEUE_POLL_INTERVAL,
+    QUEUE_VISIBILITY_TIMEOUT,
+    QUEUE_WORKER_CONCURRENCY,
+    TELEGRAM_TOKEN,
+)
+from database.jobs import (
+    JOB_FAILED,
+    Job,
+    claim_job,
+    complete_album_job,
+    complete_job,
+    expire_jobs,
+    extend_job,
+    fail_job,
+)
+from utils.instrumentation import configure_logging, request_context, start_metrics_server, timed
+
+configure_logging()
+logger = logging.getLogger(__name__)
+
+
+async def _keep_lease(job: Job, worker_id: str) -> None:
+    """Extend the job's lease periodically while it is being processed."""
+    while True:
+        await asyncio.sleep(QUEUE_VISIBILITY_TIMEOUT / 3)
+        if not await asyncio.to_thread(extend_job, job.id, worker_id, QUEUE_VISIBILITY_TIMEOUT):
+            logger.warning(f"Lost the lease on job {job.id}")
+            return
+
+
+async def _run_expense_job(bot: Bot, job: Job, worker_id: str) -> str | None:
+    """Analyze and store a single expense; return the reply, or None if the lease was lost."""
+    request = job.payload
+    receipt_data = await analyze_expense(bot, request)
+    if is_invalid_receipt(receipt_data):
+        await asyncio.to_thread(complete_job, job.id, worker_id)
+        return invalid_receipt_reply(request)
+    receipt = attach_user(request, receipt_data)
+    with timed("db_write"):
+        receipt_id = await asyncio.to_thread(complete_job, job.id, worker_id, receipt)
+    if receipt_id is None:
+        return None
+    return format_expense_reply(request, receipt_data, receipt_id)
+
+
+async def _run_album_job(bot: Bot, job: Job, worker_id: str) -> str | None:
+    """
+    Analyze and store a whole album; return its summary, or None if the lease was lost.
+
+    Photos that fail are reported in the summary; the job is only retried if all of them failed.
+    """
+    receipts_data, receipts = await analyze_album(bot, job.payload["album"])
+    if all(isinstance(receipt_data, BaseException) for receipt_data in receipts_data):
+        raise receipts_data[0]
+    with timed("db_write"):
+        receipt_ids = await asyncio.to_thread(complete_album_job, job.id, worker_id, receipts)
+    if receipt_ids is None:
+        return None
+    return format_album_reply(receipts_data, receipt_ids)
+
+
+async def handle_job(bot: Bot, job: Job, worker_id: str) -> None:
+    """Process one claimed job: analyze, store and complete atomically, then reply."""
+    request = job.payload
+    heartbeat = asyncio.create_task(_keep_lease(job, worker_id))
+    try:
+        if "album" in request:
+            reply = await _run_album_job(bot, job, worker_id)
+        else:
+            reply = await _run_expense_job(bot, job, worker_id)
+        if reply is None:
+            logger.warning(f"Job {job.id} was taken over by another worker; dropping result")
+            return
+    except Exception as e:
+        logger.exception(f"Job {job.id} failed on attempt {job.attempts}/{job.max_attempts}")
+        status = await asyncio.to_thread(fail_job, job.id, worker_id, repr(e))
+        if status == JOB_FAILED:
+            await _send_failed_reply(bot, job)
+        return
+    finally:
+        heartbeat.cancel()
+
+    with timed("reply"):
+        await bot.send_message(chat_id=request["chat_id"], text=reply, reply_to_message_id=request.get("reply_to"))
+
+
+async def _send_failed_reply(bot: Bot, job: Job) -> None:
+    request = job.payload
+    await bot.send_message(chat_id=request["chat_id"], text=FAILED_REPLY, reply_to_message_id=request.get("reply_to"))
+
+
+async def _expire_loop(bot: Bot, stop: asyncio.Event) -> None:
+    """Fail jobs abandoned on their last attempt (e.g. by a crashed worker) and tell their users."""
+    while not stop.is_set():
+        try:
+            for job in await asyncio.to_thread(expire_jobs):
+                logger.warning(f"Job {job.id} was abandoned on attempt {job.attempts}/{job.max_attempts}")
+                with request_context("job", job_id=job.id, chat_id=job.payload.get("chat_id"), attempt=job.attempts):
+                    await _send_failed_reply(bot, job)
+        except Exception:
+            logger.exception("Failed to expire abandoned jobs")
+        with contextlib.suppress(TimeoutError):
+            await asyncio.wait_for(stop.wait(), timeout=QUEUE_POLL_INTERVAL)
+
+
+async def _worker_loop(bot: Bot, worker_id: str, stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        job = await asyncio.to_thread(claim_job, worker_id, QUEUE_VISIBILITY_TIMEOUT)
+        if job is None:
+            with contextlib.suppress(TimeoutError):
+                await asyncio.wait_for(stop.wait(), timeout=QUEUE_POLL_INTERVAL)
+            continue
+        try:
+            with request_context("job", job_id=job.id, chat_id=job.payload.get("chat_id"), attempt=job.attempts):
+                await handle_job(bot, job, worker_id)
+        except Exception:
+            logger.exception(f"Unexpected error while finishing job {job.id}")
+
+
+async def run_worker(concurrency: int = QUEUE_WORKER_CONCURRENCY) -> None:
+    """
+    Run ``concurrency`` job loops until SIGINT/SIGTERM; jobs in progress are finished before exit.
+    """
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    if METRICS_PORT:
+        start_metrics_server(METRICS_PORT, METRICS_ADDR)
+
+    worker_prefix = f"{socket.gethostname()}-{uuid.uuid4().hex[:8]}"
+    logger.info(f"Worker {worker_prefix} started with concurrency {concurrency}")
+    async with Bot(TELEGRAM_TOKEN) as bot:
+        await asyncio.gather(
+            _expire_loop(bot, stop),
+            *(_worker_loop(bot, f"{worker_prefix}-{n}", stop) for n in range(concurrency)),
+        )
+    logger.info(f"Worker {worker_prefix} stopped")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Process queued expense jobs.")
+    parser.add_argument("--concurrency", type=int, default=QUEUE_WORKER_CONCURRENCY, help="Jobs processed at once")
+    args = parser.parse_args()
+    asyncio.run(run_worker(args.concurrency))
@@ -5,6 +5,8 @@ from dotenv import load_dotenv
 load_dotenv()
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+# Override to send requests to an OpenAI-compatible server, e.g. the benchmark stand-in
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
 
 DB_NAME = os.getenv("DB_NAME")
 DB_USER = os.getenv("DB_USER")
@@ -20,3 +22,120 @@ POSTGRES_USER = os.getenv("POSTGRES_USER", "localhost")
 POSTGRES_PASSWORD = os.getenv("POSTGRES_PASSWORD", "5432")
 POSTGRES_HOST = os.getenv("POSTGRES_HOST", "localhost")
 POSTGRES_PORT = os.getenv("POSTGRES_PORT", "5432")
+
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_POOL_MAX_IDLE = float(os.getenv("DB_POOL_MAX_IDLE", "300"))
+DB_POOL_CHECKOUT_TIMEOUT = float(os.getenv("DB_POOL_CHECKOUT_TIMEOUT", "30"))
+DB_POOL_HEALTH_CHECK_AFTER = float(os.getenv("DB_POOL_HEALTH_CHECK_AFTER", "30"))
+
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "16"))
+BOT_CONCURRENT_UPDATES = int(os.getenv("BOT_CONCURRENT_UPDATES", "64"))
+
+EXPENSE_CACHE_BACKEND = os.getenv("EXPENSE_CACHE_BACKEND", "memory")
+EXPENSE_CACHE_MAX_ENTRIES = int(os.getenv("EXPENSE_CACHE_MAX_ENTRIES", "10000"))
+EXPENSE_CACHE_TTL = float(os.getenv("EXPENSE_CACHE_TTL", str(7 * 24 * 3600)))
+
+IMAGE_PREPROCESSING = os.getenv("IMAGE_PREPROCESSING", "true").lower() == "true"
+IMAGE_MIN_SHORT_SIDE = int(os.getenv("IMAGE_MIN_SHORT_SIDE", "720"))
+IMAGE_MAX_SIDE = int(os.getenv("IMAGE_MAX_SIDE", "1536"))
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "75"))
+IMAGE_GRAYSCALE = os.getenv("IMAGE_GRAYSCALE", "true").lower() == "true"
+IMAGE_AUTOCROP = os.getenv("IMAGE_AUTOCROP", "false").lower() == "true"
+# Shrink photos until they fit this many 512px vision tiles (85 + 170 tokens each); 0 = no limit
+IMAGE_MAX_TILES = int(os.getenv("IMAGE_MAX_TILES", "0"))
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "4"))
+
+CHART_WORKERS = int(os.getenv("CHART_WORKERS", "2"))
+CHART_CACHE_MAX_ENTRIES = int(os.getenv("CHART_CACHE_MAX_ENTRIES", "1000"))
+# Receipts stored by queue workers only reach the bot's caches once these expire
+CHART_CACHE_TTL = float(os.getenv("CHART_CACHE_TTL", "300"))
+
+# In-process cache of receipt reads; writes from this process invalidate it at once, writes from
+# other processes (queue workers, other webhook processes) become visible after the TTL
+RECEIPT_CACHE_MAX_RECEIPTS = int(os.getenv("RECEIPT_CACHE_MAX_RECEIPTS", "20000"))
+RECEIPT_CACHE_MAX_USERS = int(os.getenv("RECEIPT_CACHE_MAX_USERS", "5000"))
+RECEIPT_CACHE_TTL = float(os.getenv("RECEIPT_CACHE_TTL", "300"))
+
+DB_PARTITION_BY_MONTH = os.getenv("DB_PARTITION_BY_MONTH", "false").lower() == "true"
+DB_PARTITION_MONTHS_AHEAD = int(os.getenv("DB_PARTITION_MONTHS_AHEAD", "3"))
+
+LOCAL_CATEGORIZER_ENABLED = os.getenv("LOCAL_CATEGORIZER_ENABLED", "true").lower() == "true"
+LOCAL_CATEGORIZER_MIN_CONFIDENCE = float(os.getenv("LOCAL_CATEGORIZER_MIN_CONFIDENCE", "0.85"))
+LOCAL_CATEGORIZER_MAX_USERS = int(os.getenv("LOCAL_CATEGORIZER_MAX_USERS", "1000"))
+LOCAL_CATEGORIZER_INDEX_TTL = float(os.getenv("LOCAL_CATEGORIZER_INDEX_TTL", "600"))
+
+INGESTION_QUEUE_ENABLED = os.getenv("INGESTION_QUEUE_ENABLED", "false").lower() == "true"
+QUEUE_WORKER_CONCURRENCY = int(os.getenv("QUEUE_WORKER_CONCURRENCY", "8"))
+QUEUE_VISIBILITY_TIMEOUT = float(os.getenv("QUEUE_VISIBILITY_TIMEOUT", "300"))
+QUEUE_POLL_INTERVAL = float(os.getenv("QUEUE_POLL_INTERVAL", "1"))
+QUEUE_MAX_ATTEMPTS = int(os.getenv("QUEUE_MAX_ATTEMPTS", "5"))
+QUEUE_RETRY_BASE_DELAY = float(os.getenv("QUEUE_RETRY_BASE_DELAY", "5"))
+QUEUE_RETRY_MAX_DELAY = float(os.getenv("QUEUE_RETRY_MAX_DELAY", "600"))
+
+# Port for the Prometheus metrics endpoint; 0 disables it
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))
+METRICS_ADDR = os.getenv("METRICS_ADDR", "127.0.0.1")
+
+# Rows fetched per round-trip by streaming (server-side cursor) reads
+DB_FETCH_SIZE = int(os.getenv("DB_FETCH_SIZE", "2000"))
+
+# Bulk importer (python -m bot.importer): concurrent analyses, LLM requests per second (0 = unlimited)
+# and receipts written per transaction
+IMPORT_WORKERS = int(os.getenv("IMPORT_WORKERS", "8"))
+IMPORT_RATE_LIMIT = float(os.getenv("IMPORT_RATE_LIMIT", "5"))
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "100"))
+
+# Photos sharing a media_group_id (an album) are collected until none has arrived for this many seconds
+ALBUM_COLLECT_WINDOW = float(os.getenv("ALBUM_COLLECT_WINDOW", "1.0"))
+ALBUM_MAX_SIZE = int(os.getenv("ALBUM_MAX_SIZE", "10"))
+
+# Reference FX rates (ECB eurofxref XML format) cached in the database for currency conversion
+FX_RATES_URL = os.getenv("FX_RATES_URL", "https://www.ecb.europa.eu/stats/eurofxref/eurofxref-daily.xml")
+FX_RATES_MAX_AGE_DAYS = int(os.getenv("FX_RATES_MAX_AGE_DAYS", "1"))
+# How often (seconds) the running bot checks whether the cached rates are stale (0 = never)
+FX_REFRESH_INTERVAL = float(os.getenv("FX_REFRESH_INTERVAL", "3600"))
+
+# "polling" (default) or "webhook"; webhook mode serves updates from WEBHOOK_PROCESSES processes
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+# Public HTTPS URL Telegram posts updates to; the webhook is (re)registered at startup when set
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")  # noqa: S104
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+# Required unless WEBHOOK_URL is set, in which case a random token is registered at startup
+WEBHOOK_SECRET_TOKEN = os.getenv("WEBHOOK_SECRET_TOKEN")
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+# Processes sharing WEBHOOK_PORT; album parts are forwarded to the process that owns their chat
+WEBHOOK_PROCESSES = int(os.getenv("WEBHOOK_PROCESSES", "1"))
+WEBHOOK_DRAIN_TIMEOUT = float(os.getenv("WEBHOOK_DRAIN_TIMEOUT", "30"))
+
+# Fair scheduling of LLM calls: a global tokens-per-minute budget (0 = unlimited), a per-user
+# token bucket (calls per second and burst size) and queue limits beyond which requests are shed
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "200000"))
+LLM_USER_RATE = float(os.getenv("LLM_USER_RATE", "0.5"))
+LLM_USER_BURST = int(os.getenv("LLM_USER_BURST", "10"))
+LLM_MAX_QUEUE_PER_USER = int(os.getenv("LLM_MAX_QUEUE_PER_USER", "20"))
+LLM_MAX_QUEUE_TOTAL = int(os.getenv("LLM_MAX_QUEUE_TOTAL", "500"))
+
+# Tail latency of OpenAI calls: a deadline for the whole call (retries included) and a timeout per
+# attempt, jittered exponential backoff between retries, hedging (a duplicate request once an
+# attempt is slower than the recent p95) and a per-model circuit breaker with a cheaper fallback
+OPENAI_DEADLINE = float(os.getenv("OPENAI_DEADLINE", "60"))
+OPENAI_REQUEST_TIMEOUT = float(os.getenv("OPENAI_REQUEST_TIMEOUT", "25"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "3"))
+OPENAI_RETRY_BASE_DELAY = float(os.getenv("OPENAI_RETRY_BASE_DELAY", "0.5"))
+OPENAI_RETRY_MAX_DELAY = float(os.getenv("OPENAI_RETRY_MAX_DELAY", "8"))
+OPENAI_HEDGING = os.getenv("OPENAI_HEDGING", "false").lower() == "true"
+OPENAI_HEDGE_MIN_DELAY = float(os.getenv("OPENAI_HEDGE_MIN_DELAY", "1.0"))
+OPENAI_HEDGE_MIN_SAMPLES = int(os.getenv("OPENAI_HEDGE_MIN_SAMPLES", "20"))
+OPENAI_FALLBACK_MODEL = os.getenv("OPENAI_FALLBACK_MODEL") or None
+OPENAI_BREAKER_WINDOW = int(os.getenv("OPENAI_BREAKER_WINDOW", "50"))
+OPENAI_BREAKER_MIN_CALLS = int(os.getenv("OPENAI_BREAKER_MIN_CALLS", "10"))
+OPENAI_BREAKER_FAILURE_RATIO = float(os.getenv("OPENAI_BREAKER_FAILURE_RATIO", "0.5"))
+OPENAI_BREAKER_COOLDOWN = float(os.getenv("OPENAI_BREAKER_COOLDOWN", "30"))
+
+# Text expenses arriving within LLM_BATCH_WINDOW seconds of each other, from any user, share one
+# request of up to LLM_BATCH_MAX_SIZE expenses (1 = one request per expense)
+LLM_BATCH_MAX_SIZE = int(os.getenv("LLM_BATCH_MAX_SIZE", "8"))
+LLM_BATCH_WINDOW = float(os.getenv("LLM_BATCH_WINDOW", "0.05"))
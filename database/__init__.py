@@ -1,5 +1,15 @@
-from database.schema import create_tables
-from database.receipts import store_receipt, get_receipt
+from database.bulk import store_receipt_with_items, store_receipts_batch
 from database.items import store_items
+from database.receipts import get_period_totals, get_receipt, get_recent_receipts, store_receipt
+from database.schema import create_tables
 
-__all__ = ['create_tables', 'store_receipt', 'get_receipt', 'store_items']
+__all__ = [
+    "create_tables",
+    "get_period_totals",
+    "get_receipt",
+    "get_recent_receipts",
+    "store_items",
+    "store_receipt",
+    "store_receipt_with_items",
+    "store_receipts_batch",
+]
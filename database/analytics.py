@@ -0,0 +1,161 @@
+"""
+Spending analytics for ExpenseTrackerAI.
+
+A report for one user is built from a single query over the daily spending rollup: GROUPING SETS
+return the per-category totals for every rolling period and per-month totals in one pass, with
+every amount converted to EUR through the cached FX-rate table (see database.fx). Rankings,
+month-over-month deltas and trends are then computed on the small result with pandas/NumPy,
+which are imported on the first report rather than at bot startup.
+"""
+
+from datetime import date, timedelta
+from typing import TYPE_CHECKING, NamedTuple
+
+from database.db import PostgresConnector
+from database.rollup import local_today
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Rolling periods offered by charts and reports, in days (counting back from today)
+PERIODS = {"14d": 14, "30d": 30, "90d": 90}
+PERIOD_LABELS = {"14d": "last 2 weeks", "30d": "last month", "90d": "last 3 months"}
+
+_PERIOD_COLUMNS = ",\n           ".join(
+    f"SUM(s.total / fx.units_per_eur) FILTER (WHERE s.day > %(today)s - {days}) AS last_{period}"
+    for period, days in PERIODS.items()
+)
+
+# Only the PERIODS constants are formatted in; user input is always passed as a parameter
+SPENDING_REPORT_QUERY = f"""
+    SELECT s.category,
+           date_trunc('month', s.day)::date AS month,
+           GROUPING(date_trunc('month', s.day)) AS is_period_row,
+           {_PERIOD_COLUMNS},
+           SUM(s.total / fx.units_per_eur) AS total_eur,
+           ARRAY_AGG(DISTINCT s.currency) FILTER (WHERE fx.units_per_eur IS NULL) AS unconverted
+    FROM expensetrackerai_daily_spending s
+    LEFT JOIN expensetrackerai_fx_rates fx ON fx.currency = s.currency
+    WHERE s.user_id = %(user_id)s AND s.day >= %(since)s
+    GROUP BY GROUPING SETS ((s.category, date_trunc('month', s.day)), (s.category));
+"""  # noqa: S608
+
+
+class SpendingReport(NamedTuple):
+    periods: "pd.DataFrame"  # index: category, one EUR column per PERIODS key
+    monthly: "pd.DataFrame"  # index: first day of each month, one EUR column per category
+    unconverted: tuple  # currencies without a cached FX rate, left out of every total
+
+
+def _first_month(today: date, months: int) -> date:
+    month = today.year * 12 + today.month - 1 - (months - 1)
+    return date(month // 12, month % 12 + 1, 1)
+
+
+def build_report(rows: list, today: date, months: int) -> SpendingReport:
+    """
+    Shape the rows of SPENDING_REPORT_QUERY into a SpendingReport.
+
+    :param rows: Query result rows.
+    :param today: The day the rolling periods end on.
+    :param months: Number of calendar months (including the current one) in ``monthly``.
+    """
+    import pandas as pd
+
+    columns = ["category", "month", "is_period_row", *(f"last_{p}" for p in PERIODS), "total_eur", "unconverted"]
+    frame = pd.DataFrame(rows, columns=columns)
+    month_index = pd.date_range(_first_month(today, months), periods=months, freq="MS")
+    if frame.empty:
+        return SpendingReport(pd.DataFrame(columns=list(PERIODS), dtype=float), pd.DataFrame(index=month_index), ())
+
+    period_rows = frame[frame["is_period_row"] == 1]
+
+    periods = (
+        period_rows.set_index("category")[[f"last_{p}" for p in PERIODS]]
+        .astype(float)
+        .fillna(0.0)
+        .set_axis(list(PERIODS), axis=1)
+    )
+
+    monthly = (
+        frame[frame["is_period_row"] == 0]
+        .assign(month=lambda f: pd.to_datetime(f["month"]), total_eur=lambda f: f["total_eur"].astype(float))
+        .pivot_table(index="month", columns="category", values="total_eur", aggfunc="sum", fill_value=0.0)
+        .reindex(month_index, fill_value=0.0)
+    )
+
+    unconverted = sorted({currency for group in period_rows["unconverted"].dropna() for currency in group})
+    return SpendingReport(periods, monthly, tuple(unconverted))
+
+
+def get_spending_report(user_id: int, months: int = 6, today: date | None = None) -> SpendingReport:
+    """
+    Fetch one user's spending for every rolling period and the last ``months`` calendar months
+    with a single query on the rollup's primary key.
+
+    :param user_id: Telegram chat ID of the user.
+    :param months: Number of calendar months (including the current one) to break down.
+    :param today: End of the rolling periods. Defaults to today in the receipts' timezone.
+    :return: The user's SpendingReport, in EUR.
+    """
+    today = today or local_today()
+    since = min(_first_month(today, months), today - timedelta(days=max(PERIODS.values())))
+    params = {"user_id": user_id, "since": since, "today": today}
+    with PostgresConnector() as db:
+        rows = db.fetch(SPENDING_REPORT_QUERY, params)
+    return build_report(rows, today, months)
+
+
+def category_totals(report: SpendingReport, period: str = "30d") -> dict:
+    """Non-zero spending per category over ``period``, largest first."""
+    totals = report.periods[period]
+    totals = totals[totals > 0].sort_values(ascending=False)
+    return {category: round(float(total), 2) for category, total in totals.items()}
+
+
+def top_categories(report: SpendingReport, period: str = "30d", n: int = 5) -> "pd.Series":
+    """The ``n`` largest categories over ``period``; everything else is summed into 'Other'."""
+    import pandas as pd
+
+    totals = report.periods[period]
+    totals = totals[totals > 0].sort_values(ascending=False)
+    top = totals.iloc[:n]
+    rest = totals.iloc[n:].sum()
+    if rest > 0:
+        top = pd.concat([top.drop("Other", errors="ignore"), pd.Series({"Other": rest + top.get("Other", 0.0)})])
+    return top
+
+
+def month_over_month(report: SpendingReport) -> "pd.DataFrame":
+    """
+    Total spending per month with the change from the previous month.
+
+    :return: DataFrame indexed by month with 'total', 'change' (EUR) and 'pct_change' (%) columns;
+             'pct_change' is NaN where the previous month had no spending.
+    """
+    import pandas as pd
+
+    totals = report.monthly.sum(axis=1)
+    previous = totals.shift(1)
+    return pd.DataFrame(
+        {
+            "total": totals,
+            "change": totals - previous,
+            "pct_change": (totals - previous) / previous.where(previous > 0) * 100,
+        }
+    )
+
+
+def category_trends(report: SpendingReport) -> "pd.Series":
+    """
+    Least-squares trend of each category's monthly spending, in EUR per month.
+    All categories are fitted at once; positive values mean spending is growing.
+    """
+    import numpy as np
+    import pandas as pd
+
+    monthly = report.monthly
+    if len(monthly) < 2 or monthly.empty:
+        return pd.Series(0.0, index=monthly.columns)
+    slopes = np.polyfit(np.arange(len(monthly)), monthly.to_numpy(dtype=float), 1)[0]
+    return pd.Series(slopes, index=monthly.columns).sort_values(ascending=False)
@@ -0,0 +1,81 @@
+from psycopg2.extras import execute_values
+
+from database.db import PostgresConnector
+from database.events import notify_receipts_stored
+from database.items import insert_item_rows, item_row
+from database.receipts import current_timestamp, receipt_row
+from database.rollup import apply_rollup
+
+
+def insert_receipts(cursor, receipts: list, created_at: str | list | None = None) -> list[int]:
+    """
+    Insert receipts and all their items on the given cursor without committing.
+
+    Receipts go in with one multi-row ``INSERT ... RETURNING id``, items with a second
+    multi-row ``INSERT`` and the daily spending rollup with one upsert, so the cost is three
+    round-trips regardless of batch size.
+
+    :param cursor: Open cursor; the caller owns the transaction.
+    :param receipts: Parsed receipts, each with an optional 'items' list.
+    :param created_at: Timestamp for every receipt, or a list with one per receipt (e.g. the dates
+                       of imported expenses). The current time is used where it is None.
+    :return: Receipt IDs in the same order as ``receipts``.
+    """
+    if not receipts:
+        return []
+    now = current_timestamp()
+    if isinstance(created_at, list):
+        timestamps = [timestamp or now for timestamp in created_at]
+    else:
+        timestamps = [created_at or now] * len(receipts)
+
+    insert_receipts_query = """
+        INSERT INTO expensetrackerai_receipts (
+            created_at, user_id, username, total_price, currency, total_price_euro, user_comment
+        ) VALUES %s
+        RETURNING id;
+    """
+    rows = [
+        receipt_row(json_response, timestamp) for json_response, timestamp in zip(receipts, timestamps, strict=True)
+    ]
+    returned = execute_values(cursor, insert_receipts_query, rows, page_size=len(rows), fetch=True)
+    receipt_ids = [row[0] for row in returned]
+
+    item_rows = [
+        item_row(receipt_id, item_data, timestamp)
+        for receipt_id, json_response, timestamp in zip(receipt_ids, receipts, timestamps, strict=True)
+        for item_data in json_response.get("items", [])
+    ]
+    insert_item_rows(cursor, item_rows)
+    user_ids = {
+        receipt_id: json_response.get("user_id")
+        for receipt_id, json_response in zip(receipt_ids, receipts, strict=True)
+    }
+    apply_rollup(cursor, item_rows, user_ids)
+    return receipt_ids
+
+
+def store_receipts_batch(receipts: list, created_at: str | list | None = None) -> list[int]:
+    """
+    Store many parsed receipts and their items in a single transaction.
+    Registered receipt listeners are notified once the transaction has committed.
+
+    :param receipts: Parsed receipts (the same shape store_receipt_in_db accepts).
+    :param created_at: Timestamps as for insert_receipts. Defaults to the current time.
+    :return: The generated receipt IDs, in input order.
+    """
+    with PostgresConnector() as db:
+        receipt_ids = insert_receipts(db.cursor, receipts, created_at)
+        db.conn.commit()
+    notify_receipts_stored(receipt_ids, receipts)
+    return receipt_ids
+
+
+def store_receipt_with_items(json_response: dict) -> int:
+    """
+    Store one parsed receipt and all of its items in a single transaction.
+
+    :param json_response: The JSON with receipt and item data.
+    :return: The generated ID for this receipt.
+    """
+    return store_receipts_batch([json_response])[0]
@@ -1,21 +1,114 @@
 # database/postgres_connector.py
-import pandas as pd
-import psycopg2
+import os
+import threading
+import time
+import uuid
 
-from config.config import POSTGRES_DB, POSTGRES_HOST, POSTGRES_PASSWORD, POSTGRES_PORT, POSTGRES_USER
+import psycopg2.extensions
+
+from config.config import (
+    DB_FETCH_SIZE,
+    DB_POOL_CHECKOUT_TIMEOUT,
+    DB_POOL_HEALTH_CHECK_AFTER,
+    DB_POOL_MAX_IDLE,
+    DB_POOL_MAX_SIZE,
+    DB_POOL_MIN_SIZE,
+    POSTGRES_DB,
+    POSTGRES_HOST,
+    POSTGRES_PASSWORD,
+    POSTGRES_PORT,
+    POSTGRES_USER,
+)
+from database.pool import ConnectionPool
+from utils.instrumentation import observe_db_query, timed
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+class InstrumentedCursor(psycopg2.extensions.cursor):
+    """Cursor that records the duration of every statement in the metrics."""
+
+    def execute(self, query, vars=None):
+        start = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            observe_db_query(query, time.perf_counter() - start)
+
+    def executemany(self, query, vars_list):
+        start = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            observe_db_query(query, time.perf_counter() - start)
+
+
+def get_pool() -> ConnectionPool:
+    """
+    Return the process-wide connection pool, creating it on first use.
+
+    A forked child process gets a fresh pool instead of sharing sockets with its parent.
+    """
+    # One lazily created pool per process, shared by every connector in it
+    global _pool, _pool_pid  # noqa: PLW0603
+    pid = os.getpid()
+    if _pool is not None and _pool_pid == pid:
+        return _pool
+    with _pool_lock:
+        if _pool is None or _pool_pid != pid:
+            _pool = ConnectionPool(
+                min_size=DB_POOL_MIN_SIZE,
+                max_size=DB_POOL_MAX_SIZE,
+                max_idle=DB_POOL_MAX_IDLE,
+                checkout_timeout=DB_POOL_CHECKOUT_TIMEOUT,
+                health_check_after=DB_POOL_HEALTH_CHECK_AFTER,
+                cursor_factory=InstrumentedCursor,
+                dbname=POSTGRES_DB,
+                user=POSTGRES_USER,
+                password=POSTGRES_PASSWORD,
+                host=POSTGRES_HOST,
+                port=POSTGRES_PORT,
+            )
+            _pool_pid = pid
+    return _pool
+
+
+def install_pool(pool: ConnectionPool) -> None:
+    """Replace the process-wide pool, e.g. with one using instrumented connections."""
+    global _pool, _pool_pid  # noqa: PLW0603
+    with _pool_lock:
+        _pool = pool
+        _pool_pid = os.getpid()
+
+
+def close_pool() -> None:
+    """Close all idle pooled connections, e.g. on shutdown."""
+    global _pool  # noqa: PLW0603
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.closeall()
+        _pool = None
 
 
 class PostgresConnector:
     """
     A class to handle PostgreSQL connections and queries.
     Supports fetching query results and returning a pandas DataFrame.
-    Implements context management to ensure connections are properly closed.
+    Implements context management; connections are borrowed from the process-wide pool
+    and handed back (with any uncommitted transaction rolled back) on exit.
     """
 
+    conn = None
+    cursor = None
+    pool = None
+
     def __enter__(self):
-        self.conn = psycopg2.connect(
-            dbname=POSTGRES_DB, user=POSTGRES_USER, password=POSTGRES_PASSWORD, host=POSTGRES_HOST, port=POSTGRES_PORT
-        )
+        # Keep the pool the connection came from: install_pool or a fork may replace the global one
+        self.pool = get_pool()
+        with timed("db_checkout"):
+            self.conn = self.pool.getconn()
         self.cursor = self.conn.cursor()
         return self
 
@@ -23,11 +116,14 @@ class PostgresConnector:
         self.close()
 
     def close(self):
-        """Close the database cursor and connection."""
+        """Close the database cursor and return the connection to the pool."""
         if self.cursor:
             self.cursor.close()
+            self.cursor = None
         if self.conn:
-            self.conn.close()
+            self.pool.putconn(self.conn)
+            self.conn = None
+            self.pool = None
 
     def fetch(self, query, params=None):
         """
@@ -48,9 +144,62 @@ class PostgresConnector:
         :param params: Optional query parameters.
         :return: pandas DataFrame with query results.
         """
+        import pandas as pd  # Imported on first use; most processes never build a DataFrame
+
         df = pd.read_sql_query(query, self.conn, params=params)
         return df
 
+    def stream_batches(self, query, params=None, fetch_size=DB_FETCH_SIZE):
+        """
+        Execute a SQL query on a named server-side cursor and yield the rows in batches.
+
+        Only ``fetch_size`` rows are held in memory at a time, however large the result is.
+        The cursor's column names are available as ``self.stream_columns`` once the first
+        batch has been yielded.
+
+        :param query: SQL query string.
+        :param params: Optional query parameters.
+        :param fetch_size: Rows fetched from the server per round-trip.
+        :return: Generator of lists of tuples.
+        """
+        cursor = self.conn.cursor(name=f"stream_{uuid.uuid4().hex}")
+        try:
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(fetch_size)
+                if not rows:
+                    break
+                self.stream_columns = [column.name for column in cursor.description]
+                yield rows
+        finally:
+            cursor.close()
+
+    def stream(self, query, params=None, fetch_size=DB_FETCH_SIZE):
+        """
+        Execute a SQL query on a named server-side cursor and yield one row at a time.
+
+        :param query: SQL query string.
+        :param params: Optional query parameters.
+        :param fetch_size: Rows fetched from the server per round-trip.
+        :return: Generator of tuples.
+        """
+        for rows in self.stream_batches(query, params, fetch_size):
+            yield from rows
+
+    def stream_dataframes(self, query, params=None, chunk_size=DB_FETCH_SIZE):
+        """
+        Execute a SQL query on a named server-side cursor and yield pandas DataFrame chunks.
+
+        :param query: SQL query string.
+        :param params: Optional query parameters.
+        :param chunk_size: Rows per DataFrame.
+        :return: Generator of pandas DataFrames.
+        """
+        import pandas as pd
+
+        for rows in self.stream_batches(query, params, chunk_size):
+            yield pd.DataFrame.from_records(rows, columns=self.stream_columns)
+
 
 if __name__ == "__main__":
     # Sample usage of the connector
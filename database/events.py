@@ -0,0 +1,24 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+_receipt_listeners = []
+
+
+def register_receipt_listener(callback) -> None:
+    """
+    Register a callback that runs after receipts are committed.
+
+    :param callback: Called as ``callback(receipt_ids, receipts)`` with the new IDs and the
+                     parsed receipts they were stored from, in the same order.
+    """
+    _receipt_listeners.append(callback)
+
+
+def notify_receipts_stored(receipt_ids: list[int], receipts: list) -> None:
+    """Run every registered receipt listener. Listener errors are logged, never raised."""
+    for callback in _receipt_listeners:
+        try:
+            callback(receipt_ids, receipts)
+        except Exception:
+            logger.exception(f"Receipt listener {callback!r} failed")
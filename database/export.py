@@ -0,0 +1,96 @@
+import csv
+import io
+
+from database.db import PostgresConnector
+
+EXPORT_FORMATS = ("csv", "parquet")
+EXPORT_COLUMNS = (
+    "receipt_id",
+    "created_at",
+    "total_price",
+    "currency",
+    "total_price_euro",
+    "user_comment",
+    "item_name",
+    "item_price",
+    "item_currency",
+    "category",
+    "subcategory",
+)
+
+EXPORT_QUERY = """
+    SELECT r.id AS receipt_id,
+           r.created_at,
+           r.total_price,
+           r.currency,
+           r.total_price_euro,
+           r.user_comment,
+           i.item_name,
+           i.item_price,
+           i.item_currency,
+           i.category,
+           i.subcategory
+    FROM expensetrackerai_receipts r
+    LEFT JOIN expensetrackerai_items i ON i.receipt_id = r.id
+    WHERE r.user_id = %s
+    ORDER BY r.created_at, r.id;
+"""
+
+
+def _parquet_schema():
+    import pyarrow as pa
+
+    types = [
+        pa.int64(),
+        pa.timestamp("us"),
+        pa.float64(),
+        pa.string(),
+        pa.float64(),
+        pa.string(),
+        pa.string(),
+        pa.float64(),
+        pa.string(),
+        pa.string(),
+        pa.string(),
+    ]
+    return pa.schema(list(zip(EXPORT_COLUMNS, types, strict=True)))
+
+
+def export_user_expenses(user_id: int, fileobj, fmt: str = "csv") -> int:
+    """
+    Stream all of a user's receipts and items into ``fileobj`` as CSV or Parquet.
+
+    Rows are read through a server-side cursor and written batch by batch, so memory use stays
+    flat regardless of how much history the user has.
+
+    :param user_id: Telegram chat ID of the user.
+    :param fileobj: Binary file object to write to.
+    :param fmt: "csv" or "parquet".
+    :return: Number of rows written.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt}")
+
+    written = 0
+    with PostgresConnector() as db:
+        batches = db.stream_batches(EXPORT_QUERY, (user_id,))
+        if fmt == "csv":
+            text = io.TextIOWrapper(fileobj, encoding="utf-8", newline="", write_through=True)
+            writer = csv.writer(text)
+            writer.writerow(EXPORT_COLUMNS)
+            for rows in batches:
+                writer.writerows(rows)
+                written += len(rows)
+            text.detach()
+        else:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            schema = _parquet_schema()
+            with pq.ParquetWriter(fileobj, schema) as writer:
+                for rows in batches:
+                    columns = list(zip(*rows, strict=True))
+                    arrays = [pa.array(column, type=field.type) for column, field in zip(columns, schema, strict=True)]
+                    writer.write_batch(pa.record_batch(arrays, schema=schema))
+                    written += len(rows)
+    return written
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+"""
+Locally cached foreign-exchange rates for ExpenseTrackerAI.
+
+expensetrackerai_fx_rates holds one rate per currency, expressed as units of that currency per
+euro. Reports convert every amount to EUR with it in SQL, instead of trusting the model's
+per-receipt ``total_price_euro`` guess. Rates come from the ECB's daily reference feed; run this
+module (e.g. daily from cron) to refresh them, or set rates by hand:
+
+    python -m database.fx                    # fetch the latest reference rates
+    python -m database.fx --set RUB=98.5     # set or override individual rates
+"""
+
+import argparse
+import logging
+import urllib.request
+import xml.etree.ElementTree as ET
+from datetime import date
+
+from psycopg2.extras import execute_values
+
+from config.config import FX_RATES_MAX_AGE_DAYS, FX_RATES_URL
+from database.db import PostgresConnector
+
+logger = logging.getLogger(__name__)
+
+_ECB_NAMESPACE = "{http://www.ecb.int/vocabulary/2002-08-01/eurofxref}"
+
+
+def fetch_ecb_rates(url: str = FX_RATES_URL, timeout: float = 10.0) -> tuple[date, dict]:
+    """
+    Download the ECB euro reference rates.
+
+    :param url: Feed URL in the ECB eurofxref XML format.
+    :param timeout: Socket timeout in seconds.
+    :return: The rates' date and a mapping of currency code to units per euro.
+    """
+    with urllib.request.urlopen(url, timeout=timeout) as response:  # noqa: S310
+        root = ET.fromstring(response.read())  # noqa: S314
+    day_cube = root.find(f".//{_ECB_NAMESPACE}Cube[@time]")
+    if day_cube is None:
+        raise ValueError(f"No rates found in the FX feed at {url}")
+    rates = {cube.get("currency"): float(cube.get("rate")) for cube in day_cube}
+    return date.fromisoformat(day_cube.get("time")), rates
+
+
+def store_fx_rates(rates: dict, rate_date: date) -> None:
+    """
+    Insert or update rates in one statement.
+
+    :param rates: Mapping of currency code to units of that currency per euro.
+    :param rate_date: Date the rates apply to.
+    """
+    rows = [(currency.upper(), units_per_eur, rate_date) for currency, units_per_eur in rates.items()]
+    rows.append(("EUR", 1.0, rate_date))
+    upsert_query = """
+        INSERT INTO expensetrackerai_fx_rates (currency, units_per_eur, rate_date) VALUES %s
+        ON CONFLICT (currency) DO UPDATE
+        SET units_per_eur = EXCLUDED.units_per_eur, rate_date = EXCLUDED.rate_date, updated_at = NOW();
+    """
+    with PostgresConnector() as db:
+        execute_values(db.cursor, upsert_query, rows, page_size=len(rows))
+        db.conn.commit()
+
+
+def refresh_fx_rates(url: str = FX_RATES_URL) -> int:
+    """
+    Fetch the latest reference rates and store them.
+
+    :return: Number of currencies updated.
+    """
+    rate_date, rates = fetch_ecb_rates(url)
+    store_fx_rates(rates, rate_date)
+    logger.info(f"Stored {len(rates)} FX rates for {rate_date}")
+    return len(rates)
+
+
+def ensure_fx_rates(max_age_days: int = FX_RATES_MAX_AGE_DAYS) -> None:
+    """
+    Refresh the rates if the newest one is older than ``max_age_days``.
+    Failures are logged, not raised: reports keep working on the rates already stored.
+    """
+    try:
+        with PostgresConnector() as db:
+            result = db.fetch(
+                "SELECT MAX(rate_date) FROM expensetrackerai_fx_rates WHERE currency <> 'EUR'",
+            )
+        newest = result[0][0]
+        if newest is None or (date.today() - newest).days > max_age_days:  # noqa: DTZ011
+            refresh_fx_rates()
+    except Exception as e:
+        logger.warning(f"Could not refresh FX rates, using the stored ones: {e}")
+
+
+def _parse_rate(value: str) -> tuple[str, float]:
+    currency, _, units_per_eur = value.partition("=")
+    return currency.strip().upper(), float(units_per_eur)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Refresh the cached FX rates used by spending reports.")
+    parser.add_argument(
+        "--set",
+        type=_parse_rate,
+        action="append",
+        metavar="CUR=RATE",
+        help="Set a rate (units of CUR per euro) instead of fetching; may be repeated",
+    )
+    args = parser.parse_args()
+    if args.set:
+        store_fx_rates(dict(args.set), date.today())  # noqa: DTZ011
+    else:
+        refresh_fx_rates()
@@ -1,10 +1,11 @@
 #!/usr/bin/env python
 """
 Database initialization script for ExpenseTrackerAI.
-Run this script to create all necessary database tables if they don't exist.
+Run this script to create all necessary database tables if they don't exist
+and to apply any pending schema migrations.
 """
 import logging
-from database.schema import create_tables
+from database.migrations import run_migrations
 from database.db import PostgresConnector
 
 logging.basicConfig(
@@ -14,12 +15,12 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 def initialize_database():
-    """Initialize the database by creating necessary tables if they don't exist."""
-    logger.info("Initializing database - checking for required tables...")
+    """Initialize the database by applying all pending migrations."""
+    logger.info("Initializing database - applying pending migrations...")
     
     try:
-        create_tables()
-        logger.info("Database tables successfully created or already exist.")
+        applied = run_migrations()
+        logger.info(f"Database schema is up to date (applied migrations: {applied or 'none'}).")
         
         # Verify tables exist by checking their structure
         with PostgresConnector() as db:
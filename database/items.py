@@ -1,21 +1,76 @@
+from psycopg2.extras import execute_values
+
 from database.db import PostgresConnector
+from database.receipt_cache import receipt_cache
+from database.rollup import apply_rollup
+
+ITEM_COLUMNS = (
+    "receipt_id",
+    "item_name",
+    "item_price",
+    "item_currency",
+    "category",
+    "subcategory",
+    "receipt_created_at",
+)
+
+
+def item_row(receipt_id: int, item_data: dict, receipt_created_at) -> tuple:
+    """
+    Build the expensetrackerai_items row for one parsed item, in ITEM_COLUMNS order.
+    ``receipt_created_at`` is the parent receipt's created_at, the items partition key.
+    """
+    return (
+        receipt_id,
+        item_data.get("name", "Unknown item"),
+        float(item_data.get("price", 0)),
+        item_data.get("currency", "EUR"),
+        item_data.get("category", "Other"),
+        item_data.get("subcategory", "Other"),
+        receipt_created_at,
+    )
+
+
+def insert_item_rows(cursor, rows: list) -> None:
+    """Insert prepared item rows with a single multi-row INSERT on the given cursor."""
+    if not rows:
+        return
+    insert_items_query = """
+        INSERT INTO expensetrackerai_items (
+            receipt_id, item_name, item_price, item_currency, category, subcategory, receipt_created_at
+        ) VALUES %s
+    """
+    execute_values(cursor, insert_items_query, rows, page_size=len(rows))
+
 
 def store_items(receipt_id: int, items: list) -> None:
-    """Store item data for a given receipt."""
+    """Store item data for a given receipt and add it to the daily spending rollup."""
+    with PostgresConnector() as db:
+        db.cursor.execute("SELECT user_id, created_at FROM expensetrackerai_receipts WHERE id = %s", (receipt_id,))
+        user_id, created_at = db.cursor.fetchone()
+        rows = [item_row(receipt_id, item_data, created_at) for item_data in items]
+        insert_item_rows(db.cursor, rows)
+        apply_rollup(db.cursor, rows, {receipt_id: user_id})
+        db.conn.commit()
+    receipt_cache.invalidate_receipt(receipt_id, user_id)
+
+
+def get_user_item_labels(user_id: int, limit: int = 5000) -> list:
+    """
+    Return how often each item name was given each category for one user, most frequent first.
+
+    :param user_id: Telegram chat ID of the user.
+    :param limit: Maximum number of (name, category, subcategory) combinations to return.
+    :return: List of (item_name, category, subcategory, count) tuples.
+    """
+    query = """
+        SELECT i.item_name, i.category, i.subcategory, COUNT(*) AS uses
+        FROM expensetrackerai_items i
+        JOIN expensetrackerai_receipts r ON i.receipt_id = r.id
+        WHERE r.user_id = %s AND i.item_name IS NOT NULL
+        GROUP BY i.item_name, i.category, i.subcategory
+        ORDER BY uses DESC
+        LIMIT %s;
+    """
     with PostgresConnector() as db:
-        for item_data in items:
-            item_name = item_data.get("name", "Unknown item")
-            item_price = float(item_data.get("price", 0))
-            item_currency = item_data.get("currency", "EUR")
-            category = item_data.get("category", "Other")
-            subcategory = item_data.get("subcategory", "Other")
-
-            insert_item_query = """
-                INSERT INTO expensetrackerai_items (
-                    receipt_id, item_name, item_price, item_currency, category, subcategory
-                ) VALUES (%s, %s, %s, %s, %s, %s)
-            """
-            db.cursor.execute(
-                insert_item_query, (receipt_id, item_name, item_price, item_currency, category, subcategory)
-            )
-        db.conn.commit() 
\ No newline at end of file
+        return db.fetch(query, (user_id, limit))
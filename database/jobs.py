@@ -0,0 +1,209 @@
+import asyncio
+import json
+import random
+from typing import NamedTuple
+
+from config.config import QUEUE_MAX_ATTEMPTS, QUEUE_RETRY_BASE_DELAY, QUEUE_RETRY_MAX_DELAY
+from database.bulk import insert_receipts
+from database.db import PostgresConnector
+from database.events import notify_receipts_stored
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+
+class Job(NamedTuple):
+    id: int
+    payload: dict
+    attempts: int
+    max_attempts: int
+
+
+def enqueue_job(payload: dict, max_attempts: int = QUEUE_MAX_ATTEMPTS) -> int:
+    """
+    Add an expense job to the queue.
+
+    :param payload: JSON-serializable job description (see bot.expenses.expense_request_from_message);
+                    an album is one job whose payload lists its photos' requests under 'album'.
+    :param max_attempts: How many times the job may be tried before it is marked failed.
+    :return: The job ID.
+    """
+    query = """
+        INSERT INTO expensetrackerai_jobs (status, payload, max_attempts, run_at, created_at, updated_at)
+        VALUES (%s, %s, %s, NOW(), NOW(), NOW())
+        RETURNING id;
+    """
+    with PostgresConnector() as db:
+        db.cursor.execute(query, (JOB_QUEUED, json.dumps(payload, ensure_ascii=False), max_attempts))
+        job_id = db.cursor.fetchone()[0]
+        db.conn.commit()
+    return job_id
+
+
+async def enqueue_job_async(payload: dict) -> int:
+    """Enqueue a job without blocking the event loop."""
+    return await asyncio.to_thread(enqueue_job, payload)
+
+
+def claim_job(worker_id: str, visibility_timeout: float) -> Job | None:
+    """
+    Lease the next runnable job to ``worker_id`` for ``visibility_timeout`` seconds.
+
+    Queued jobs that are due and running jobs whose lease has expired are both eligible; rows
+    locked by other workers are skipped, so any number of workers can claim concurrently.
+    Jobs whose lease expired on their last attempt are left to expire_jobs.
+
+    :return: The claimed job, or None if nothing is runnable.
+    """
+    claim_query = """
+        UPDATE expensetrackerai_jobs
+        SET status = %s, attempts = attempts + 1, locked_by = %s,
+            locked_until = NOW() + make_interval(secs => %s), updated_at = NOW()
+        WHERE id = (
+            SELECT id FROM expensetrackerai_jobs
+            WHERE (status = %s AND run_at <= NOW())
+               OR (status = %s AND locked_until < NOW() AND attempts < max_attempts)
+            ORDER BY run_at
+            FOR UPDATE SKIP LOCKED
+            LIMIT 1
+        )
+        RETURNING id, payload, attempts, max_attempts;
+    """
+    with PostgresConnector() as db:
+        db.cursor.execute(claim_query, (JOB_RUNNING, worker_id, visibility_timeout, JOB_QUEUED, JOB_RUNNING))
+        row = db.cursor.fetchone()
+        db.conn.commit()
+    return Job(*row) if row else None
+
+
+def expire_jobs() -> list[Job]:
+    """
+    Mark failed the jobs whose lease expired on their last attempt, e.g. because their worker died.
+
+    Each job is returned to exactly one caller, so its user can be told it was abandoned.
+
+    :return: The jobs that were marked failed.
+    """
+    query = """
+        UPDATE expensetrackerai_jobs
+        SET status = %s, last_error = 'visibility timeout expired', locked_by = NULL, updated_at = NOW()
+        WHERE status = %s AND locked_until < NOW() AND attempts >= max_attempts
+        RETURNING id, payload, attempts, max_attempts;
+    """
+    with PostgresConnector() as db:
+        db.cursor.execute(query, (JOB_FAILED, JOB_RUNNING))
+        rows = db.cursor.fetchall()
+        db.conn.commit()
+    return [Job(*row) for row in rows]
+
+
+def extend_job(job_id: int, worker_id: str, visibility_timeout: float) -> bool:
+    """
+    Extend a running job's lease.
+
+    :return: False if the worker no longer holds the lease.
+    """
+    query = """
+        UPDATE expensetrackerai_jobs
+        SET locked_until = NOW() + make_interval(secs => %s), updated_at = NOW()
+        WHERE id = %s AND status = %s AND locked_by = %s;
+    """
+    with PostgresConnector() as db:
+        db.cursor.execute(query, (visibility_timeout, job_id, JOB_RUNNING, worker_id))
+        extended = db.cursor.rowcount == 1
+        db.conn.commit()
+    return extended
+
+
+def _finish_job(cursor, job_id: int, worker_id: str, receipt_id: int | None) -> bool:
+    cursor.execute(
+        """
+        UPDATE expensetrackerai_jobs
+        SET status = %s, receipt_id = %s, locked_by = NULL, locked_until = NULL, updated_at = NOW()
+        WHERE id = %s AND status = %s AND locked_by = %s;
+        """,
+        (JOB_DONE, receipt_id, job_id, JOB_RUNNING, worker_id),
+    )
+    return cursor.rowcount == 1
+
+
+def complete_job(job_id: int, worker_id: str, receipt: dict | None = None) -> int | None:
+    """
+    Mark a job done, storing its receipt (if any) in the same transaction.
+
+    Nothing is written if the worker has lost its lease, so a job that was re-claimed after a
+    timeout cannot store its receipt twice.
+
+    :return: The stored receipt ID (None if there was no receipt or the lease was lost).
+    """
+    receipt_ids = complete_album_job(job_id, worker_id, [receipt] if receipt is not None else [])
+    return receipt_ids[0] if receipt_ids else None
+
+
+def complete_album_job(job_id: int, worker_id: str, receipts: list[dict]) -> list[int] | None:
+    """
+    Mark an album job done, storing all of its receipts in the same transaction.
+
+    :param receipts: The album's valid receipts; the first one's ID is recorded on the job.
+    :return: The stored receipt IDs, or None if the lease was lost and nothing was written.
+    """
+    with PostgresConnector() as db:
+        receipt_ids = insert_receipts(db.cursor, receipts) if receipts else []
+        if not _finish_job(db.cursor, job_id, worker_id, receipt_ids[0] if receipt_ids else None):
+            db.conn.rollback()
+            return None
+        db.conn.commit()
+    if receipts:
+        notify_receipts_stored(receipt_ids, receipts)
+    return receipt_ids
+
+
+def fail_job(job_id: int, worker_id: str, error: str) -> str:
+    """
+    Record a failed attempt. The job is retried after an exponential, jittered backoff until it
+    runs out of attempts, then it is marked failed.
+
+    :return: The job's new status.
+    """
+    with PostgresConnector() as db:
+        db.cursor.execute(
+            "SELECT attempts, max_attempts FROM expensetrackerai_jobs WHERE id = %s AND locked_by = %s FOR UPDATE",
+            (job_id, worker_id),
+        )
+        row = db.cursor.fetchone()
+        if row is None:
+            db.conn.rollback()
+            return JOB_RUNNING
+        attempts, max_attempts = row
+        status = JOB_FAILED if attempts >= max_attempts else JOB_QUEUED
+        delay = min(QUEUE_RETRY_MAX_DELAY, QUEUE_RETRY_BASE_DELAY * 2 ** (attempts - 1))
+        delay *= random.uniform(0.5, 1.0)  # noqa: S311
+        db.cursor.execute(
+            """
+            UPDATE expensetrackerai_jobs
+            SET status = %s, last_error = %s, locked_by = NULL, locked_until = NULL,
+                run_at = NOW() + make_interval(secs => %s), updated_at = NOW()
+            WHERE id = %s;
+            """,
+            (status, error[:2000], delay, job_id),
+        )
+        db.conn.commit()
+    return status
+
+
+def get_job(job_id: int) -> dict | None:
+    """Return a job's status, attempt count, last error and resulting receipt ID."""
+    query = """
+        SELECT id, status, attempts, max_attempts, last_error, receipt_id, created_at, updated_at
+        FROM expensetrackerai_jobs
+        WHERE id = %s;
+    """
+    with PostgresConnector() as db:
+        db.cursor.execute(query, (job_id,))
+        row = db.cursor.fetchone()
+        if row is None:
+            return None
+        columns = [column.name for column in db.cursor.description]
+    return dict(zip(columns, row, strict=True))
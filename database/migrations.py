@@ -0,0 +1,355 @@
+#!/usr/bin/env python
+"""
+Versioned schema migrations for ExpenseTrackerAI.
+
+Each migration runs once, in its own transaction, and is recorded in
+expensetrackerai_schema_migrations. Opt-in migrations (monthly partitioning) are skipped while
+disabled and applied on the next run after they are enabled.
+
+Usage:
+    python -m database.migrations                 # apply pending migrations
+    python -m database.migrations --partitions    # only create upcoming monthly partitions
+"""
+
+import argparse
+import logging
+from datetime import date
+from typing import NamedTuple
+
+from config.config import DB_PARTITION_BY_MONTH, DB_PARTITION_MONTHS_AHEAD
+from database.db import PostgresConnector
+
+logger = logging.getLogger(__name__)
+
+# Arbitrary constant used with pg_advisory_xact_lock so concurrent runners don't race
+MIGRATION_LOCK_ID = 7_130_512
+
+PARTITIONED_TABLES = {
+    "expensetrackerai_receipts": "created_at",
+    "expensetrackerai_items": "receipt_created_at",
+}
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    steps: tuple  # SQL strings or callables taking a cursor
+    enabled: bool = True
+
+
+def _add_months(day: date, months: int) -> date:
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def is_partitioned(cursor, table: str) -> bool:
+    cursor.execute(
+        """
+        SELECT EXISTS (
+            SELECT FROM pg_partitioned_table p
+            JOIN pg_class c ON c.oid = p.partrelid
+            WHERE c.relname = %s AND pg_table_is_visible(c.oid)
+        )
+        """,
+        (table,),
+    )
+    return cursor.fetchone()[0]
+
+
+def create_month_partitions(cursor, first_month: date, months_ahead: int) -> None:
+    """Create monthly partitions of the partitioned tables from ``first_month`` to ``months_ahead`` months from now."""
+    last_month = _add_months(date.today().replace(day=1), months_ahead)  # noqa: DTZ011
+    month = first_month.replace(day=1)
+    while month <= last_month:
+        next_month = _add_months(month, 1)
+        for table in PARTITIONED_TABLES:
+            cursor.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS {table}_y{month:%Y}m{month:%m}
+                PARTITION OF {table} FOR VALUES FROM (%s) TO (%s)
+                """,
+                (month, next_month),
+            )
+        month = next_month
+
+
+def _partition_by_month(cursor) -> None:
+    """Rebuild receipts and items as tables range-partitioned by month, keeping IDs and data."""
+    cursor.execute("SELECT COALESCE(MIN(created_at), NOW())::date FROM expensetrackerai_receipts")
+    first_month = cursor.fetchone()[0]
+
+    for table in PARTITIONED_TABLES:
+        cursor.execute(f"ALTER TABLE {table} RENAME TO {table}_unpartitioned")
+        cursor.execute(
+            f"ALTER TABLE {table}_unpartitioned RENAME CONSTRAINT {table}_pkey TO {table}_unpartitioned_pkey"
+        )
+        cursor.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY NONE")
+    cursor.execute("DROP INDEX IF EXISTS idx_receipts_user_created, idx_receipts_created, idx_items_receipt")
+
+    cursor.execute(
+        """
+        CREATE TABLE expensetrackerai_receipts (
+            id INTEGER NOT NULL DEFAULT nextval('expensetrackerai_receipts_id_seq'),
+            created_at TIMESTAMP NOT NULL,
+            user_id BIGINT,
+            username VARCHAR(255),
+            total_price DOUBLE PRECISION,
+            currency VARCHAR(10),
+            total_price_euro DOUBLE PRECISION,
+            user_comment TEXT,
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+        """
+    )
+    cursor.execute(
+        """
+        CREATE TABLE expensetrackerai_items (
+            id INTEGER NOT NULL DEFAULT nextval('expensetrackerai_items_id_seq'),
+            receipt_id INTEGER NOT NULL,
+            item_name TEXT,
+            item_price DOUBLE PRECISION,
+            item_currency VARCHAR(10),
+            category VARCHAR(100),
+            subcategory VARCHAR(100),
+            receipt_created_at TIMESTAMP NOT NULL,
+            PRIMARY KEY (id, receipt_created_at),
+            FOREIGN KEY (receipt_id, receipt_created_at)
+                REFERENCES expensetrackerai_receipts (id, created_at) ON DELETE CASCADE
+        ) PARTITION BY RANGE (receipt_created_at)
+        """
+    )
+    for table in PARTITIONED_TABLES:
+        cursor.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+    create_month_partitions(cursor, first_month, DB_PARTITION_MONTHS_AHEAD)
+
+    cursor.execute("INSERT INTO expensetrackerai_receipts SELECT * FROM expensetrackerai_receipts_unpartitioned")
+    cursor.execute(
+        """
+        INSERT INTO expensetrackerai_items (
+            id, receipt_id, item_name, item_price, item_currency, category, subcategory, receipt_created_at
+        )
+        SELECT id, receipt_id, item_name, item_price, item_currency, category, subcategory, receipt_created_at
+        FROM expensetrackerai_items_unpartitioned
+        """
+    )
+    for table in ("expensetrackerai_items", "expensetrackerai_receipts"):
+        cursor.execute(f"DROP TABLE {table}_unpartitioned")
+        cursor.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id")
+    _create_hot_indexes(cursor)
+
+
+def _create_hot_indexes(cursor) -> None:
+    # Per-user date ranges (history, exports, recent receipts)
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_receipts_user_created ON expensetrackerai_receipts (user_id, created_at DESC)"
+    )
+    # Global date ranges (rollup rebuilds, cleanup)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_receipts_created ON expensetrackerai_receipts (created_at)")
+    # Joining items to their receipt
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_items_receipt ON expensetrackerai_items (receipt_id)")
+
+
+MIGRATIONS = (
+    Migration(
+        1,
+        "create_tables",
+        (
+            """
+            CREATE TABLE IF NOT EXISTS expensetrackerai_receipts (
+                id SERIAL PRIMARY KEY,
+                created_at TIMESTAMP NOT NULL,
+                user_id BIGINT,
+                username VARCHAR(255),
+                total_price DOUBLE PRECISION,
+                currency VARCHAR(10),
+                total_price_euro DOUBLE PRECISION,
+                user_comment TEXT
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS expensetrackerai_items (
+                id SERIAL PRIMARY KEY,
+                receipt_id INTEGER NOT NULL,
+                item_name TEXT,
+                item_price DOUBLE PRECISION,
+                item_currency VARCHAR(10),
+                category VARCHAR(100),
+                subcategory VARCHAR(100),
+                FOREIGN KEY (receipt_id) REFERENCES expensetrackerai_receipts (id) ON DELETE CASCADE
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS expensetrackerai_llm_cache (
+                cache_key TEXT PRIMARY KEY,
+                result JSONB NOT NULL,
+                created_at TIMESTAMPTZ NOT NULL,
+                last_used_at TIMESTAMPTZ NOT NULL
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS expensetrackerai_daily_spending (
+                user_id BIGINT NOT NULL,
+                day DATE NOT NULL,
+                category VARCHAR(100) NOT NULL,
+                subcategory VARCHAR(100) NOT NULL,
+                currency VARCHAR(10) NOT NULL,
+                total DOUBLE PRECISION NOT NULL,
+                item_count INTEGER NOT NULL,
+                PRIMARY KEY (user_id, day, category, subcategory, currency)
+            )
+            """,
+        ),
+    ),
+    Migration(
+        2,
+        "hot_path_indexes",
+        (
+            _create_hot_indexes,
+            "CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON expensetrackerai_llm_cache (last_used_at)",
+        ),
+    ),
+    Migration(
+        3,
+        "items_receipt_created_at",
+        (
+            "ALTER TABLE expensetrackerai_items ADD COLUMN IF NOT EXISTS receipt_created_at TIMESTAMP",
+            """
+            UPDATE expensetrackerai_items i
+            SET receipt_created_at = r.created_at
+            FROM expensetrackerai_receipts r
+            WHERE r.id = i.receipt_id AND i.receipt_created_at IS NULL
+            """,
+            "ALTER TABLE expensetrackerai_items ALTER COLUMN receipt_created_at SET NOT NULL",
+        ),
+    ),
+    Migration(4, "partition_by_month", (_partition_by_month,), enabled=DB_PARTITION_BY_MONTH),
+    Migration(
+        5,
+        "ingestion_jobs",
+        (
+            """
+            CREATE TABLE IF NOT EXISTS expensetrackerai_jobs (
+                id BIGSERIAL PRIMARY KEY,
+                status VARCHAR(16) NOT NULL,
+                payload JSONB NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL,
+                run_at TIMESTAMPTZ NOT NULL,
+                locked_by TEXT,
+                locked_until TIMESTAMPTZ,
+                last_error TEXT,
+                receipt_id INTEGER,
+                created_at TIMESTAMPTZ NOT NULL,
+                updated_at TIMESTAMPTZ NOT NULL
+            )
+            """,
+            # Only unfinished jobs are ever scanned by workers
+            """
+            CREATE INDEX IF NOT EXISTS idx_jobs_runnable ON expensetrackerai_jobs (run_at)
+            WHERE status IN ('queued', 'running')
+            """,
+        ),
+    ),
+    Migration(
+        6,
+        "fx_rates",
+        (
+            """
+            CREATE TABLE IF NOT EXISTS expensetrackerai_fx_rates (
+                currency VARCHAR(10) PRIMARY KEY,
+                units_per_eur DOUBLE PRECISION NOT NULL,
+                rate_date DATE NOT NULL,
+                updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+            )
+            """,
+            """
+            INSERT INTO expensetrackerai_fx_rates (currency, units_per_eur, rate_date)
+            VALUES ('EUR', 1, CURRENT_DATE)
+            ON CONFLICT (currency) DO NOTHING
+            """,
+        ),
+    ),
+)
+
+
+def apply_migrations(conn, migrations: tuple = MIGRATIONS) -> list[int]:
+    """
+    Apply pending migrations on the given connection, each in its own transaction.
+
+    :param conn: An open psycopg2 connection.
+    :param migrations: Migrations to consider, in version order.
+    :return: Versions applied by this call.
+    """
+    applied = []
+    with conn.cursor() as cursor:
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS expensetrackerai_schema_migrations (
+                version INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+            )
+            """
+        )
+        conn.commit()
+
+        for migration in migrations:
+            if not migration.enabled:
+                continue
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_ID,))
+            cursor.execute("SELECT 1 FROM expensetrackerai_schema_migrations WHERE version = %s", (migration.version,))
+            if cursor.fetchone():
+                conn.rollback()
+                continue
+            logger.info(f"Applying migration {migration.version}: {migration.name}")
+            try:
+                for step in migration.steps:
+                    if callable(step):
+                        step(cursor)
+                    else:
+                        cursor.execute(step)
+                cursor.execute(
+                    "INSERT INTO expensetrackerai_schema_migrations (version, name) VALUES (%s, %s)",
+                    (migration.version, migration.name),
+                )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                logger.error(f"Migration {migration.version} ({migration.name}) failed")
+                raise
+            applied.append(migration.version)
+
+        if _partitioning_active(cursor):
+            create_month_partitions(cursor, date.today(), DB_PARTITION_MONTHS_AHEAD)  # noqa: DTZ011
+            conn.commit()
+    return applied
+
+
+def _partitioning_active(cursor) -> bool:
+    return is_partitioned(cursor, "expensetrackerai_receipts")
+
+
+def run_migrations() -> list[int]:
+    """Apply all pending migrations to the configured database."""
+    with PostgresConnector() as db:
+        return apply_migrations(db.conn)
+
+
+def ensure_partitions(months_ahead: int = DB_PARTITION_MONTHS_AHEAD) -> None:
+    """Create monthly partitions for the current month and ``months_ahead`` months after it."""
+    with PostgresConnector() as db:
+        if _partitioning_active(db.cursor):
+            create_month_partitions(db.cursor, date.today(), months_ahead)  # noqa: DTZ011
+        db.conn.commit()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Apply ExpenseTrackerAI schema migrations.")
+    parser.add_argument("--partitions", action="store_true", help="Only create upcoming monthly partitions")
+    args = parser.parse_args()
+    if args.partitions:
+        ensure_partitions()
+    else:
+        applied = run_migrations()
+        logger.info(f"Applied migrations: {applied or 'none'}")
@@ -0,0 +1,177 @@
+import contextlib
+import logging
+import threading
+import time
+from collections import deque
+
+import psycopg2
+import psycopg2.extensions
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no connection becomes available within the checkout timeout."""
+
+
+class ConnectionPool:
+    """
+    A thread-safe pool of reusable psycopg2 connections.
+
+    Idle connections are kept in LIFO order so the hottest connections are reused first and the
+    rest age out: anything idle for longer than ``max_idle`` seconds is closed, as long as the pool
+    stays at or above ``min_size``. Connections that have been idle for more than
+    ``health_check_after`` seconds are pinged before being handed out, and broken ones are replaced.
+    """
+
+    def __init__(
+        self,
+        min_size: int = 1,
+        max_size: int = 10,
+        max_idle: float = 300.0,
+        checkout_timeout: float = 30.0,
+        health_check_after: float = 30.0,
+        **connect_kwargs,
+    ):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError(f"Invalid pool size: min_size={min_size}, max_size={max_size}")
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.checkout_timeout = checkout_timeout
+        self.health_check_after = health_check_after
+        self._connect_kwargs = connect_kwargs
+
+        self._cond = threading.Condition()
+        self._idle = deque()  # (connection, returned_at) pairs, oldest on the left
+        self._size = 0
+        self._closed = False
+
+        for _ in range(min_size):
+            self._size += 1
+            self._idle.append((self._connect(), time.monotonic()))
+
+    @property
+    def size(self) -> int:
+        """Number of open connections, both idle and checked out."""
+        return self._size
+
+    @property
+    def idle(self) -> int:
+        """Number of connections waiting in the pool."""
+        return len(self._idle)
+
+    def _connect(self):
+        return psycopg2.connect(**self._connect_kwargs)
+
+    def _evict_idle(self) -> list:
+        """Pop connections idle for longer than ``max_idle``. Must be called with the lock held."""
+        expired = []
+        cutoff = time.monotonic() - self.max_idle
+        while self._idle and self._size > self.min_size and self._idle[0][1] < cutoff:
+            conn, _ = self._idle.popleft()
+            self._size -= 1
+            expired.append(conn)
+        return expired
+
+    def _is_healthy(self, conn, idle_for: float) -> bool:
+        if conn.closed:
+            return False
+        if conn.get_transaction_status() == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+            return False
+        if idle_for < self.health_check_after:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+        except psycopg2.Error:
+            return False
+        return True
+
+    @staticmethod
+    def _close_quietly(conn) -> None:
+        with contextlib.suppress(psycopg2.Error):
+            conn.close()
+
+    def getconn(self):
+        """
+        Check a connection out of the pool, opening a new one if the pool is below ``max_size``.
+
+        :return: A healthy psycopg2 connection with no transaction in progress.
+        :raises PoolTimeoutError: If the pool is exhausted for longer than ``checkout_timeout``.
+        """
+        deadline = time.monotonic() + self.checkout_timeout
+        while True:
+            conn = None
+            with self._cond:
+                if self._closed:
+                    raise psycopg2.InterfaceError("connection pool is closed")
+                expired = self._evict_idle()
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeoutError(f"No database connection available after {self.checkout_timeout}s")
+                    self._cond.wait(remaining)
+                if self._idle:
+                    conn, returned_at = self._idle.pop()
+                else:
+                    self._size += 1
+
+            for stale in expired:
+                self._close_quietly(stale)
+
+            if conn is None:
+                try:
+                    return self._connect()
+                except Exception:
+                    self._release_slot()
+                    raise
+
+            if self._is_healthy(conn, time.monotonic() - returned_at):
+                return conn
+            logger.warning("Discarding broken pooled database connection")
+            self._close_quietly(conn)
+            self._release_slot()
+
+    def putconn(self, conn, discard: bool = False) -> None:
+        """
+        Return a connection to the pool. Any open transaction is rolled back.
+
+        :param conn: A connection previously obtained from :meth:`getconn`.
+        :param discard: Close the connection instead of keeping it for reuse.
+        """
+        if not discard and not conn.closed:
+            try:
+                if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                discard = True
+
+        if discard or conn.closed or self._closed:
+            self._close_quietly(conn)
+            self._release_slot()
+            return
+
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            expired = self._evict_idle()
+            self._cond.notify()
+        for stale in expired:
+            self._close_quietly(stale)
+
+    def _release_slot(self) -> None:
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    def closeall(self) -> None:
+        """Close every idle connection and refuse further checkouts."""
+        with self._cond:
+            self._closed = True
+            idle = [conn for conn, _ in self._idle]
+            self._size -= len(idle)
+            self._idle.clear()
+            self._cond.notify_all()
+        for conn in idle:
+            self._close_quietly(conn)
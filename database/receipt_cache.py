@@ -0,0 +1,138 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+
+from config.config import RECEIPT_CACHE_MAX_RECEIPTS, RECEIPT_CACHE_MAX_USERS, RECEIPT_CACHE_TTL
+from database.events import register_receipt_listener
+
+
+class _UserEntry:
+    """One user's cached reads: their most recent receipts and their per-period totals."""
+
+    __slots__ = ("recent", "recent_expires", "recent_limit", "totals", "totals_day", "totals_expires")
+
+    def __init__(self):
+        self.recent = None
+        self.recent_limit = 0
+        self.recent_expires = 0.0
+        self.totals = None
+        self.totals_day = None
+        self.totals_expires = 0.0
+
+
+class ReceiptCache:
+    """
+    LRU cache with a TTL for receipt reads: receipts by ID, each user's most recent receipts
+    and each user's per-period totals.
+
+    Stored receipts never change, so receipts by ID only expire through the LRU and the TTL.
+    A user's recent receipts and totals are dropped whenever one of their receipts is stored;
+    results read before that write are not cached (each user has a version, checked on put).
+    """
+
+    def __init__(self, max_receipts: int, max_users: int, ttl: float):
+        self.max_receipts = max_receipts
+        self.max_users = max_users
+        self.ttl = ttl
+        self._receipts = OrderedDict()  # receipt_id -> (expires_at, Receipt)
+        self._users = OrderedDict()  # user_id -> _UserEntry
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def version(self, user_id: int) -> int:
+        """The user's data version; pass it back to put_recent/put_totals after reading from the database."""
+        with self._lock:
+            return self._versions.get(user_id, 0)
+
+    def get_receipt(self, receipt_id: int):
+        with self._lock:
+            entry = self._receipts.get(receipt_id)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._receipts[receipt_id]
+                return None
+            self._receipts.move_to_end(receipt_id)
+            return entry[1]
+
+    def put_receipts(self, receipts) -> None:
+        with self._lock:
+            self._put_receipts(receipts, time.monotonic() + self.ttl)
+
+    def _put_receipts(self, receipts, expires_at: float) -> None:
+        for receipt in receipts:
+            self._receipts[receipt.id] = (expires_at, receipt)
+            self._receipts.move_to_end(receipt.id)
+        while len(self._receipts) > self.max_receipts:
+            self._receipts.popitem(last=False)
+
+    def _user_entry(self, user_id: int, create: bool = False) -> _UserEntry | None:
+        entry = self._users.get(user_id)
+        if entry is None and create:
+            entry = self._users[user_id] = _UserEntry()
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        if entry is not None:
+            self._users.move_to_end(user_id)
+        return entry
+
+    def get_recent(self, user_id: int, limit: int) -> tuple | None:
+        """The user's ``limit`` most recent receipts, or None if they are not cached."""
+        with self._lock:
+            entry = self._user_entry(user_id)
+            if entry is None or entry.recent is None or entry.recent_expires < time.monotonic():
+                return None
+            # A shorter list than was asked for is the user's whole history
+            if limit > entry.recent_limit and len(entry.recent) == entry.recent_limit:
+                return None
+            return entry.recent[:limit]
+
+    def put_recent(self, user_id: int, version: int, receipts: list, limit: int) -> None:
+        with self._lock:
+            if self._versions.get(user_id, 0) != version:
+                return
+            expires_at = time.monotonic() + self.ttl
+            entry = self._user_entry(user_id, create=True)
+            entry.recent = tuple(receipts)
+            entry.recent_limit = limit
+            entry.recent_expires = expires_at
+            self._put_receipts(receipts, expires_at)
+
+    def get_totals(self, user_id: int, day: date) -> dict | None:
+        """The user's totals as of ``day``, or None if they are not cached."""
+        with self._lock:
+            entry = self._user_entry(user_id)
+            if entry is None or entry.totals_day != day or entry.totals_expires < time.monotonic():
+                return None
+            return entry.totals
+
+    def put_totals(self, user_id: int, version: int, day: date, totals: dict) -> None:
+        with self._lock:
+            if self._versions.get(user_id, 0) != version:
+                return
+            entry = self._user_entry(user_id, create=True)
+            entry.totals = totals
+            entry.totals_day = day
+            entry.totals_expires = time.monotonic() + self.ttl
+
+    def invalidate_user(self, user_id: int) -> None:
+        with self._lock:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+            self._users.pop(user_id, None)
+
+    def invalidate_receipt(self, receipt_id: int, user_id: int | None) -> None:
+        """Forget a receipt whose items changed after it was stored, and its user's recent receipts and totals."""
+        with self._lock:
+            self._receipts.pop(receipt_id, None)
+        if user_id is not None:
+            self.invalidate_user(user_id)
+
+    def on_receipts_stored(self, receipt_ids: list[int], receipts: list) -> None:
+        for user_id in {receipt.get("user_id") for receipt in receipts}:
+            if user_id is not None:
+                self.invalidate_user(user_id)
+
+
+receipt_cache = ReceiptCache(RECEIPT_CACHE_MAX_RECEIPTS, RECEIPT_CACHE_MAX_USERS, RECEIPT_CACHE_TTL)
+register_receipt_listener(receipt_cache.on_receipts_stored)
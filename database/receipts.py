@@ -1,19 +1,111 @@
-from datetime import datetime
+from datetime import date, datetime
+from typing import NamedTuple
+
 import pytz
+
+from database.analytics import PERIODS
 from database.db import PostgresConnector
+from database.events import notify_receipts_stored
+from database.receipt_cache import receipt_cache
+from database.rollup import local_today
 
-def store_receipt(json_response: dict) -> int:
-    """Store receipt data in the database and return the generated ID."""
+_RECEIPT_SELECT = """
+    SELECT id, created_at, user_id, username, total_price, currency, total_price_euro, user_comment
+    FROM expensetrackerai_receipts
+"""
+
+# receipt_created_at lets the planner prune item partitions to the receipts' months
+_ITEMS_QUERY = """
+    SELECT receipt_id, item_name, item_price, item_currency, category, subcategory
+    FROM expensetrackerai_items
+    WHERE receipt_id = ANY(%(receipt_ids)s) AND receipt_created_at >= %(since)s
+    ORDER BY receipt_id, id;
+"""
+
+# A receipt is in a period when its local day is one of the period's last ``days`` days, as in the rollup
+_PERIOD_TOTAL_COLUMNS = ",\n           ".join(
+    f"COALESCE(SUM(total_price_euro) FILTER (WHERE created_at >= %(today)s - {days - 1}), 0), "
+    f"COUNT(*) FILTER (WHERE created_at >= %(today)s - {days - 1})"
+    for days in PERIODS.values()
+)
+
+# Only the PERIODS constants are formatted in; user input is always passed as a parameter
+PERIOD_TOTALS_QUERY = f"""
+    SELECT {_PERIOD_TOTAL_COLUMNS}
+    FROM expensetrackerai_receipts
+    WHERE user_id = %(user_id)s AND created_at >= %(today)s - {max(PERIODS.values()) - 1};
+"""  # noqa: S608
+
+
+class Item:
+    __slots__ = ("category", "currency", "name", "price", "subcategory")
+
+    def __init__(self, name: str, price: float, currency: str, category: str, subcategory: str):
+        self.name = name
+        self.price = price
+        self.currency = currency
+        self.category = category
+        self.subcategory = subcategory
+
+
+class Receipt:
+    """A stored receipt and its items."""
+
+    __slots__ = (
+        "created_at",
+        "currency",
+        "id",
+        "items",
+        "total_price",
+        "total_price_euro",
+        "user_comment",
+        "user_id",
+        "username",
+    )
+
+    def __init__(self, row: tuple, items: tuple = ()):
+        (
+            self.id,
+            self.created_at,
+            self.user_id,
+            self.username,
+            self.total_price,
+            self.currency,
+            self.total_price_euro,
+            self.user_comment,
+        ) = row
+        self.items = items
+
+
+class PeriodTotal(NamedTuple):
+    total_euro: float
+    receipts: int
+
+
+def current_timestamp() -> str:
+    """Return the current local (Cyprus) time formatted for the created_at column."""
     cyprus_tz = pytz.timezone("Asia/Nicosia")
-    current_time = datetime.now(cyprus_tz).strftime("%Y-%m-%d %H:%M:%S")
+    return datetime.now(cyprus_tz).strftime("%Y-%m-%d %H:%M:%S")
+
 
-    total_price = float(json_response.get("total_price", 0))
-    currency = json_response.get("currency", "EUR")
-    total_price_euro = float(json_response.get("total_price_euro", 0))
-    user_comment = json_response.get("user_comment", "")
-    user_id = json_response.get("user_id")
-    username = json_response.get("username")
+def receipt_row(json_response: dict, created_at: str) -> tuple:
+    """
+    Build the expensetrackerai_receipts row for a parsed receipt, in column order
+    (created_at, user_id, username, total_price, currency, total_price_euro, user_comment).
+    """
+    return (
+        created_at,
+        json_response.get("user_id"),
+        json_response.get("username"),
+        float(json_response.get("total_price", 0)),
+        json_response.get("currency", "EUR"),
+        float(json_response.get("total_price_euro", 0)),
+        json_response.get("user_comment", ""),
+    )
 
+
+def store_receipt(json_response: dict) -> int:
+    """Store receipt data in the database and return the generated ID."""
     with PostgresConnector() as db:
         insert_receipt_query = """
             INSERT INTO expensetrackerai_receipts (
@@ -21,15 +113,76 @@ def store_receipt(json_response: dict) -> int:
             ) VALUES (%s, %s, %s, %s, %s, %s, %s)
             RETURNING id;
         """
-        db.cursor.execute(
-            insert_receipt_query,
-            (current_time, user_id, username, total_price, currency, total_price_euro, user_comment),
-        )
+        db.cursor.execute(insert_receipt_query, receipt_row(json_response, current_timestamp()))
         receipt_id = db.cursor.fetchone()[0]
         db.conn.commit()
-        return receipt_id
+    notify_receipts_stored([receipt_id], [json_response])
+    return receipt_id
+
+
+def _with_items(db: PostgresConnector, rows: list) -> list[Receipt]:
+    """Build Receipt records for receipt rows, loading all of their items in one query."""
+    if not rows:
+        return []
+    items = {row[0]: [] for row in rows}
+    params = {"receipt_ids": list(items), "since": min(row[1] for row in rows)}
+    for receipt_id, *item in db.fetch(_ITEMS_QUERY, params):
+        items[receipt_id].append(Item(*item))
+    return [Receipt(row, tuple(items[row[0]])) for row in rows]
+
+
+def get_receipt(receipt_id: int) -> Receipt | None:
+    """
+    Retrieve a receipt and its items by ID, from the cache when possible.
+
+    :param receipt_id: ID of the receipt.
+    :return: The Receipt, or None if there is no receipt with this ID.
+    """
+    receipt = receipt_cache.get_receipt(receipt_id)
+    if receipt is not None:
+        return receipt
+    with PostgresConnector() as db:
+        receipts = _with_items(db, db.fetch(_RECEIPT_SELECT + " WHERE id = %s;", (receipt_id,)))
+    receipt_cache.put_receipts(receipts)
+    return receipts[0] if receipts else None
+
+
+def get_recent_receipts(user_id: int, limit: int = 5) -> tuple:
+    """
+    Retrieve one user's most recent receipts with their items, from the cache when possible.
 
-def get_receipt(receipt_id: int):
-    """Retrieve receipt data by ID."""
-    # Implementation here
-    pass 
\ No newline at end of file
+    :param user_id: Telegram chat ID of the user.
+    :param limit: Maximum number of receipts.
+    :return: Receipts, newest first.
+    """
+    receipts = receipt_cache.get_recent(user_id, limit)
+    if receipts is not None:
+        return receipts
+    version = receipt_cache.version(user_id)
+    with PostgresConnector() as db:
+        rows = db.fetch(
+            _RECEIPT_SELECT + " WHERE user_id = %s ORDER BY created_at DESC, id DESC LIMIT %s;", (user_id, limit)
+        )
+        receipts = _with_items(db, rows)
+    receipt_cache.put_recent(user_id, version, receipts, limit)
+    return tuple(receipts)
+
+
+def get_period_totals(user_id: int, today: date | None = None) -> dict:
+    """
+    Total EUR spending and number of receipts for each of the PERIODS, from the cache when possible.
+
+    :param user_id: Telegram chat ID of the user.
+    :param today: Last day of every period. Defaults to today in the receipts' timezone.
+    :return: Mapping of period (e.g. "30d") to PeriodTotal.
+    """
+    today = today or local_today()
+    totals = receipt_cache.get_totals(user_id, today)
+    if totals is not None:
+        return totals
+    version = receipt_cache.version(user_id)
+    with PostgresConnector() as db:
+        row = db.fetch(PERIOD_TOTALS_QUERY, {"user_id": user_id, "today": today})[0]
+    totals = {period: PeriodTotal(float(row[2 * n]), row[2 * n + 1]) for n, period in enumerate(PERIODS)}
+    receipt_cache.put_totals(user_id, version, today, totals)
+    return totals
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+"""
+Per-user, per-day spending rollup for ExpenseTrackerAI.
+
+expensetrackerai_daily_spending holds one row per user, day, category, subcategory and currency.
+It is updated in the same transaction as every receipt write, so chart and report queries never
+have to scan the items table. Run this module to rebuild it from the receipts and items tables.
+"""
+
+import argparse
+import logging
+from collections import defaultdict
+from datetime import date, datetime
+
+import pytz
+from psycopg2.extras import execute_values
+
+from database.db import PostgresConnector
+
+logger = logging.getLogger(__name__)
+
+
+def rollup_key(user_id: int, day: date | str, category: str | None, subcategory: str | None, currency: str | None):
+    """Normalize one rollup key the same way rebuild_rollup does in SQL."""
+    return user_id, day, category or "Other", subcategory or "Other", currency or "EUR"
+
+
+def _to_day(created_at) -> date:
+    if isinstance(created_at, datetime):
+        return created_at.date()
+    if isinstance(created_at, date):
+        return created_at
+    return datetime.fromisoformat(str(created_at)).date()
+
+
+def apply_rollup(cursor, item_rows: list, user_ids: dict) -> None:
+    """
+    Add freshly inserted items to the rollup table on the given cursor without committing.
+
+    :param cursor: Open cursor inside the transaction that inserted the items.
+    :param item_rows: Rows in ITEM_COLUMNS order
+                      (receipt_id, name, price, currency, category, subcategory, receipt_created_at).
+    :param user_ids: Maps every referenced receipt_id to its user_id.
+    """
+    totals = defaultdict(lambda: [0.0, 0])
+    for receipt_id, _name, price, currency, category, subcategory, created_at in item_rows:
+        user_id = user_ids[receipt_id]
+        if user_id is None:
+            continue
+        entry = totals[rollup_key(user_id, _to_day(created_at), category, subcategory, currency)]
+        entry[0] += price or 0.0
+        entry[1] += 1
+    if not totals:
+        return
+
+    upsert_query = """
+        INSERT INTO expensetrackerai_daily_spending (
+            user_id, day, category, subcategory, currency, total, item_count
+        ) VALUES %s
+        ON CONFLICT (user_id, day, category, subcategory, currency) DO UPDATE
+        SET total = expensetrackerai_daily_spending.total + EXCLUDED.total,
+            item_count = expensetrackerai_daily_spending.item_count + EXCLUDED.item_count;
+    """
+    rows = [(*key, total, count) for key, (total, count) in totals.items()]
+    execute_values(cursor, upsert_query, rows, page_size=len(rows))
+
+
+def refresh_rollup(cursor, since: date | None = None) -> int:
+    """
+    Recompute rollup rows from the receipts and items tables on the given cursor without committing.
+
+    :param cursor: Open cursor; the caller owns the transaction.
+    :param since: Only rebuild days on or after this date. Rebuilds everything by default.
+    :return: Number of rollup rows written.
+    """
+    # A NULL since is folded away by the planner, so both forms still prune partitions and use indexes
+    delete_query = "DELETE FROM expensetrackerai_daily_spending WHERE %(since)s IS NULL OR day >= %(since)s;"
+    insert_query = """
+        INSERT INTO expensetrackerai_daily_spending (
+            user_id, day, category, subcategory, currency, total, item_count
+        )
+        SELECT r.user_id,
+               r.created_at::date,
+               COALESCE(i.category, 'Other'),
+               COALESCE(i.subcategory, 'Other'),
+               COALESCE(i.item_currency, 'EUR'),
+               COALESCE(SUM(i.item_price), 0),
+               COUNT(*)
+        FROM expensetrackerai_items i
+        JOIN expensetrackerai_receipts r ON i.receipt_id = r.id
+        WHERE r.user_id IS NOT NULL AND (%(since)s IS NULL OR r.created_at >= %(since)s)
+        GROUP BY 1, 2, 3, 4, 5;
+    """
+    params = {"since": since}
+    cursor.execute(delete_query, params)
+    cursor.execute(insert_query, params)
+    return cursor.rowcount
+
+
+def rebuild_rollup(since: date | None = None) -> None:
+    """
+    Recompute the rollup table from the receipts and items tables in one transaction.
+
+    :param since: Only rebuild days on or after this date. Rebuilds everything by default.
+    """
+    with PostgresConnector() as db:
+        rows = refresh_rollup(db.cursor, since)
+        db.conn.commit()
+    logger.info(f"Rollup rebuilt with {rows} rows" + ("" if since is None else f" since {since}"))
+
+
+def local_today() -> date:
+    """Today's date in the timezone receipts are stamped with."""
+    return datetime.now(pytz.timezone("Asia/Nicosia")).date()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Rebuild the daily spending rollup table.")
+    parser.add_argument("--since", type=date.fromisoformat, help="Only rebuild days on or after this date (YYYY-MM-DD)")
+    args = parser.parse_args()
+    rebuild_rollup(since=args.since)
@@ -0,0 +1,168 @@
+import asyncio
+import contextvars
+import logging
+
+from config.config import LLM_BATCH_MAX_SIZE, LLM_BATCH_WINDOW, OPENAI_DEADLINE
+from openai_integration.openai_client import (
+    generate_chat_completion_async,
+    get_async_openai_client,
+    process_expense_async,
+)
+from openai_integration.prompts import (
+    BATCH_EXPENSE_RESPONSE_FORMAT,
+    BATCH_EXPENSE_SYSTEM_PROMPT,
+    build_batch_user_content,
+    normalize_expense_result,
+)
+from openai_integration.resilience import BATCH_REQUEST, CircuitOpenError
+from openai_integration.scheduler import SchedulerOverloaded, llm_scheduler
+from utils.instrumentation import OPENAI_BATCH_SIZE, annotate
+
+logger = logging.getLogger(__name__)
+
+# Scheduler queue for batched requests, which serve several users at once
+BATCH_SCHEDULER_KEY = "text-batch"
+
+# Errors that single requests would only run into again
+BATCH_FATAL_ERRORS = (TimeoutError, SchedulerOverloaded, CircuitOpenError)
+
+
+class _PendingExpense:
+    __slots__ = ("batch_size", "deadline", "future", "text", "user_id")
+
+    def __init__(self, text: str, user_id: int | None, future: asyncio.Future, deadline: float):
+        self.text = text
+        self.user_id = user_id
+        self.future = future
+        self.deadline = deadline
+        self.batch_size = 1
+
+
+class TextExpenseBatcher:
+    """
+    Micro-batches text expenses from all users into shared LLM requests.
+
+    Expenses are collected for at most ``window`` seconds after the first one arrives, or until
+    ``max_size`` are waiting, and then sent as one request that returns a result per expense,
+    keyed by its position in the batch. The static system prompt is paid once per batch instead
+    of once per expense. Expenses the batch did not answer, or every expense of a failed batch,
+    are retried with one request each, so a bad batch never costs more than the old path.
+
+    Each expense is charged to its user's rate limit before it joins a batch, and has the same
+    OPENAI_DEADLINE as a single request, counted from its arrival: a batch must finish by the
+    earliest deadline of its members, and the single-request fallback by each expense's own.
+    """
+
+    def __init__(self, window: float = LLM_BATCH_WINDOW, max_size: int = LLM_BATCH_MAX_SIZE):
+        self.window = window
+        self.max_size = max_size
+        self._pending = []
+        self._timer = None
+        self._tasks = set()
+
+    async def analyze(self, text: str, user_id: int | None = None) -> dict:
+        """
+        Analyze one text expense, possibly together with other users' expenses.
+
+        :param text: The expense information in natural language.
+        :param user_id: The requesting user, for fair scheduling of single requests.
+        :return: The same structure as process_expense.
+        """
+        if self.max_size <= 1:
+            return await process_expense_async(text=text, user_id=user_id)
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + OPENAI_DEADLINE
+        async with asyncio.timeout_at(deadline):
+            await llm_scheduler.admit(user_id)
+        pending = _PendingExpense(text, user_id, loop.create_future(), deadline)
+        self._pending.append(pending)
+        if len(self._pending) >= self.max_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+
+        # Shielded: one caller giving up must not cancel the batch the others are waiting on
+        async with asyncio.timeout_at(deadline):
+            result = await asyncio.shield(pending.future)
+        annotate(llm_batch_size=pending.batch_size)
+        return result
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        # A fresh context, so the batch is not attributed to whichever request happened to start it
+        task = asyncio.create_task(self._run(batch), context=contextvars.Context())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: list[_PendingExpense]) -> None:
+        OPENAI_BATCH_SIZE.observe(len(batch))
+        results = {}
+        if len(batch) > 1:
+            try:
+                results = await self._analyze_batch(
+                    [pending.text for pending in batch], min(pending.deadline for pending in batch)
+                )
+            except BATCH_FATAL_ERRORS as e:
+                # A deadline has passed or the LLM is overloaded; retrying singly would only add load
+                for pending in batch:
+                    if not pending.future.done():
+                        pending.future.set_exception(e)
+                return
+            except Exception as e:
+                logger.warning(f"Batch of {len(batch)} text expenses failed, falling back to single requests: {e!r}")
+
+        missing = []
+        for n, pending in enumerate(batch):
+            if n in results:
+                pending.batch_size = len(batch)
+                if not pending.future.done():
+                    pending.future.set_result(results[n])
+            else:
+                missing.append(pending)
+        if missing and len(batch) > 1 and results:
+            logger.warning(f"Batch answered {len(results)} of {len(batch)} text expenses; retrying the rest singly")
+        await asyncio.gather(*(self._analyze_single(pending) for pending in missing))
+
+    @staticmethod
+    async def _analyze_batch(texts: list[str], deadline: float) -> dict[int, dict]:
+        """Send one request for all ``texts``; returns the results it contained, by position."""
+        messages = [
+            {"role": "system", "content": BATCH_EXPENSE_SYSTEM_PROMPT},
+            {"role": "user", "content": build_batch_user_content({str(n): text for n, text in enumerate(texts)})},
+        ]
+        response = await generate_chat_completion_async(
+            client=get_async_openai_client(),
+            messages=messages,
+            response_format=BATCH_EXPENSE_RESPONSE_FORMAT,
+            user_id=BATCH_SCHEDULER_KEY,
+            kind=BATCH_REQUEST,
+            # The members were charged to their own rate limits when they joined
+            rate_limited=False,
+            deadline=deadline,
+        )
+        results = {}
+        for entry in response["results"]:
+            key = entry["key"]
+            if key.isdigit() and int(key) < len(texts):
+                results.setdefault(int(key), normalize_expense_result(entry["expense"]))
+        return results
+
+    @staticmethod
+    async def _analyze_single(pending: _PendingExpense) -> None:
+        try:
+            result = await process_expense_async(text=pending.text, user_id=pending.user_id, deadline=pending.deadline)
+        except Exception as e:
+            if not pending.future.done():
+                pending.future.set_exception(e)
+            return
+        if not pending.future.done():
+            pending.future.set_result(result)
+
+
+text_expense_batcher = TextExpenseBatcher()
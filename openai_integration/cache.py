@@ -0,0 +1,207 @@
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from config.config import EXPENSE_CACHE_BACKEND, EXPENSE_CACHE_MAX_ENTRIES, EXPENSE_CACHE_TTL
+from database.db import PostgresConnector
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str | None) -> str:
+    """Normalize free-form expense text so trivially different spellings share a cache entry."""
+    return " ".join((text or "").casefold().split())
+
+
+def _digest(*parts: str | bytes) -> str:
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part if isinstance(part, bytes) else part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def text_cache_key(text: str) -> str:
+    """Cache key for a text-only expense."""
+    return "text:" + _digest(normalize_text(text))
+
+
+def photo_cache_key(file_unique_id: str, text: str) -> str:
+    """Cache key for a Telegram photo, available before the file is downloaded."""
+    return "photo:" + _digest(file_unique_id, normalize_text(text))
+
+
+def image_cache_key(image_bytes: bytes, text: str) -> str:
+    """Cache key for image content, for identical images re-uploaded under a new file ID."""
+    return "image:" + _digest(bytes(image_bytes), normalize_text(text))
+
+
+class MemoryCacheBackend:
+    """In-process LRU cache with a per-entry TTL and a fixed maximum number of entries."""
+
+    blocking = False
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, serialized value)
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> dict | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, payload = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+        return json.loads(payload)
+
+    def set(self, key: str, value: dict) -> None:
+        payload = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class PostgresCacheBackend:
+    """
+    Cache stored in the expensetrackerai_llm_cache table so entries survive restarts.
+    Rows past the TTL are ignored on read; the table is trimmed to ``max_entries`` by
+    last use every ``trim_every`` writes.
+    """
+
+    blocking = True
+
+    def __init__(self, max_entries: int, ttl: float, trim_every: int = 100):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.trim_every = trim_every
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> dict | None:
+        query = """
+            UPDATE expensetrackerai_llm_cache
+            SET last_used_at = NOW()
+            WHERE cache_key = %s AND created_at >= NOW() - make_interval(secs => %s)
+            RETURNING result;
+        """
+        with PostgresConnector() as db:
+            db.cursor.execute(query, (key, self.ttl))
+            row = db.cursor.fetchone()
+            db.conn.commit()
+        return row[0] if row else None
+
+    def set(self, key: str, value: dict) -> None:
+        query = """
+            INSERT INTO expensetrackerai_llm_cache (cache_key, result, created_at, last_used_at)
+            VALUES (%s, %s, NOW(), NOW())
+            ON CONFLICT (cache_key) DO UPDATE
+            SET result = EXCLUDED.result, created_at = EXCLUDED.created_at, last_used_at = EXCLUDED.last_used_at;
+        """
+        with self._lock:
+            self._writes += 1
+            trim = self._writes % self.trim_every == 0
+        with PostgresConnector() as db:
+            db.cursor.execute(query, (key, json.dumps(value, ensure_ascii=False)))
+            if trim:
+                db.cursor.execute(
+                    """
+                    DELETE FROM expensetrackerai_llm_cache
+                    WHERE cache_key IN (
+                        SELECT cache_key FROM expensetrackerai_llm_cache
+                        ORDER BY last_used_at DESC
+                        OFFSET %s
+                    );
+                    """,
+                    (self.max_entries,),
+                )
+            db.conn.commit()
+
+
+class NullCacheBackend:
+    """Backend used when caching is disabled."""
+
+    blocking = False
+
+    def get(self, key: str) -> dict | None:
+        return None
+
+    def set(self, key: str, value: dict) -> None:
+        pass
+
+
+class ExpenseCache:
+    """
+    Front for a cache backend that tracks hit/miss counters.
+    Backend failures are logged and treated as misses so the cache never breaks expense handling.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, *keys: str) -> dict | None:
+        """Return the first cached result found under any of ``keys``."""
+        for key in keys:
+            try:
+                value = self.backend.get(key)
+            except Exception as e:
+                logger.warning(f"Expense cache lookup failed: {e}")
+                value = None
+            if value is not None:
+                self.hits += 1
+                return value
+        self.misses += 1
+        return None
+
+    def set(self, keys: list[str], value: dict) -> None:
+        """Store ``value`` under every key in ``keys``."""
+        for key in keys:
+            try:
+                self.backend.set(key, value)
+            except Exception as e:
+                logger.warning(f"Expense cache write failed: {e}")
+
+    async def get_async(self, *keys: str) -> dict | None:
+        if self.backend.blocking:
+            return await asyncio.to_thread(self.get, *keys)
+        return self.get(*keys)
+
+    async def set_async(self, keys: list[str], value: dict) -> None:
+        if self.backend.blocking:
+            await asyncio.to_thread(self.set, keys, value)
+        else:
+            self.set(keys, value)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def create_expense_cache(backend: str = EXPENSE_CACHE_BACKEND) -> ExpenseCache:
+    """Build the cache configured by EXPENSE_CACHE_BACKEND ('memory', 'postgres' or 'none')."""
+    if backend == "memory":
+        return ExpenseCache(MemoryCacheBackend(EXPENSE_CACHE_MAX_ENTRIES, EXPENSE_CACHE_TTL))
+    if backend == "postgres":
+        return ExpenseCache(PostgresCacheBackend(EXPENSE_CACHE_MAX_ENTRIES, EXPENSE_CACHE_TTL))
+    if backend == "none":
+        return ExpenseCache(NullCacheBackend())
+    raise ValueError(f"Unknown expense cache backend: {backend}")
+
+
+expense_cache = create_expense_cache()
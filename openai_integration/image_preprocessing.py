@@ -0,0 +1,171 @@
+import asyncio
+import io
+import logging
+import math
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageFilter, ImageOps
+
+from config.config import (
+    IMAGE_AUTOCROP,
+    IMAGE_GRAYSCALE,
+    IMAGE_JPEG_QUALITY,
+    IMAGE_MAX_SIDE,
+    IMAGE_MAX_TILES,
+    IMAGE_MIN_SHORT_SIDE,
+    IMAGE_PREPROCESSING,
+    IMAGE_WORKERS,
+)
+
+logger = logging.getLogger(__name__)
+
+# Pillow releases the GIL while decoding, resizing and encoding, so threads are enough
+_executor = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix="image-preprocess")
+
+
+def image_mime_type(image_bytes: bytes) -> str:
+    """Guess the MIME type of an encoded image from its magic bytes, defaulting to JPEG."""
+    header = bytes(image_bytes[:12])
+    if header.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if header.startswith(b"RIFF") and header[8:12] == b"WEBP":
+        return "image/webp"
+    if header[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    return "image/jpeg"
+
+
+def select_photo_size(photo_sizes: list, min_short_side: int = IMAGE_MIN_SHORT_SIDE):
+    """
+    Pick the smallest Telegram PhotoSize whose shorter side is still legible.
+
+    Args:
+        photo_sizes (list[PhotoSize]): The sizes from ``message.photo``.
+        min_short_side (int): Minimum width/height in pixels for receipt text to stay readable.
+
+    Returns:
+        PhotoSize: The chosen size, or the largest one if none is big enough.
+    """
+    by_area = sorted(photo_sizes, key=lambda size: size.width * size.height)
+    for size in by_area:
+        if min(size.width, size.height) >= min_short_side:
+            return size
+    return by_area[-1]
+
+
+def vision_tiles(width: int, height: int) -> int:
+    """
+    Count the 512px tiles a high-detail image is billed for under OpenAI's published rules.
+
+    The image is first scaled to fit 2048x2048, then so that its shorter side is at most 768px.
+    """
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    return math.ceil(width * scale / 512) * math.ceil(height * scale / 512)
+
+
+def fit_to_tiles(width: int, height: int, max_tiles: int) -> tuple[int, int]:
+    """
+    Find the largest size with the same aspect ratio that costs at most ``max_tiles`` vision tiles.
+
+    Every grid of at most ``max_tiles`` tiles is tried and the one that keeps the most pixels wins.
+    """
+    if vision_tiles(width, height) <= max_tiles:
+        return width, height
+    scale = max(
+        min(1.0, columns * 512 / width, (max_tiles // columns) * 512 / height) for columns in range(1, max_tiles + 1)
+    )
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+def autocrop_receipt(image: Image.Image, margin: float = 0.02, min_area: float = 0.2) -> Image.Image:
+    """
+    Crop to the bright paper region of a receipt photo.
+
+    The bounding box of pixels well above the image's median brightness is used; the crop is
+    skipped if that box is implausibly small (e.g. a glare spot).
+    """
+    gray = image.convert("L")
+    gray.thumbnail((256, 256))
+    gray = gray.filter(ImageFilter.MedianFilter(5))
+    histogram = gray.histogram()
+    half, seen, median = gray.width * gray.height / 2, 0, 0
+    for value, count in enumerate(histogram):
+        seen += count
+        if seen >= half:
+            median = value
+            break
+    threshold = min(255, median + (255 - median) // 3)
+    bbox = gray.point(lambda p: 255 if p > threshold else 0).getbbox()
+    if bbox is None:
+        return image
+
+    scale_x, scale_y = image.width / gray.width, image.height / gray.height
+    left, top, right, bottom = bbox
+    if (right - left) * (bottom - top) < min_area * gray.width * gray.height:
+        return image
+    pad_x, pad_y = margin * image.width, margin * image.height
+    return image.crop(
+        (
+            max(0, int(left * scale_x - pad_x)),
+            max(0, int(top * scale_y - pad_y)),
+            min(image.width, int(right * scale_x + pad_x)),
+            min(image.height, int(bottom * scale_y + pad_y)),
+        )
+    )
+
+
+def preprocess_image(
+    image_bytes: bytes,
+    max_side: int = IMAGE_MAX_SIDE,
+    quality: int = IMAGE_JPEG_QUALITY,
+    grayscale: bool = IMAGE_GRAYSCALE,
+    autocrop: bool = IMAGE_AUTOCROP,
+    *,
+    max_tiles: int = IMAGE_MAX_TILES,
+) -> tuple[bytes, str]:
+    """
+    Shrink a receipt photo before it is sent to the vision model.
+
+    Args:
+        image_bytes (bytes): The encoded image as downloaded from Telegram.
+        max_side (int): Longest side in pixels after downsampling.
+        quality (int): JPEG quality used for re-encoding.
+        grayscale (bool): Drop colour information.
+        autocrop (bool): Crop to the detected receipt region first.
+        max_tiles (int): Shrink further until the image fits this many vision tiles (0 = no limit).
+
+    Returns:
+        tuple[bytes, str]: The re-encoded image and its MIME type. If the image cannot be
+        decoded, or re-encoding would make it larger, the original bytes are returned.
+    """
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as original:
+            image = ImageOps.exif_transpose(original)
+            if autocrop:
+                image = autocrop_receipt(image)
+            image = image.convert("L") if grayscale else image.convert("RGB")
+            image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+            if max_tiles > 0:
+                size = fit_to_tiles(image.width, image.height, max_tiles)
+                if size != image.size:
+                    image = image.resize(size, Image.Resampling.LANCZOS)
+            out = io.BytesIO()
+            image.save(out, format="JPEG", quality=quality, optimize=True)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Image preprocessing failed, sending original image: {e}")
+        return bytes(image_bytes), image_mime_type(image_bytes)
+
+    processed = out.getvalue()
+    if len(processed) >= len(image_bytes):
+        return bytes(image_bytes), image_mime_type(image_bytes)
+    return processed, "image/jpeg"
+
+
+async def preprocess_image_async(image_bytes: bytes) -> tuple[bytes, str]:
+    """Run preprocess_image in the worker pool so the event loop stays free."""
+    if not IMAGE_PREPROCESSING:
+        return bytes(image_bytes), image_mime_type(image_bytes)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, preprocess_image, image_bytes)
@@ -0,0 +1,252 @@
+import asyncio
+import logging
+import math
+import re
+import threading
+import time
+from collections import Counter, OrderedDict, defaultdict
+
+from bot.constants import CATEGORIES
+from config.config import (
+    LOCAL_CATEGORIZER_ENABLED,
+    LOCAL_CATEGORIZER_INDEX_TTL,
+    LOCAL_CATEGORIZER_MAX_USERS,
+    LOCAL_CATEGORIZER_MIN_CONFIDENCE,
+)
+from database.events import register_receipt_listener
+from database.items import get_user_item_labels
+
+logger = logging.getLogger(__name__)
+
+CURRENCY_ALIASES = {
+    "€": "EUR",
+    "eur": "EUR",
+    "euro": "EUR",
+    "euros": "EUR",
+    "$": "USD",
+    "usd": "USD",
+    "dollar": "USD",
+    "dollars": "USD",
+    "£": "GBP",
+    "gbp": "GBP",
+    "pound": "GBP",
+    "pounds": "GBP",
+}
+_CURRENCY = r"€|\$|£|eur(?:os?)?|usd|dollars?|gbp|pounds?"
+_AMOUNT = r"\d+(?:[.,]\d{1,2})?"
+_SEGMENT_RE = re.compile(
+    rf"^(?P<name>.*?[^\W\d_].*?)\s*(?:(?P<pre>{_CURRENCY})\s*)?(?P<amount>{_AMOUNT})\s*(?P<post>{_CURRENCY})?\.?$",
+    re.IGNORECASE,
+)
+# A name ending in a digit or separator means the amount was cut out of a longer number ("1,200", "1 299")
+_AMBIGUOUS_NAME_END_RE = re.compile(r"[\d.,'’]\s*$")
+_SPLIT_RE = re.compile(r"\s*(?:[;\n+]|,(?!\d)|\band\b|&)\s*", re.IGNORECASE)
+_TOKEN_RE = re.compile(r"[^\W\d_]{2,}")
+
+# Pseudo-count of unseen evidence: a label needs a few consistent sightings before it is trusted
+EVIDENCE_PRIOR = 0.5
+
+VALID_LABELS = {(category, subcategory) for category, subs in CATEGORIES.items() for subcategory in subs}
+
+
+def tokenize(text: str) -> list[str]:
+    return _TOKEN_RE.findall(text.casefold())
+
+
+def parse_expense_text(text: str) -> list[dict] | None:
+    """
+    Parse simple expense text such as "Croissant 1.20 euro and Latte 3.50" into items.
+
+    Returns:
+        list[dict] | None: One dict per item with 'name', 'price' (float) and 'currency',
+        or None if any part of the text is not an unambiguous "<name> <amount> [currency]" pair
+        (e.g. amounts with thousands separators, which are left to the LLM).
+    """
+    items = []
+    for segment in _SPLIT_RE.split(text.strip()):
+        if not segment:
+            continue
+        match = _SEGMENT_RE.match(segment)
+        if match is None or (not match.group("pre") and _AMBIGUOUS_NAME_END_RE.search(match.group("name"))):
+            return None
+        symbol = (match.group("pre") or match.group("post") or "eur").casefold()
+        items.append(
+            {
+                "name": match.group("name").strip(" -:"),
+                "price": float(match.group("amount").replace(",", ".")),
+                "currency": CURRENCY_ALIASES[symbol],
+            }
+        )
+    return items or None
+
+
+class UserLabelIndex:
+    """
+    Token index over one user's previously stored items.
+
+    Each token votes for the (category, subcategory) labels it was seen with, weighted by inverse
+    document frequency; an exact name match votes with its own label history.
+
+    The confidence is the winning label's share of the votes, scaled down by the share of the
+    name's tokens the index has seen at all (so "Starbucks gift card" is not Coffee just because
+    "Starbucks" is) and by how much history backs the label (see EVIDENCE_PRIOR).
+    """
+
+    def __init__(self):
+        self.names = defaultdict(Counter)  # normalized name -> label counts
+        self.tokens = defaultdict(Counter)  # token -> label counts
+        self.documents = 0
+        # Receipt listeners add items while handlers classify in worker threads
+        self._lock = threading.Lock()
+
+    def add(self, name: str, category: str, subcategory: str, count: int = 1) -> None:
+        if (category, subcategory) not in VALID_LABELS:
+            return
+        label = (category, subcategory)
+        tokens = tokenize(name)
+        with self._lock:
+            self.names[" ".join(tokens)][label] += count
+            for token in set(tokens):
+                self.tokens[token][label] += count
+            self.documents += count
+
+    def classify(self, name: str) -> tuple[tuple | None, float]:
+        """Return the most likely label for an item name and a confidence in [0, 1]."""
+        words = tokenize(name)
+        tokens = set(words)
+        with self._lock:
+            exact = self.names.get(" ".join(words))
+            if exact:
+                label, hits = exact.most_common(1)[0]
+                return label, hits / (sum(exact.values()) + EVIDENCE_PRIOR)
+
+            scores = Counter()
+            support = Counter()
+            known = 0
+            for token in tokens:
+                labels = self.tokens.get(token)
+                if not labels:
+                    continue
+                known += 1
+                seen = sum(labels.values())
+                idf = math.log(1 + self.documents / seen)
+                for label, hits in labels.items():
+                    scores[label] += idf * hits / seen
+                    support[label] += hits
+        if not scores:
+            return None, 0.0
+        label, best = scores.most_common(1)[0]
+        coverage = known / len(tokens)
+        evidence = support[label] / known
+        return label, best / sum(scores.values()) * coverage * evidence / (evidence + EVIDENCE_PRIOR)
+
+
+class LocalCategorizer:
+    """
+    Answers simple text expenses from the user's own history without calling the LLM.
+
+    Only EUR expenses in the "<name> <amount> [currency]" form are handled locally, and only when
+    every item is categorized with at least ``min_confidence``; everything else falls back.
+    A user's index is reloaded after ``index_ttl`` seconds, to pick up items stored by other
+    processes (queue workers); items stored by this process are added right away.
+    """
+
+    def __init__(self, min_confidence: float, max_users: int, index_ttl: float = LOCAL_CATEGORIZER_INDEX_TTL):
+        self.min_confidence = min_confidence
+        self.max_users = max_users
+        self.index_ttl = index_ttl
+        self.local = 0
+        self.fallbacks = 0
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _index_for(self, user_id: int) -> UserLabelIndex:
+        with self._lock:
+            entry = self._indexes.get(user_id)
+            if entry is not None and entry[0] >= time.monotonic():
+                self._indexes.move_to_end(user_id)
+                return entry[1]
+
+        index = UserLabelIndex()
+        for name, category, subcategory, count in get_user_item_labels(user_id):
+            index.add(name, category, subcategory, count)
+
+        with self._lock:
+            self._indexes[user_id] = (time.monotonic() + self.index_ttl, index)
+            self._indexes.move_to_end(user_id)
+            while len(self._indexes) > self.max_users:
+                self._indexes.popitem(last=False)
+        return index
+
+    def categorize(self, user_id: int, text: str) -> dict | None:
+        """
+        Build a process_expense-shaped result for ``text`` locally.
+
+        Returns:
+            dict | None: The structured expense, or None if the LLM should handle it.
+        """
+        result = self._categorize(user_id, text)
+        with self._lock:
+            if result is None:
+                self.fallbacks += 1
+            else:
+                self.local += 1
+        return result
+
+    def _categorize(self, user_id: int, text: str) -> dict | None:
+        parsed = parse_expense_text(text)
+        if not parsed or any(item["currency"] != "EUR" for item in parsed):
+            return None
+
+        index = self._index_for(user_id)
+        items = []
+        for item in parsed:
+            label, confidence = index.classify(item["name"])
+            if label is None or confidence < self.min_confidence:
+                return None
+            items.append(
+                {
+                    "name": item["name"],
+                    "price": f"{item['price']:.2f}",
+                    "currency": "EUR",
+                    "category": label[0],
+                    "subcategory": label[1],
+                }
+            )
+
+        total = f"{sum(item['price'] for item in parsed):.2f}"
+        return {
+            "total_price": total,
+            "currency": "EUR",
+            "total_price_euro": total,
+            "items": items,
+            "user_comment": text.strip(),
+        }
+
+    async def categorize_async(self, user_id: int, text: str) -> dict | None:
+        """Like categorize, but loads a user's history in a worker thread if it is not indexed yet."""
+        return await asyncio.to_thread(self.categorize, user_id, text)
+
+    def on_receipts_stored(self, receipt_ids: list[int], receipts: list) -> None:
+        """Keep loaded indexes current with newly stored items."""
+        for receipt in receipts:
+            with self._lock:
+                entry = self._indexes.get(receipt.get("user_id"))
+            if entry is None:
+                continue
+            index = entry[1]
+            for item in receipt.get("items", []):
+                index.add(item.get("name") or "", item.get("category"), item.get("subcategory"))
+
+    def stats(self) -> dict:
+        calls = self.local + self.fallbacks
+        return {
+            "local": self.local,
+            "fallbacks": self.fallbacks,
+            "local_ratio": self.local / calls if calls else 0.0,
+        }
+
+
+local_categorizer = LocalCategorizer(LOCAL_CATEGORIZER_MIN_CONFIDENCE, LOCAL_CATEGORIZER_MAX_USERS)
+if LOCAL_CATEGORIZER_ENABLED:
+    register_receipt_listener(local_categorizer.on_receipts_stored)
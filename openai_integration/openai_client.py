@@ -1,96 +1,289 @@
+import asyncio
 import base64
+import functools
 import json
+import time
+from typing import TYPE_CHECKING
 
-import openai
+from config.config import (
+    OPENAI_API_KEY,
+    OPENAI_BASE_URL,
+    OPENAI_DEADLINE,
+    OPENAI_HEDGING,
+    OPENAI_MAX_RETRIES,
+    OPENAI_REQUEST_TIMEOUT,
+)
+from openai_integration.prompts import (
+    EXPENSE_RESPONSE_FORMAT,
+    EXPENSE_SYSTEM_PROMPT,
+    build_user_content,
+    normalize_expense_result,
+)
+from openai_integration.resilience import (
+    SINGLE_REQUEST,
+    backoff_delay,
+    breaker_for,
+    hedged,
+    is_retryable,
+    latency_tracker_for,
+    select_model,
+)
+from openai_integration.scheduler import estimate_request_tokens, llm_scheduler
+from utils.instrumentation import annotate, observe_openai_call, timed
 
-from bot.constants import CATEGORIES
-from config.config import OPENAI_API_KEY
+if TYPE_CHECKING:
+    import openai
 
-openai.api_key = OPENAI_API_KEY
-client_openai = openai.OpenAI(api_key=OPENAI_API_KEY)
+# Fallback pause after a 429 that carries no Retry-After header
+DEFAULT_RETRY_AFTER = 5.0
 
 
-def generate_chat_completion(client: openai.OpenAI, message: dict, model: str = "gpt-4o-mini") -> dict:
+@functools.cache
+def get_openai_client() -> "openai.OpenAI":
+    """
+    The shared OpenAI client, built on first use.
+    Importing the SDK is one of the slowest parts of startup, so it is deferred until a request needs it.
+    """
+    import openai
+
+    return openai.OpenAI(
+        api_key=OPENAI_API_KEY,
+        base_url=OPENAI_BASE_URL,
+        timeout=OPENAI_REQUEST_TIMEOUT,
+        max_retries=OPENAI_MAX_RETRIES,
+    )
+
+
+@functools.cache
+def get_async_openai_client() -> "openai.AsyncOpenAI":
+    """
+    The shared async OpenAI client, built on first use.
+    Retries are left to generate_chat_completion_async, which must go back through the scheduler for each one.
+    """
+    import openai
+
+    return openai.AsyncOpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL, max_retries=0)
+
+
+def generate_chat_completion(
+    client: "openai.OpenAI",
+    messages: list[dict],
+    model: str = "gpt-4o-mini",
+    response_format: dict = EXPENSE_RESPONSE_FORMAT,
+) -> dict:
     """
     Sends a chat completion request to OpenAI API and returns the response.
+    Each attempt times out after OPENAI_REQUEST_TIMEOUT and the SDK retries transient errors;
+    while the model's circuit breaker is open, OPENAI_FALLBACK_MODEL is used instead.
 
     Args:
         client (openai.OpenAI): The OpenAI API client.
-        message (dict[str, Any]): The message payload for the API request.
+        messages (list[dict[str, Any]]): The messages for the API request, static prefix first.
         model (str, optional): The model to use. Defaults to "gpt-4o-mini".
+        response_format (dict, optional): Structured output format. Defaults to the strict expense schema.
 
     Returns:
         dict[str, Any]: The API response parsed as a JSON object.
+
+    Raises:
+        CircuitOpenError: If the circuit breaker is open and there is no usable fallback model.
     """
-    response = client.chat.completions.create(model=model, messages=[message], response_format={"type": "json_object"})
+    model = select_model(model)
+    start = time.perf_counter()
+    try:
+        response = client.chat.completions.create(model=model, messages=messages, response_format=response_format)
+    except Exception as e:
+        observe_openai_call(model, time.perf_counter() - start, "error")
+        breaker_for(model).record(not is_retryable(e))
+        raise
+    elapsed = time.perf_counter() - start
+    breaker_for(model).record(True)
+    latency_tracker_for(SINGLE_REQUEST).observe(model, elapsed)
+    observe_openai_call(model, elapsed, "ok", response.usage)
     return json.loads(response.choices[0].message.content)
 
 
-def process_expense(text: str, image_bytes: bytes | None = None) -> dict:
+def retry_after_seconds(error: Exception) -> float | None:
+    """
+    How long the provider asked us to wait, if ``error`` is a rate limit (HTTP 429) response.
+
+    Returns:
+        float | None: Seconds from the Retry-After headers, DEFAULT_RETRY_AFTER if they are missing,
+        or None if the error is not a rate limit.
+    """
+    if getattr(error, "status_code", None) != 429:
+        return None
+    headers = error.response.headers
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        return float(headers["retry-after"])
+    except (KeyError, ValueError):
+        return DEFAULT_RETRY_AFTER
+
+
+async def _attempt_completion(
+    client: "openai.AsyncOpenAI", messages: list[dict], model: str, response_format: dict, kind: str
+) -> "openai.types.chat.ChatCompletion":
+    """One attempt: pick the model through its circuit breaker and send the (possibly hedged) request."""
+    model = select_model(model)
+    tracker = latency_tracker_for(kind)
+    hedge_delay = tracker.hedge_delay(model) if OPENAI_HEDGING else None
+    request = functools.partial(
+        client.chat.completions.create,
+        model=model,
+        messages=messages,
+        response_format=response_format,
+        timeout=OPENAI_REQUEST_TIMEOUT,
+    )
+    start = time.perf_counter()
+    try:
+        response, latency = await hedged(request, hedge_delay)
+    except asyncio.CancelledError:
+        # Cut off by the overall deadline
+        breaker_for(model).record(False)
+        raise
+    except Exception as e:
+        observe_openai_call(model, time.perf_counter() - start, "error")
+        breaker_for(model).record(not is_retryable(e))
+        raise
+    breaker_for(model).record(True)
+    tracker.observe(model, latency)
+    observe_openai_call(model, time.perf_counter() - start, "ok", response.usage)
+    return response
+
+
+async def generate_chat_completion_async(
+    client: "openai.AsyncOpenAI",
+    messages: list[dict],
+    model: str = "gpt-4o-mini",
+    response_format: dict = EXPENSE_RESPONSE_FORMAT,
+    *,
+    user_id: int | None = None,
+    kind: str = SINGLE_REQUEST,
+    rate_limited: bool = True,
+    deadline: float | None = None,
+) -> dict:
+    """
+    Async counterpart of generate_chat_completion. Requests go through the fair scheduler: each
+    user waits for their own turn and rate limit, and at most OPENAI_MAX_CONCURRENCY requests are
+    in flight at once.
+
+    Every attempt times out after OPENAI_REQUEST_TIMEOUT, and the whole call, queueing and retries
+    included, after OPENAI_DEADLINE (or at ``deadline``). Timeouts, connection errors and 429/5xx responses are retried
+    up to OPENAI_MAX_RETRIES times with jittered exponential backoff; a 429 instead pauses every
+    request for its Retry-After. With OPENAI_HEDGING, an attempt still running after the model's
+    recent p95 latency for this kind of request gets a duplicate request and the first answer wins.
+
+    Args:
+        client (openai.AsyncOpenAI): The async OpenAI API client.
+        messages (list[dict[str, Any]]): The messages for the API request, static prefix first.
+        model (str, optional): The model to use. Defaults to "gpt-4o-mini".
+        response_format (dict, optional): Structured output format. Defaults to the strict expense schema.
+        user_id (int, optional): The requesting user, for fair queueing. Defaults to None (a shared queue).
+        kind (str, optional): SINGLE_REQUEST or BATCH_REQUEST, whose latencies are tracked separately.
+        rate_limited (bool, optional): False if the users were already charged with llm_scheduler.admit().
+        deadline (float, optional): Event loop time by which the call must finish, for calls that are
+            part of an earlier request. Defaults to OPENAI_DEADLINE from now.
+
+    Returns:
+        dict[str, Any]: The API response parsed as a JSON object.
+
+    Raises:
+        SchedulerOverloaded: If too many requests are already waiting.
+        CircuitOpenError: If the circuit breaker is open and there is no usable fallback model.
+        TimeoutError: If no answer arrived within OPENAI_DEADLINE, or by ``deadline``.
+    """
+    estimated_tokens = estimate_request_tokens(messages)
+    if deadline is None:
+        deadline = asyncio.get_running_loop().time() + OPENAI_DEADLINE
+    async with asyncio.timeout_at(deadline):
+        for attempt in range(OPENAI_MAX_RETRIES + 1):
+            with timed("llm_queue"):
+                slot = await llm_scheduler.acquire(user_id, estimated_tokens, rate_limited)
+            try:
+                response = await _attempt_completion(client, messages, model, response_format, kind)
+                slot.tokens = response.usage.total_tokens if response.usage else estimated_tokens
+                return json.loads(response.choices[0].message.content)
+            except Exception as e:
+                retry_after = retry_after_seconds(e)
+                if retry_after is not None:
+                    # Pause everyone before the slot is released, so no queued request hits the limit again
+                    llm_scheduler.pause(retry_after)
+                if attempt == OPENAI_MAX_RETRIES or not is_retryable(e):
+                    raise
+            finally:
+                llm_scheduler.release(slot)
+            annotate(llm_retries=attempt + 1)
+            if retry_after is None:
+                await asyncio.sleep(backoff_delay(attempt))
+
+
+def build_expense_messages(text: str, image_bytes: bytes | None = None, image_mime: str = "image/jpeg") -> list:
+    """
+    Builds the chat messages that ask the model to structure the given expense.
+    The precomputed system prompt comes first and the user's input last, so the shared prefix
+    can be served from the provider's prompt cache.
+
+    Args:
+        text (str): The expense information in natural language.
+        image_bytes (bytes, optional): The image file as a byte stream. Defaults to None.
+        image_mime (str, optional): MIME type of ``image_bytes``. Defaults to "image/jpeg".
+
+    Returns:
+        list[dict]: The system and user messages for the chat completions API.
+    """
+    image_url = None
+    if image_bytes:
+        base64_image = base64.b64encode(image_bytes).decode("utf-8")
+        image_url = f"data:{image_mime};base64,{base64_image}"
+    return [
+        {"role": "system", "content": EXPENSE_SYSTEM_PROMPT},
+        {"role": "user", "content": build_user_content(text, image_url)},
+    ]
+
+
+def process_expense(text: str, image_bytes: bytes | None = None, image_mime: str = "image/jpeg") -> dict:
     """
     Processes expense information from text (and optionally an image) and returns structured expense data.
 
     Args:
         text (str): The expense information in natural language.
         image_bytes (bytes, optional): The image file as a byte stream. Defaults to None.
+        image_mime (str, optional): MIME type of ``image_bytes``. Defaults to "image/jpeg".
 
     Returns:
         dict: A JSON object with keys: 'total_price', 'currency', 'total_price_euro', 'items', 'user_comment'.
               Each item in 'items' includes 'name', 'price', 'currency', 'category', and 'subcategory'.
               If the image does not appear to be a valid receipt, returns an object with an 'error' key.
     """
-    example_input = "Starbucks Croissant 1.20 euro and Latte 3.50 euro"
-    example_output = {
-        "total_price": "4.70",
-        "currency": "EUR",
-        "total_price_euro": "4.70",
-        "items": [
-            {
-                "name": "Croissant",
-                "price": "1.20",
-                "currency": "EUR",
-                "category": "Food & Drinks",
-                "subcategory": "Groceries & Delivery",
-            },
-            {"name": "Latte", "price": "3.50", "currency": "EUR", "category": "Food & Drinks", "subcategory": "Coffee"},
-        ],
-        "user_comment": "Starbucks purchase",
-    }
-    # Add instruction for invalid receipt detection.
-    extra_instruction = (
-        "If the provided image does not contain receipt-related text, or if the provided text does not appear to be a valid receipt, "
-        "return a JSON object with the key 'error' and the value 'Invalid receipt'.\n"
-        "If the currency cannot be determined, default to EUR.\n"
-        "Ensure that the entire response is strictly in English."
-    )
-    prompt = (
-        f"Analyze the following expense information: {text}\n\n"
-        "Available categories and subcategories:\n"
-        f"{json.dumps(CATEGORIES, ensure_ascii=False, indent=2)}\n\n"
-        "Return a JSON object with the following keys: 'total_price', 'currency', 'total_price_euro', 'items', 'user_comment'.\n"
-        "Each item in 'items' should include 'name', 'price', 'currency', 'category', and 'subcategory'.\n"
-        "Ensure that 'category' and 'subcategory' are chosen only from the provided list.\n\n"
-        f"{extra_instruction}\n\n"
-        f"Example input:\n{example_input}\n\n"
-        "Example output:\n"
-        f"{json.dumps(example_output, ensure_ascii=False, indent=2)}"
-    )
+    messages = build_expense_messages(text=text, image_bytes=image_bytes, image_mime=image_mime)
+    result = generate_chat_completion(client=get_openai_client(), messages=messages)
+    return normalize_expense_result(result)
 
-    if image_bytes:
-        base64_image = base64.b64encode(image_bytes).decode("utf-8")
-        message_content = [
-            {
-                "type": "text",
-                "text": prompt,
-            },
-            {
-                "type": "image_url",
-                "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"},
-            },
-        ]
-        message = {"role": "user", "content": message_content}
-    else:
-        message = {"role": "user", "content": prompt}
-
-    result = generate_chat_completion(client=client_openai, message=message)
-    return result
+
+async def process_expense_async(
+    text: str,
+    image_bytes: bytes | None = None,
+    image_mime: str = "image/jpeg",
+    user_id: int | None = None,
+    deadline: float | None = None,
+) -> dict:
+    """
+    Non-blocking version of process_expense for use inside the bot's event loop.
+
+    Args:
+        text (str): The expense information in natural language.
+        image_bytes (bytes, optional): The image file as a byte stream. Defaults to None.
+        image_mime (str, optional): MIME type of ``image_bytes``. Defaults to "image/jpeg".
+        user_id (int, optional): The requesting user, for fair scheduling. Defaults to None.
+        deadline (float, optional): Event loop time by which the answer is needed. Defaults to OPENAI_DEADLINE from now.
+
+    Returns:
+        dict: The same structure as process_expense.
+    """
+    messages = build_expense_messages(text=text, image_bytes=image_bytes, image_mime=image_mime)
+    result = await generate_chat_completion_async(
+        client=get_async_openai_client(), messages=messages, user_id=user_id, deadline=deadline
+    )
+    return normalize_expense_result(result)
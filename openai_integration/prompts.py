@@ -0,0 +1,153 @@
+"""
+Prompt and response schema for expense analysis.
+
+Everything that does not depend on the user's input is built once at import time, so the system
+message is byte-identical across requests and can be served from the provider's prompt cache.
+The variable part (the user's text and image) always goes last.
+"""
+
+import json
+
+from bot.constants import CATEGORIES
+
+INVALID_RECEIPT = "Invalid receipt"
+
+
+def build_item_schema(categories: dict) -> dict:
+    """
+    Item schema that only allows valid (category, subcategory) pairs: one ``anyOf`` branch per
+    category, each with its own subcategory enum.
+    """
+    branches = []
+    for category, subcategories in categories.items():
+        branches.append(
+            {
+                "type": "object",
+                "properties": {
+                    "name": {"type": "string"},
+                    "price": {"type": "number"},
+                    "currency": {"type": "string", "description": "ISO 4217 code"},
+                    "category": {"type": "string", "enum": [category]},
+                    "subcategory": {"type": "string", "enum": list(subcategories)},
+                },
+                "required": ["name", "price", "currency", "category", "subcategory"],
+                "additionalProperties": False,
+            }
+        )
+    return {"anyOf": branches}
+
+
+def build_expense_schema(categories: dict) -> dict:
+    """
+    Strict JSON schema for one analyzed expense. ``error`` is null for valid receipts and
+    "Invalid receipt" otherwise.
+    """
+    return {
+        "type": "object",
+        "properties": {
+            "error": {"type": ["string", "null"], "enum": [INVALID_RECEIPT, None]},
+            "total_price": {"type": "number"},
+            "currency": {"type": "string", "description": "ISO 4217 code"},
+            "total_price_euro": {"type": "number"},
+            "items": {"type": "array", "items": build_item_schema(categories)},
+            "user_comment": {"type": "string"},
+        },
+        "required": ["error", "total_price", "currency", "total_price_euro", "items", "user_comment"],
+        "additionalProperties": False,
+    }
+
+
+EXPENSE_SCHEMA = build_expense_schema(CATEGORIES)
+EXPENSE_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {"name": "expense", "strict": True, "schema": EXPENSE_SCHEMA},
+}
+
+_EXAMPLE_INPUT = "Starbucks Croissant 1.20 euro and Latte 3.50 euro"
+_EXAMPLE_OUTPUT = {
+    "error": None,
+    "total_price": 4.70,
+    "currency": "EUR",
+    "total_price_euro": 4.70,
+    "items": [
+        {
+            "name": "Croissant",
+            "price": 1.20,
+            "currency": "EUR",
+            "category": "Food & Drinks",
+            "subcategory": "Groceries & Delivery",
+        },
+        {"name": "Latte", "price": 3.50, "currency": "EUR", "category": "Food & Drinks", "subcategory": "Coffee"},
+    ],
+    "user_comment": "Starbucks purchase",
+}
+
+EXPENSE_SYSTEM_PROMPT = (
+    "You analyze expense information sent by the user as text and/or a receipt image.\n\n"
+    "Available categories and subcategories:\n"
+    f"{json.dumps(CATEGORIES, ensure_ascii=False)}\n\n"
+    "Return 'total_price', 'currency', 'total_price_euro', 'items' and 'user_comment'.\n"
+    "Each item in 'items' should include 'name', 'price', 'currency', 'category', and 'subcategory'.\n"
+    "Ensure that 'category' and 'subcategory' are chosen only from the provided list.\n\n"
+    "If the provided image does not contain receipt-related text, or if the provided text does not appear "
+    f"to be a valid receipt, set 'error' to '{INVALID_RECEIPT}'; otherwise set 'error' to null.\n"
+    "If the currency cannot be determined, default to EUR.\n"
+    "Ensure that the entire response is strictly in English.\n\n"
+    f"Example input:\n{_EXAMPLE_INPUT}\n\n"
+    "Example output:\n"
+    f"{json.dumps(_EXAMPLE_OUTPUT, ensure_ascii=False)}"
+)
+
+
+# Several text expenses from different users answered by one request, matched back up by key
+BATCH_EXPENSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "results": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {"key": {"type": "string"}, "expense": EXPENSE_SCHEMA},
+                "required": ["key", "expense"],
+                "additionalProperties": False,
+            },
+        }
+    },
+    "required": ["results"],
+    "additionalProperties": False,
+}
+BATCH_EXPENSE_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {"name": "expense_batch", "strict": True, "schema": BATCH_EXPENSE_SCHEMA},
+}
+
+BATCH_EXPENSE_SYSTEM_PROMPT = (
+    EXPENSE_SYSTEM_PROMPT + "\n\n"
+    "The user message may contain several unrelated expenses as a JSON array of objects with a 'key' "
+    "and a 'text'. Analyze each one on its own, exactly as described above, and return one entry in "
+    "'results' per expense with its 'key' and the analysis as 'expense'."
+)
+
+
+def build_batch_user_content(texts: dict[str, str]) -> str:
+    """The variable part of a batched request: every expense text under its key."""
+    entries = [{"key": key, "text": text} for key, text in texts.items()]
+    return f"Analyze each of the following expenses: {json.dumps(entries, ensure_ascii=False)}"
+
+
+def build_user_content(text: str, image_url: str | None = None) -> str | list:
+    """The variable part of the request: the user's text and, optionally, the image data URL."""
+    prompt = f"Analyze the following expense information: {text}"
+    if image_url is None:
+        return prompt
+    return [
+        {"type": "text", "text": prompt},
+        {"type": "image_url", "image_url": {"url": image_url}},
+    ]
+
+
+def normalize_expense_result(result: dict) -> dict:
+    """Drop the schema's null ``error`` so valid results look like they always have."""
+    if result.get("error") is None:
+        result.pop("error", None)
+    return result
@@ -0,0 +1,238 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections import defaultdict, deque
+
+from config.config import (
+    OPENAI_BREAKER_COOLDOWN,
+    OPENAI_BREAKER_FAILURE_RATIO,
+    OPENAI_BREAKER_MIN_CALLS,
+    OPENAI_BREAKER_WINDOW,
+    OPENAI_FALLBACK_MODEL,
+    OPENAI_HEDGE_MIN_DELAY,
+    OPENAI_HEDGE_MIN_SAMPLES,
+    OPENAI_RETRY_BASE_DELAY,
+    OPENAI_RETRY_MAX_DELAY,
+)
+from utils.instrumentation import OPENAI_CIRCUIT_OPEN, OPENAI_HEDGES, OPENAI_LATENCY_QUANTILE, annotate
+
+logger = logging.getLogger(__name__)
+
+LATENCY_QUANTILES = (0.5, 0.95, 0.99)
+
+# Request kinds with their own latency statistics: a batch of expenses takes much longer than one
+SINGLE_REQUEST = "single"
+BATCH_REQUEST = "batch"
+
+
+class CircuitOpenError(Exception):
+    """Raised when a model's circuit breaker is open and no fallback model is available."""
+
+
+class LatencyTracker:
+    """
+    Sliding window of recent successful request latencies per model, for one kind of request.
+    Its percentiles drive the hedge delay and are published as a Prometheus gauge.
+    """
+
+    def __init__(self, kind: str = SINGLE_REQUEST, window: int = 500):
+        self.kind = kind
+        self.window = window
+        self._samples = defaultdict(lambda: deque(maxlen=self.window))
+        self._lock = threading.Lock()
+
+    def observe(self, model: str, seconds: float) -> None:
+        with self._lock:
+            samples = self._samples[model]
+            samples.append(seconds)
+            if len(samples) % 10 == 0:
+                for q, value in self._percentiles(samples).items():
+                    OPENAI_LATENCY_QUANTILE.labels(model, self.kind, str(q)).set(value)
+
+    @staticmethod
+    def _percentiles(samples) -> dict:
+        ordered = sorted(samples)
+        return {q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] for q in LATENCY_QUANTILES}
+
+    def percentiles(self, model: str) -> dict:
+        """Latency percentiles (p50, p95, p99) in seconds, or an empty dict before the first sample."""
+        with self._lock:
+            samples = self._samples.get(model)
+            return self._percentiles(samples) if samples else {}
+
+    def hedge_delay(self, model: str, min_samples: int = OPENAI_HEDGE_MIN_SAMPLES) -> float | None:
+        """The current p95 latency (at least OPENAI_HEDGE_MIN_DELAY), or None while there is too little data."""
+        with self._lock:
+            samples = self._samples.get(model)
+            if samples is None or len(samples) < min_samples:
+                return None
+            return max(OPENAI_HEDGE_MIN_DELAY, self._percentiles(samples)[0.95])
+
+
+class CircuitBreaker:
+    """
+    Error-rate circuit breaker for one model.
+
+    Opens when at least ``failure_ratio`` of the last ``window`` calls (and at least ``min_calls``)
+    failed. While open, calls are refused; after ``cooldown`` seconds a single trial call is let
+    through, and its outcome closes the breaker or keeps it open for another cooldown.
+    """
+
+    __slots__ = ("cooldown", "failure_ratio", "min_calls", "model", "opened_at", "probing", "results")
+
+    def __init__(
+        self,
+        model: str,
+        window: int = OPENAI_BREAKER_WINDOW,
+        min_calls: int = OPENAI_BREAKER_MIN_CALLS,
+        failure_ratio: float = OPENAI_BREAKER_FAILURE_RATIO,
+        cooldown: float = OPENAI_BREAKER_COOLDOWN,
+    ):
+        self.model = model
+        self.results = deque(maxlen=window)
+        self.min_calls = min_calls
+        self.failure_ratio = failure_ratio
+        self.cooldown = cooldown
+        self.opened_at = None
+        self.probing = False
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def allow(self) -> bool:
+        """Whether a call may be made now. Every allowed call must be followed by record()."""
+        if self.opened_at is None:
+            return True
+        if not self.probing and time.monotonic() - self.opened_at >= self.cooldown:
+            self.probing = True
+            return True
+        return False
+
+    def record(self, success: bool) -> None:
+        if self.opened_at is not None:
+            if self.probing:
+                self.probing = False
+                if success:
+                    self._close()
+                else:
+                    self.opened_at = time.monotonic()
+            # Calls started before the breaker opened don't change its state
+            return
+
+        self.results.append(success)
+        failures = self.results.count(False)
+        if len(self.results) >= self.min_calls and failures >= self.failure_ratio * len(self.results):
+            self.opened_at = time.monotonic()
+            OPENAI_CIRCUIT_OPEN.labels(self.model).set(1)
+            logger.warning(f"Circuit breaker for {self.model} opened ({failures}/{len(self.results)} calls failed)")
+
+    def _close(self) -> None:
+        self.opened_at = None
+        self.results.clear()
+        OPENAI_CIRCUIT_OPEN.labels(self.model).set(0)
+        logger.info(f"Circuit breaker for {self.model} closed")
+
+
+_latency_trackers = {}
+_breakers = {}
+
+
+def latency_tracker_for(kind: str = SINGLE_REQUEST) -> LatencyTracker:
+    tracker = _latency_trackers.get(kind)
+    if tracker is None:
+        tracker = _latency_trackers[kind] = LatencyTracker(kind)
+    return tracker
+
+
+def breaker_for(model: str) -> CircuitBreaker:
+    breaker = _breakers.get(model)
+    if breaker is None:
+        breaker = _breakers[model] = CircuitBreaker(model)
+    return breaker
+
+
+def select_model(model: str, fallback: str | None = OPENAI_FALLBACK_MODEL) -> str:
+    """
+    Pick the model for the next attempt: ``model`` while its breaker allows calls, else the fallback.
+
+    :raises CircuitOpenError: If neither model may be called.
+    """
+    if breaker_for(model).allow():
+        return model
+    if fallback and fallback != model and breaker_for(fallback).allow():
+        annotate(fallback_model=fallback)
+        return fallback
+    raise CircuitOpenError(f"OpenAI circuit breaker open for {model}")
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Timeouts, connection errors, 408/409/429 and 5xx responses are worth retrying."""
+    if isinstance(error, TimeoutError):
+        return True
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status in (408, 409, 429) or status >= 500
+    import openai
+
+    return isinstance(error, openai.APIConnectionError)
+
+
+def backoff_delay(attempt: int, base: float = OPENAI_RETRY_BASE_DELAY, cap: float = OPENAI_RETRY_MAX_DELAY) -> float:
+    """Full-jitter exponential backoff before retry number ``attempt`` (0-based)."""
+    return random.uniform(0, min(cap, base * 2**attempt))  # noqa: S311
+
+
+async def hedged(request, hedge_delay: float | None):
+    """
+    Run ``request()`` and, if it has not finished after ``hedge_delay`` seconds, a second copy of it.
+
+    :param request: Zero-argument coroutine function performing the call.
+    :param hedge_delay: Seconds before the hedge is sent; None to never hedge.
+    :return: ``(result, latency)`` of whichever copy succeeded first; the other one is cancelled.
+    :raises: The last error if every copy failed.
+    """
+
+    async def timed_request():
+        start = time.perf_counter()
+        result = await request()
+        return result, time.perf_counter() - start
+
+    first = asyncio.ensure_future(timed_request())
+    pending = {first}
+    error = None
+    # Whatever is still running is cancelled on the way out, also when the caller is cancelled
+    try:
+        if hedge_delay is None:
+            return await first
+
+        done, _ = await asyncio.wait(pending, timeout=hedge_delay)
+        if done:
+            return first.result()
+
+        OPENAI_HEDGES.inc()
+        annotate(hedged=True)
+        pending.add(asyncio.ensure_future(timed_request()))
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+def latency_stats() -> dict:
+    """Latency percentiles per request kind and breaker state for every model used so far."""
+    return {
+        model: {
+            "percentiles": {kind: tracker.percentiles(model) for kind, tracker in _latency_trackers.items()},
+            "circuit_open": breaker.is_open,
+        }
+        for model, breaker in _breakers.items()
+    }
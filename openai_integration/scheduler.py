@@ -0,0 +1,278 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+
+from config.config import (
+    LLM_MAX_QUEUE_PER_USER,
+    LLM_MAX_QUEUE_TOTAL,
+    LLM_TOKENS_PER_MINUTE,
+    LLM_USER_BURST,
+    LLM_USER_RATE,
+    OPENAI_MAX_CONCURRENCY,
+)
+from utils.instrumentation import annotate
+
+logger = logging.getLogger(__name__)
+
+# Rough token costs used to reserve TPM budget before the real usage is known
+CHARS_PER_TOKEN = 4
+IMAGE_TOKENS = 800
+COMPLETION_TOKENS = 400
+
+
+class SchedulerOverloaded(Exception):
+    """Raised instead of queueing when a user's queue, or the global queue, is full."""
+
+
+class TokenBucket:
+    """Classic token bucket; ``tokens`` may go negative when actual usage exceeds a reservation."""
+
+    __slots__ = ("capacity", "rate", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount: float) -> float:
+        """Seconds until ``amount`` tokens (at most a full bucket) are available."""
+        missing = min(amount, self.capacity) - self.tokens
+        return max(0.0, missing / self.rate) if self.rate else float("inf")
+
+
+class _Ticket:
+    __slots__ = ("future", "rate_limited", "tokens")
+
+    def __init__(self, future: asyncio.Future, tokens: int, rate_limited: bool = True):
+        self.future = future
+        self.tokens = tokens
+        self.rate_limited = rate_limited
+
+
+class Slot:
+    """A granted LLM call; set ``tokens`` to the actual usage so the TPM budget is corrected."""
+
+    __slots__ = ("reserved", "tokens")
+
+    def __init__(self, reserved: int):
+        self.reserved = reserved
+        self.tokens = reserved
+
+
+def estimate_request_tokens(messages: list[dict]) -> int:
+    """Estimate the prompt plus completion tokens of a chat request from its messages."""
+    tokens = COMPLETION_TOKENS
+    for message in messages:
+        content = message["content"]
+        parts = [content] if isinstance(content, str) else content
+        for part in parts:
+            if isinstance(part, str):
+                tokens += len(part) // CHARS_PER_TOKEN
+            elif part.get("type") == "text":
+                tokens += len(part["text"]) // CHARS_PER_TOKEN
+            elif part.get("type") == "image_url":
+                tokens += IMAGE_TOKENS
+    return tokens
+
+
+class FairScheduler:
+    """
+    Admission control for LLM calls, shared by all handlers in the process.
+
+    Every user has a FIFO queue and a token bucket of ``user_rate`` calls per second (bursts of up
+    to ``user_burst``). Waiting calls are granted round-robin across users whenever a concurrency
+    slot and enough of the global tokens-per-minute budget are free, so a user with a long backlog
+    only delays their own calls. When queues are full, callers get SchedulerOverloaded right away;
+    after a provider 429, all grants pause until its Retry-After has passed.
+
+    A call made on behalf of several users (a batch) is queued under its own key without a rate
+    limit of its own; each member is charged to their bucket with admit() before joining it.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = OPENAI_MAX_CONCURRENCY,
+        *,
+        tokens_per_minute: int = LLM_TOKENS_PER_MINUTE,
+        user_rate: float = LLM_USER_RATE,
+        user_burst: int = LLM_USER_BURST,
+        max_queue_per_user: int = LLM_MAX_QUEUE_PER_USER,
+        max_queue_total: int = LLM_MAX_QUEUE_TOTAL,
+    ):
+        self.max_concurrency = max_concurrency
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.max_queue_per_user = max_queue_per_user
+        self.max_queue_total = max_queue_total
+        self.tpm = TokenBucket(tokens_per_minute / 60, tokens_per_minute) if tokens_per_minute else None
+        self.in_flight = 0
+        self.queued = 0
+        self.shed = 0
+        self._queues = OrderedDict()
+        self._buckets = {}
+        self._paused_until = 0.0
+        self._timer = None
+
+    def _bucket(self, user_id) -> TokenBucket:
+        bucket = self._buckets.get(user_id)
+        if bucket is None:
+            if len(self._buckets) > 10 * self.max_queue_total:
+                self._prune_buckets()
+            bucket = self._buckets[user_id] = TokenBucket(self.user_rate, self.user_burst)
+        return bucket
+
+    def _prune_buckets(self) -> None:
+        now = time.monotonic()
+        for user_id, bucket in list(self._buckets.items()):
+            bucket.refill(now)
+            if bucket.tokens >= bucket.capacity and user_id not in self._queues:
+                del self._buckets[user_id]
+
+    def pause(self, seconds: float) -> None:
+        """Stop granting calls for ``seconds`` (e.g. after a 429 with Retry-After)."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        logger.warning(f"LLM calls paused for {seconds:.1f}s after a rate limit response")
+        self._schedule_wakeup(seconds)
+
+    def _schedule_wakeup(self, delay: float) -> None:
+        loop = asyncio.get_running_loop()
+        if self._timer is not None:
+            if self._timer.when() <= loop.time() + delay:
+                return
+            self._timer.cancel()
+        self._timer = loop.call_later(delay, self._on_timer)
+
+    def _on_timer(self) -> None:
+        self._timer = None
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        """Grant as many waiting calls as the limits allow, one user at a time in turn."""
+        now = time.monotonic()
+        if now < self._paused_until:
+            self._schedule_wakeup(self._paused_until - now)
+            return
+
+        delays = []
+        granted = True
+        while granted and self._queues and self.in_flight < self.max_concurrency:
+            granted = False
+            for user_id in list(self._queues):
+                if self.in_flight >= self.max_concurrency:
+                    break
+                queue = self._queues[user_id]
+                while queue and queue[0].future.done():  # cancelled while waiting
+                    queue.popleft()
+                    self.queued -= 1
+                if not queue:
+                    del self._queues[user_id]
+                    continue
+
+                ticket = queue[0]
+                bucket = self._bucket(user_id) if ticket.rate_limited else None
+                if bucket is not None:
+                    bucket.refill(now)
+                    if bucket.tokens < 1:
+                        delays.append(bucket.delay(1))
+                        continue
+                if self.tpm is not None:
+                    self.tpm.refill(now)
+                    if self.tpm.tokens < min(ticket.tokens, self.tpm.capacity):
+                        # The global budget is exhausted for everyone; wait for it to refill
+                        delays.append(self.tpm.delay(ticket.tokens))
+                        break
+                    self.tpm.tokens -= ticket.tokens
+
+                if bucket is not None:
+                    bucket.tokens -= 1
+                queue.popleft()
+                self.queued -= 1
+                self.in_flight += 1
+                ticket.future.set_result(None)
+                granted = True
+                if queue:
+                    self._queues.move_to_end(user_id)
+                else:
+                    del self._queues[user_id]
+
+        if self._queues and delays and self.in_flight < self.max_concurrency:
+            self._schedule_wakeup(min(delays))
+
+    async def admit(self, user_id) -> None:
+        """
+        Charge one call to the user's token bucket, waiting until it has refilled if need be,
+        for a call made on their behalf under another key (e.g. their share of a batch).
+
+        :raises SchedulerOverloaded: If the user already has max_queue_per_user calls waiting.
+        """
+        bucket = self._bucket(user_id)
+        bucket.refill(time.monotonic())
+        if bucket.tokens <= -self.max_queue_per_user:
+            self.shed += 1
+            annotate(shed=True)
+            raise SchedulerOverloaded(f"LLM rate limit backlog full for user {user_id}")
+        # The token is taken now, so later calls queue up behind this one
+        bucket.tokens -= 1
+        if bucket.tokens < 0:
+            try:
+                await asyncio.sleep(-bucket.tokens / bucket.rate if bucket.rate else 0)
+            except asyncio.CancelledError:
+                bucket.tokens += 1
+                raise
+
+    async def acquire(self, user_id, tokens: int, rate_limited: bool = True) -> Slot:
+        """
+        Wait for this user's turn and take one concurrency slot; hand it back with release().
+
+        :param user_id: Key the call is queued and rate limited under.
+        :param tokens: Estimated tokens for the call, reserved from the TPM budget.
+        :param rate_limited: False for calls whose users were already charged with admit(); they
+                             are only bound by the concurrency, TPM and total queue limits.
+        :return: The granted Slot.
+        :raises SchedulerOverloaded: If the queues are full.
+        """
+        queue = self._queues.get(user_id)
+        user_queue_full = rate_limited and queue is not None and len(queue) >= self.max_queue_per_user
+        if self.queued >= self.max_queue_total or user_queue_full:
+            self.shed += 1
+            annotate(shed=True)
+            raise SchedulerOverloaded(f"LLM queue full for user {user_id}")
+        if queue is None:
+            queue = self._queues[user_id] = deque()
+
+        ticket = _Ticket(asyncio.get_running_loop().create_future(), tokens, rate_limited)
+        queue.append(ticket)
+        self.queued += 1
+        self._dispatch()
+        try:
+            await ticket.future
+        except asyncio.CancelledError:
+            if ticket.future.done() and not ticket.future.cancelled():
+                # Granted just before the caller was cancelled: give the slot back
+                self.release(Slot(tokens))
+            raise
+        return Slot(tokens)
+
+    def release(self, slot: Slot) -> None:
+        """Return a slot, correcting the TPM budget by the difference between actual and reserved tokens."""
+        self.in_flight -= 1
+        if self.tpm is not None:
+            self.tpm.tokens -= slot.tokens - slot.reserved
+        self._dispatch()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "users_waiting": len(self._queues),
+            "shed": self.shed,
+        }
+
+
+llm_scheduler = FairScheduler()
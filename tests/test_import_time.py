@@ -0,0 +1,29 @@
+import importlib.util
+import statistics
+
+import pytest
+
+from benchmarks.import_time import DEFAULT_BUDGET, DEFAULT_MODULES, LAZY_PACKAGES, measure
+
+RUNS = 3
+
+# Needed to import the entry points at all
+REQUIRED_PACKAGES = ("telegram", "psycopg2", "pytz", "prometheus_client", "PIL")
+
+pytestmark = pytest.mark.skipif(
+    any(importlib.util.find_spec(package) is None for package in REQUIRED_PACKAGES),
+    reason="bot dependencies are not installed",
+)
+
+
+@pytest.mark.parametrize("module", DEFAULT_MODULES)
+def test_import_time_within_budget(module):
+    median = statistics.median(measure(module)[0] for _ in range(RUNS))
+    assert median <= DEFAULT_BUDGET, f"importing {module} took {median:.2f} s (budget {DEFAULT_BUDGET:.2f} s)"
+
+
+@pytest.mark.parametrize("module", DEFAULT_MODULES)
+def test_heavy_packages_are_imported_lazily(module):
+    _, rows = measure(module)
+    eager = {name.strip().split(".")[0] for _, _, name in rows} & set(LAZY_PACKAGES)
+    assert not eager, f"{module} imports {', '.join(sorted(eager))} at startup"
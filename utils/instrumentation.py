@@ -0,0 +1,179 @@
+"""
+Lightweight instrumentation for the bot's hot paths.
+
+Stage timings, database query times and OpenAI latency/token usage are recorded as Prometheus
+metrics (served on a local HTTP endpoint) and collected per request, so each handled update ends
+with one structured log line carrying a correlation ID. Recording a measurement costs a
+``perf_counter`` call and a histogram update, cheap enough to leave on in production.
+"""
+
+import json
+import logging
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+
+logger = logging.getLogger(__name__)
+
+_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+STAGE_SECONDS = Histogram(
+    "expensetracker_stage_seconds", "Time spent in each handler stage", ["handler", "stage"], buckets=_LATENCY_BUCKETS
+)
+REQUEST_SECONDS = Histogram(
+    "expensetracker_request_seconds", "End-to-end handler time", ["handler", "outcome"], buckets=_LATENCY_BUCKETS
+)
+DB_QUERY_SECONDS = Histogram(
+    "expensetracker_db_query_seconds", "Database statement time", ["operation"], buckets=_LATENCY_BUCKETS
+)
+OPENAI_REQUEST_SECONDS = Histogram(
+    "expensetracker_openai_request_seconds", "OpenAI request time", ["model", "outcome"], buckets=_LATENCY_BUCKETS
+)
+OPENAI_TOKENS = Counter("expensetracker_openai_tokens", "OpenAI tokens used", ["model", "kind"])
+OPENAI_LATENCY_QUANTILE = Gauge(
+    "expensetracker_openai_latency_quantile_seconds",
+    "Recent OpenAI request latency percentiles",
+    ["model", "kind", "quantile"],
+)
+OPENAI_HEDGES = Counter("expensetracker_openai_hedged_requests", "Duplicate OpenAI requests sent to cut tail latency")
+OPENAI_CIRCUIT_OPEN = Gauge(
+    "expensetracker_openai_circuit_open", "1 while a model's circuit breaker is open", ["model"]
+)
+OPENAI_BATCH_SIZE = Histogram(
+    "expensetracker_openai_batch_size", "Text expenses per batched OpenAI request", buckets=(1, 2, 4, 8, 16, 32)
+)
+
+_current_request = ContextVar("current_request", default=None)
+
+
+class RequestContext:
+    __slots__ = ("correlation_id", "fields", "handler", "stages", "tokens")
+
+    def __init__(self, handler: str, fields: dict):
+        self.correlation_id = uuid.uuid4().hex[:12]
+        self.handler = handler
+        self.fields = fields
+        self.stages = {}
+        self.tokens = {}
+
+
+def correlation_id() -> str | None:
+    """The correlation ID of the request being handled in this context, if any."""
+    request = _current_request.get()
+    return request.correlation_id if request else None
+
+
+class CorrelationIdFilter(logging.Filter):
+    """Adds ``correlation_id`` to every log record (``-`` outside a request)."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.correlation_id = correlation_id() or "-"
+        return True
+
+
+def configure_logging(level: int = logging.INFO) -> None:
+    """Configure root logging with the correlation ID in every line."""
+    logging.basicConfig(level=level, format="%(asctime)s %(levelname)s [%(correlation_id)s] %(name)s: %(message)s")
+    for handler in logging.getLogger().handlers:
+        handler.addFilter(CorrelationIdFilter())
+
+
+@contextmanager
+def request_context(handler: str, **fields):
+    """
+    Track one handled update. On exit, the total time is recorded and a JSON log line with the
+    correlation ID, stage timings and token usage is written.
+    """
+    request = RequestContext(handler, fields)
+    token = _current_request.set(request)
+    start = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield request
+    except BaseException:
+        outcome = "error"
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        REQUEST_SECONDS.labels(handler, outcome).observe(elapsed)
+        logger.info(
+            json.dumps(
+                {
+                    "event": "request",
+                    "handler": handler,
+                    "outcome": outcome,
+                    "duration_ms": round(elapsed * 1000, 2),
+                    "stages_ms": {stage: round(seconds * 1000, 2) for stage, seconds in request.stages.items()},
+                    "tokens": request.tokens,
+                    **request.fields,
+                },
+                default=str,
+            )
+        )
+        _current_request.reset(token)
+
+
+@contextmanager
+def timed(stage: str):
+    """Time a stage of the current request (or of an unnamed one outside a request)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        request = _current_request.get()
+        STAGE_SECONDS.labels(request.handler if request else "none", stage).observe(elapsed)
+        if request is not None:
+            request.stages[stage] = request.stages.get(stage, 0.0) + elapsed
+
+
+def annotate(**fields) -> None:
+    """Attach extra fields to the current request's log line."""
+    request = _current_request.get()
+    if request is not None:
+        request.fields.update(fields)
+
+
+def observe_db_query(query, elapsed: float) -> None:
+    """Record one database statement, labelled by its leading SQL keyword."""
+    if isinstance(query, bytes):
+        query = query[:32].decode("ascii", "replace")
+    words = str(query).split(None, 1)
+    DB_QUERY_SECONDS.labels(words[0].upper() if words else "UNKNOWN").observe(elapsed)
+    request = _current_request.get()
+    if request is not None:
+        request.stages["db_queries"] = request.stages.get("db_queries", 0.0) + elapsed
+
+
+def observe_openai_call(model: str, elapsed: float, outcome: str, usage=None) -> None:
+    """Record an OpenAI request and the token usage reported in its response."""
+    OPENAI_REQUEST_SECONDS.labels(model, outcome).observe(elapsed)
+    if usage is None:
+        return
+    counts = {"prompt": usage.prompt_tokens, "completion": usage.completion_tokens}
+    details = getattr(usage, "prompt_tokens_details", None)
+    if details is not None and getattr(details, "cached_tokens", None):
+        counts["cached_prompt"] = details.cached_tokens
+    for kind, value in counts.items():
+        OPENAI_TOKENS.labels(model, kind).inc(value)
+    logger.info(
+        f"OpenAI usage ({model}): prompt={counts['prompt']} cached={counts.get('cached_prompt', 0)} "
+        f"completion={counts['completion']} in {elapsed * 1000:.0f} ms"
+    )
+    request = _current_request.get()
+    if request is not None:
+        for kind, value in counts.items():
+            request.tokens[kind] = request.tokens.get(kind, 0) + value
+
+
+def start_metrics_server(port: int, addr: str = "127.0.0.1") -> None:
+    """Serve the metrics in Prometheus text format on http://addr:port/metrics."""
+    try:
+        start_http_server(port, addr=addr)
+    except OSError as e:
+        logger.warning(f"Metrics endpoint not started on {addr}:{port}: {e}")
+        return
+    logger.info(f"Metrics endpoint listening on http://{addr}:{port}/metrics")